@@ -0,0 +1,94 @@
+"""
+So sánh kết quả benchmark (--benchmark-json) với baseline đã lưu.
+
+    python benchmarks/check_regression.py bench_output.json
+    python benchmarks/check_regression.py bench_output.json --update   # ghi đè baseline
+
+Exit code 1 nếu có benchmark chậm hơn hoặc tốn bộ nhớ hơn baseline quá ngưỡng cho phép.
+Baseline phụ thuộc máy chạy: cập nhật lại baseline khi đổi runner CI.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def load_results(path: str) -> dict:
+    """Rút gọn output của pytest-benchmark về {fullname: {mean, rows_per_sec, peak_memory_mb}}."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    results = {}
+    for bench in raw.get("benchmarks", []):
+        extra = bench.get("extra_info", {})
+        results[bench["fullname"]] = {
+            "mean": bench["stats"]["mean"],
+            "rows": extra.get("rows"),
+            "rows_per_sec": extra.get("rows_per_sec"),
+            "peak_memory_mb": extra.get("peak_memory_mb"),
+        }
+    return results
+
+
+def compare(current: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> list:
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        result = current.get(name)
+        if not result:
+            continue
+
+        time_ratio = result["mean"] / base["mean"] if base.get("mean") else 1.0
+        if time_ratio > 1 + time_tolerance:
+            regressions.append(f"{name}: mean {base['mean']:.6f}s -> {result['mean']:.6f}s (x{time_ratio:.2f})")
+
+        if base.get("peak_memory_mb") and result.get("peak_memory_mb"):
+            memory_ratio = result["peak_memory_mb"] / base["peak_memory_mb"]
+            if memory_ratio > 1 + memory_tolerance:
+                regressions.append(
+                    f"{name}: peak memory {base['peak_memory_mb']}MB -> {result['peak_memory_mb']}MB (x{memory_ratio:.2f})"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kiểm tra regression của benchmark so với baseline")
+    parser.add_argument("results", help="File JSON từ --benchmark-json")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Cho phép chậm hơn tối đa 25%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.20, help="Cho phép tốn bộ nhớ hơn tối đa 20%%")
+    parser.add_argument("--update", action="store_true", help="Ghi kết quả hiện tại làm baseline")
+    args = parser.parse_args()
+
+    current = load_results(args.results)
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"Đã cập nhật baseline ({len(current)} benchmarks): {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    for name, result in sorted(current.items()):
+        base = baseline.get(name)
+        base_mean = f"{base['mean']:.6f}s" if base else "n/a"
+        print(f"{name}: {result['mean']:.6f}s (baseline {base_mean}), "
+              f"{result['rows_per_sec']} rows/s, peak {result['peak_memory_mb']}MB")
+
+    regressions = compare(current, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nREGRESSION:")
+        for line in regressions:
+            print(f"  ✗ {line}")
+        return 1
+
+    print("\n✓ Không có regression so với baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Benchmark suite cho các hot path xử lý dòng của Facebook reporters.
+
+Chạy:
+    pip install -r benchmarks/requirements.txt
+    python -m pytest benchmarks --benchmark-json=bench_output.json
+    python benchmarks/check_regression.py bench_output.json
+
+Biến môi trường:
+    BENCH_SCALES: danh sách scale (số dòng), mặc định "1000,10000,100000"
+    BENCH_RECORDED_DIR: thư mục chứa response Graph API đã ghi lại (*.json)
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SCALES = [int(s) for s in os.getenv("BENCH_SCALES", "1000,10000,100000").split(",") if s.strip()]
+
+
+def pytest_generate_tests(metafunc):
+    if "scale" in metafunc.fixturenames:
+        metafunc.parametrize("scale", SCALES, ids=[f"{s // 1000}k" if s >= 1000 else str(s) for s in SCALES])
+
+
+@pytest.fixture
+def run_bench(benchmark):
+    """
+    Đo 1 hàm xử lý `rows` dòng: thời gian (pytest-benchmark), throughput và peak memory.
+
+    Peak memory được đo trong 1 lần chạy riêng với tracemalloc (không tính vào thời gian).
+    """
+
+    def _run(func, rows: int, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Scale lớn chạy ít round hơn để suite không quá lâu
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        single_run = time.perf_counter() - started
+        rounds = max(3, min(50, int(2.0 / single_run))) if single_run > 0 else 50
+
+        result = benchmark.pedantic(func, args=args, kwargs=kwargs, rounds=rounds, iterations=1, warmup_rounds=0)
+
+        mean = benchmark.stats.stats.mean
+        benchmark.extra_info["rows"] = rows
+        benchmark.extra_info["rows_per_sec"] = round(rows / mean) if mean else None
+        benchmark.extra_info["peak_memory_mb"] = round(peak / (1024 * 1024), 3)
+        return result
+
+    return _run
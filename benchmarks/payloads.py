@@ -0,0 +1,107 @@
+"""
+Payload cho benchmark: sinh dữ liệu tổng hợp bằng FakeFacebookBatchServer,
+hoặc nạp response đã ghi lại (recorded) từ thư mục BENCH_RECORDED_DIR.
+
+File recorded là JSON của 1 Graph API response body ({"data": [...], "paging": {...}})
+hoặc list các body như vậy (ví dụ dump từ debug_wave). Dữ liệu recorded được nhân bản
+cho đến khi đủ số dòng của scale cần đo.
+"""
+
+import copy
+import functools
+import glob
+import json
+import os
+from typing import Any, Dict, List
+from urllib.parse import urlencode
+
+from services.facebook.base_processor import FacebookAdsBaseReporter
+from tests.fakes.fb_batch_server import FakeFacebookBatchServer
+
+ACCOUNT = {"id": "act_1000", "name": "Benchmark Account"}
+CHUNK = {"start": "2025-01-01", "end": "2025-01-30"}
+DAYS_PER_CHUNK = 30
+
+TEMPLATE_NAME = "Ad Daily Report"
+TEMPLATE_CONFIG = FacebookAdsBaseReporter.get_facebook_template_config_by_name(TEMPLATE_NAME)
+
+# Toàn bộ field selectable của template -> trường hợp xấu nhất cho _flatten_action_metrics
+SELECTED_FIELDS = [
+    field
+    for group in TEMPLATE_CONFIG["selectable_fields"].values()
+    for field in group
+]
+
+
+def _nested_insights_field() -> str:
+    insight_fields = ",".join(TEMPLATE_CONFIG["insight_fields"])
+    return (
+        f"insights.time_range({{'since':'{CHUNK['start']}','until':'{CHUNK['end']}'}})"
+        f".time_increment(1){{{insight_fields}}}"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def build_flat_response(rows: int) -> Dict[str, Any]:
+    """Response insights phẳng (level=ad) với `rows` dòng trong 1 trang."""
+    server = FakeFacebookBatchServer(rows_per_request=rows, page_size=rows)
+    params = {
+        "level": "ad",
+        "time_range": json.dumps({"since": CHUNK["start"], "until": CHUNK["end"]}),
+        "time_increment": 1,
+        "fields": ",".join(TEMPLATE_CONFIG["insight_fields"] + ["ad_id", "account_id"]),
+    }
+    return server.build_response(f"{ACCOUNT['id']}/insights?{urlencode(params)}")
+
+
+@functools.lru_cache(maxsize=None)
+def build_nested_response(rows: int) -> Dict[str, Any]:
+    """Response nested ({act}/ads?fields=...,insights{...}), mỗi ad có DAYS_PER_CHUNK dòng."""
+    server = FakeFacebookBatchServer(
+        rows_per_request=rows,
+        page_size=max(1, rows // DAYS_PER_CHUNK),
+        nested_insights_limit=DAYS_PER_CHUNK,
+    )
+    fields = ",".join(TEMPLATE_CONFIG["ad_fields"] + [_nested_insights_field()])
+    return server.build_response(f"{ACCOUNT['id']}/ads?{urlencode({'fields': fields}, safe='{}(),')}")
+
+
+def build_metadata_map(insights_rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Metadata theo ad_id cho phase join của FacebookDailyReporterV2."""
+    server = FakeFacebookBatchServer()
+    fields = TEMPLATE_CONFIG["ad_fields"]
+    return {
+        row["ad_id"]: server._build_object(row["ad_id"], fields)
+        for row in insights_rows
+        if row.get("ad_id")
+    }
+
+
+def load_recorded_response(rows: int) -> Dict[str, Any]:
+    """
+    Gộp các response recorded thành 1 body có `rows` phần tử data.
+
+    Returns:
+        None nếu không có file recorded (BENCH_RECORDED_DIR chưa được cấu hình)
+    """
+    recorded_dir = os.getenv("BENCH_RECORDED_DIR")
+    if not recorded_dir:
+        return None
+
+    items = []
+    for path in sorted(glob.glob(os.path.join(recorded_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        bodies = content if isinstance(content, list) else [content]
+        for body in bodies:
+            # Hỗ trợ cả dạng sub-response của /batch ({"data": {"data": [...]}})
+            if isinstance(body, dict) and isinstance(body.get("data"), dict):
+                body = body["data"]
+            if isinstance(body, dict):
+                items.extend(body.get("data") or [])
+
+    if not items:
+        return None
+
+    data = [copy.deepcopy(items[i % len(items)]) for i in range(rows)]
+    return {"data": data}
@@ -0,0 +1,76 @@
+"""Benchmark các hàm xử lý theo dòng (chạy trên 100k+ dòng mỗi job)."""
+
+import pytest
+
+from benchmarks.payloads import (
+    ACCOUNT,
+    SELECTED_FIELDS,
+    build_flat_response,
+    build_nested_response,
+    build_metadata_map,
+    load_recorded_response,
+)
+from services.facebook.daily_processor import FacebookDailyReporter
+from services.facebook.daily_processor2 import FacebookDailyReporterV2
+
+
+@pytest.fixture(scope="module")
+def daily_reporter():
+    return FacebookDailyReporter(access_token="bench")
+
+
+@pytest.fixture(scope="module")
+def daily_reporter_v2():
+    return FacebookDailyReporterV2(access_token="bench")
+
+
+def test_flatten_action_metrics(run_bench, daily_reporter, scale):
+    rows = build_flat_response(scale)["data"]
+
+    def flatten_all():
+        return [daily_reporter._flatten_action_metrics(row, SELECTED_FIELDS) for row in rows]
+
+    result = run_bench(flatten_all, scale)
+    assert len(result) == scale
+
+
+def count_nested_rows(body):
+    return sum(len(item["insights"]["data"]) for item in body["data"])
+
+
+def test_process_nested_level_response(run_bench, daily_reporter, scale):
+    body = build_nested_response(scale)
+    rows = count_nested_rows(body)
+    metadata = {"account": ACCOUNT, "level": "ad"}
+
+    result = run_bench(daily_reporter._process_nested_level_response, rows, body, metadata, SELECTED_FIELDS)
+    assert len(result) == rows
+
+
+def test_handle_successful_response(run_bench, daily_reporter, scale):
+    body = build_nested_response(scale)
+    rows = count_nested_rows(body)
+    metadata = {"account": ACCOUNT, "level": "ad"}
+
+    result = run_bench(daily_reporter._handle_successful_response, rows, body, metadata, SELECTED_FIELDS)
+    assert len(result["rows"]) == rows
+
+
+def test_join_insights_with_metadata(run_bench, daily_reporter_v2, scale):
+    insights = build_flat_response(scale)["data"]
+    metadata_map = build_metadata_map(insights)
+
+    result = run_bench(daily_reporter_v2._join_insights_with_metadata, scale, insights, metadata_map, "ad")
+    assert len(result) == scale
+
+
+def test_handle_recorded_response(run_bench, daily_reporter, scale):
+    body = load_recorded_response(scale)
+    if body is None:
+        pytest.skip("BENCH_RECORDED_DIR chưa được cấu hình")
+
+    # Response nested có key "insights" trong từng item, còn lại là insights phẳng
+    level = "ad" if any("insights" in item for item in body["data"][:10]) else "campaign"
+    metadata = {"account": ACCOUNT, "level": level}
+
+    run_bench(daily_reporter._handle_successful_response, scale, body, metadata, SELECTED_FIELDS)
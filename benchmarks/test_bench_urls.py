@@ -0,0 +1,60 @@
+"""Benchmark các URL builder (chạy 1 lần cho mỗi account x chunk / mỗi object)."""
+
+from benchmarks.payloads import ACCOUNT, SELECTED_FIELDS, TEMPLATE_CONFIG
+from services.facebook.daily_processor import FacebookDailyReporter
+from services.facebook.daily_processor2 import FacebookDailyReporterV2
+
+URL_COUNT = 1000
+
+CHUNKS = [
+    {"start": f"2025-{month:02d}-01", "end": f"2025-{month:02d}-28"}
+    for month in range(1, 13)
+]
+
+
+def test_daily_nested_level_url(run_bench):
+    reporter = FacebookDailyReporter(access_token="bench")
+
+    def build_urls():
+        return [
+            reporter._create_nested_level_url(ACCOUNT, CHUNKS[i % 12], "ad", TEMPLATE_CONFIG, SELECTED_FIELDS)
+            for i in range(URL_COUNT)
+        ]
+
+    assert len(run_bench(build_urls, URL_COUNT)) == URL_COUNT
+
+
+def test_daily_flat_level_url(run_bench):
+    reporter = FacebookDailyReporter(access_token="bench")
+
+    def build_urls():
+        return [
+            reporter._create_flat_level_url(ACCOUNT, CHUNKS[i % 12], TEMPLATE_CONFIG, SELECTED_FIELDS)
+            for i in range(URL_COUNT)
+        ]
+
+    assert len(run_bench(build_urls, URL_COUNT)) == URL_COUNT
+
+
+def test_v2_insights_url(run_bench):
+    reporter = FacebookDailyReporterV2(access_token="bench")
+
+    def build_urls():
+        return [
+            reporter._create_insights_url(ACCOUNT, CHUNKS[i % 12], TEMPLATE_CONFIG, SELECTED_FIELDS)
+            for i in range(URL_COUNT)
+        ]
+
+    assert len(run_bench(build_urls, URL_COUNT)) == URL_COUNT
+
+
+def test_v2_metadata_url_by_id(run_bench):
+    reporter = FacebookDailyReporterV2(access_token="bench")
+
+    def build_urls():
+        return [
+            reporter._create_metadata_url_by_id(str(120000000000 + i), "ad", TEMPLATE_CONFIG)
+            for i in range(URL_COUNT)
+        ]
+
+    assert len(run_bench(build_urls, URL_COUNT)) == URL_COUNT
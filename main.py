@@ -7,6 +7,7 @@ from workers.tasks_modular import run_report_job
 from models.schemas import CreateJobRequest
 from fastapi.middleware.cors import CORSMiddleware
 from services.database.mongo_client import MongoDbClient
+from services.planner.job_planner import JobPlanner
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse
 import os 
@@ -92,6 +93,18 @@ def create_report_job(job_request: CreateJobRequest):
     }
     
 
+@app.post("/reports/estimate", tags=["Async Jobs"])
+def estimate_report_job(job_request: CreateJobRequest):
+    """
+    Ước lượng số request, số trang và thời gian chạy của một job trước khi tạo job.
+    """
+    try:
+        return JobPlanner(db_client).estimate(job_request.model_dump())
+    except Exception as e:
+        logger.error(f"Lỗi khi ước lượng job {job_request.job_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Lỗi server khi ước lượng job: {e}")
+    
+
 @app.post("/reports/{job_id}/cancel", tags=["Async Jobs"])
 def cancel_report_job(job_id: str):
     """
@@ -16,6 +16,8 @@ class CreateJobRequest(BaseModel):
     store_id: Optional[str] = None
     advertiser_name: Optional[str] = None
     store_name: Optional[str] = None
+    # Trọng số chia slot rate limiter giữa các job dùng chung advertiser (mặc định 1.0)
+    priority_weight: float = 1.0
     
     # Thông tin user
     user_email: str
@@ -0,0 +1,133 @@
+"""
+Replay các job đã chạy (task_logs) với backoff policy / rule rate limiter khác để so sánh
+thời gian job, số lần chạm rate limit và tổng backoff, không tốn quota thật.
+
+Ví dụ:
+    python scripts/replay_simulator.py --job-id <job_id> --fb-set USAGE_WARNING_PCT=85 --fb-set USAGE_WARNING_BACKOFF_SEC=30
+    python scripts/replay_simulator.py --input task_logs.json --tiktok-rules gmv=3/1,60/60
+    python scripts/replay_simulator.py --recent 20 --task-type facebook_daily --fb-set USAGE_CRITICAL_PCT=90
+    python scripts/replay_simulator.py --job-id <job_id> --fb-baseline-set PACING_ENABLED=0 --fb-set PACING_TARGET_PCT=85
+"""
+
+import sys
+import os
+import json
+import logging
+import argparse
+from typing import Any, Dict, List
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.simulator.facebook_replay import FacebookReplaySimulator, make_backoff_policy
+from services.simulator.tiktok_replay import TikTokReplaySimulator, DEFAULT_LIMITER_RULES
+
+
+def parse_assignment(value: str):
+    """NAME=VALUE -> (NAME, số)"""
+    name, _, raw = value.partition("=")
+    if not raw:
+        raise argparse.ArgumentTypeError(f"Sai định dạng '{value}', cần NAME=VALUE.")
+    return name.strip(), float(raw) if "." in raw else int(raw)
+
+
+def parse_rules(value: str):
+    """gmv=2/1,45/60 -> ("gmv", [(2, 1.0), (45, 60.0)])"""
+    name, _, raw = value.partition("=")
+    try:
+        rules = [(int(limit), float(period)) for limit, period in (r.split("/") for r in raw.split(","))]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Sai định dạng '{value}', cần name=limit/period,limit/period.")
+    return name.strip(), rules
+
+
+def load_task_logs(args) -> List[Dict[str, Any]]:
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            data = json.load(f)
+        logs = data if isinstance(data, list) else [data]
+        if args.job_id:
+            logs = [log for log in logs if log.get("job_id") in args.job_id]
+        return logs
+
+    from services.database.mongo_client import MongoDbClient
+    db_client = MongoDbClient()
+    query: Dict[str, Any] = {"job_id": {"$in": args.job_id}} if args.job_id else {}
+    if args.task_type:
+        query["task_type"] = args.task_type
+    cursor = db_client.db.task_logs.find(query, {"full_logs": 0}).sort("start_time", -1)
+    return list(cursor.limit(args.recent)) if not args.job_id else list(cursor)
+
+
+def replay(log: Dict[str, Any], args) -> Dict[str, Any]:
+    api_usage = log.get("api_total_counts") or {}
+    summaries = api_usage.get("summaries") if isinstance(api_usage, dict) else None
+
+    if summaries:
+        baseline = make_backoff_policy(**dict(args.fb_baseline_set or []))
+        simulator = FacebookReplaySimulator(summaries, baseline_policy=baseline)
+        return {
+            "platform": "facebook",
+            "baseline": simulator.run(),
+            "candidate": simulator.run(make_backoff_policy(**dict(args.fb_set or []))),
+        }
+
+    simulator = TikTokReplaySimulator.from_api_usage(
+        api_usage,
+        duration_sec=float(log.get("duration_seconds") or 0),
+        server_rules={**DEFAULT_LIMITER_RULES, **dict(args.server_rules or [])}
+    )
+    return {
+        "platform": "tiktok",
+        "baseline": simulator.run(),
+        "candidate": simulator.run({**DEFAULT_LIMITER_RULES, **dict(args.tiktok_rules or [])}),
+    }
+
+
+def print_report(log: Dict[str, Any], report: Dict[str, Any]):
+    print(f"\n=== Job {log.get('job_id')} ({log.get('task_type')}, {report['platform']}) ===")
+    print(f"  Thời gian thực tế: {log.get('duration_seconds')}s")
+    keys = ["duration_sec", "total_backoff_sec", "rate_limit_hits"]
+    keys += [k for k in report["baseline"] if k not in keys]
+    print(f"  {'':<22}{'baseline':>14}{'candidate':>14}{'delta':>12}")
+    for key in keys:
+        base, cand = report["baseline"][key], report["candidate"][key]
+        delta = f"{cand - base:+.1f}" if isinstance(base, (int, float)) and not isinstance(base, bool) else ""
+        print(f"  {key:<22}{str(base):>14}{str(cand):>14}{delta:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay simulator cho backoff policy và rate limiter.")
+    parser.add_argument("--input", help="File JSON export từ task_logs (mặc định đọc MongoDB)")
+    parser.add_argument("--job-id", action="append", help="Job cần replay (có thể lặp lại)")
+    parser.add_argument("--task-type", help="Lọc theo task_type khi đọc từ MongoDB")
+    parser.add_argument("--recent", type=int, default=10, help="Số job gần nhất khi không chỉ định --job-id")
+    parser.add_argument("--fb-set", action="append", type=parse_assignment,
+                        help="Ghi đè hằng số của EnhancedBackoffHandler, ví dụ USAGE_WARNING_PCT=85")
+    parser.add_argument("--fb-baseline-set", action="append", type=parse_assignment,
+                        help="Policy đã chạy khi ghi log, ví dụ PACING_ENABLED=0 cho job cũ (backoff theo bậc)")
+    parser.add_argument("--tiktok-rules", action="append", type=parse_rules,
+                        help="Rule limiter ứng viên, ví dụ gmv=3/1,60/60")
+    parser.add_argument("--server-rules", action="append", type=parse_rules,
+                        help="Quota thật của TikTok giả định (mặc định = rule production)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    logs = load_task_logs(args)
+    if not logs:
+        print("Không tìm thấy task log nào.")
+        return
+
+    totals = {"baseline": 0.0, "candidate": 0.0}
+    for log in logs:
+        report = replay(log, args)
+        print_report(log, report)
+        for name in totals:
+            totals[name] += report[name]["duration_sec"]
+
+    print(f"\nTổng thời gian dự kiến: baseline {totals['baseline']:.0f}s, candidate {totals['candidate']:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import logging
 from typing import List, Dict, Any
 from datetime import datetime, timezone, timedelta
 from services.database.mongo_client import MongoDbClient
+from services.rate_limiter.metrics import get_limiter_stats_timeseries
 import redis
 
 logger = logging.getLogger(__name__)
@@ -80,6 +81,15 @@ def get_api_timeseries_counts(redis_client: redis.Redis, endpoints: List[str], h
         logger.error(f"Error fetching timeseries data: {e}")
         return {}
 
+def get_limiter_stats(redis_client: redis.Redis, hours: int = 24) -> Dict[str, List]:
+    """Lấy số liệu rate limiter / backoff theo giờ (granted, denied, thời gian chờ, backoff theo lý do)."""
+    if not redis_client: return {}
+    try:
+        return get_limiter_stats_timeseries(redis_client, hours)
+    except Exception as e:
+        logger.error(f"Error fetching limiter stats: {e}")
+        return {}
+
 def get_dashboard_data(db_client: MongoDbClient, redis_client: redis.Redis) -> Dict[str, Any]:
     """
     Tổng hợp và trả về tất cả dữ liệu cần thiết cho dashboard.
@@ -89,9 +99,11 @@ def get_dashboard_data(db_client: MongoDbClient, redis_client: redis.Redis) -> D
     
     endpoints_with_data = list(api_total_counts.keys())
     api_timeseries = get_api_timeseries_counts(redis_client, endpoints_with_data)
+    limiter_stats = get_limiter_stats(redis_client)
 
     return {
         "task_logs": task_logs,
         "api_total_counts": api_total_counts,
-        "api_timeseries": api_timeseries
+        "api_timeseries": api_timeseries,
+        "limiter_stats": limiter_stats
     }
@@ -0,0 +1,114 @@
+"""
+Report Day Cache
+Cache report theo từng ngày (stat_time_day) trong MongoDB, kèm danh sách các ngày đã được
+lấy đầy đủ (coverage), để một khoảng ngày bất kỳ (không chỉ trọn tháng) đọc được từ cache
+và chỉ những ngày còn thiếu mới phải gọi API.
+"""
+
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Set
+
+from pymongo import ASCENDING, UpdateOne
+
+
+def row_day(row: Dict[str, Any]) -> str | None:
+    """Ngày của một row theo stat_time_day ("2025-09-01 00:00:00" -> "2025-09-01")."""
+    stat_time_day = row.get("stat_time_day")
+    return str(stat_time_day)[:10] if stat_time_day else None
+
+
+class ReportDayCache:
+    """
+    - `{collection}_daily`: mỗi row một document (_id gồm scope, campaign, sản phẩm và ngày),
+      nên cùng một ngày lấy từ nhiều khoảng báo cáo khác nhau không bị lưu trùng.
+    - `report_day_coverage`: mỗi scope một document, `days` là các ngày đã lấy đủ từ API
+      (kể cả ngày không có row nào), dùng để phân biệt "chưa cache" với "không có dữ liệu".
+
+    scope là dict các trường xác định nguồn dữ liệu (vd. advertiser_id, store_id).
+    Chỉ nên ghi các ngày đã ổn định (trước accurate_data_date).
+    """
+
+    COVERAGE_COLLECTION = "report_day_coverage"
+
+    def __init__(self, db_client: Any, collection_name: str):
+        self.db = db_client.db
+        self.collection_name = collection_name
+        self.rows_collection = f"{collection_name}_daily"
+        try:
+            self.db[self.rows_collection].create_index(
+                [("advertiser_id", ASCENDING), ("store_id", ASCENDING), ("stat_day", ASCENDING)],
+                name="scope_day_idx"
+            )
+        except Exception as e:
+            print(f"⚠️ Không thể tạo index cho {self.rows_collection}: {e}")
+
+    def _coverage_id(self, scope: Dict[str, Any]) -> str:
+        return ":".join([self.collection_name] + [str(scope[key]) for key in sorted(scope)])
+
+    def covered_days(self, scope: Dict[str, Any], start: date, end: date) -> Set[date]:
+        """Các ngày trong [start, end] đã có đủ trong cache."""
+        if start > end:
+            return set()
+        try:
+            coverage = self.db[self.COVERAGE_COLLECTION].find_one({"_id": self._coverage_id(scope)}, {"days": 1})
+        except Exception as e:
+            print(f"WARNING: Không thể đọc coverage cache theo ngày: {e}")
+            return set()
+
+        days = set()
+        for day_str in (coverage or {}).get("days", []):
+            day = datetime.strptime(day_str, "%Y-%m-%d").date()
+            if start <= day <= end:
+                days.add(day)
+        return days
+
+    def load(self, scope: Dict[str, Any], days: Iterable[date]) -> List[Dict[str, Any]]:
+        day_strs = sorted(day.isoformat() for day in days)
+        if not day_strs:
+            return []
+        return list(self.db[self.rows_collection].find({**scope, "stat_day": {"$in": day_strs}}))
+
+    def save(self, scope: Dict[str, Any], rows: List[Dict[str, Any]], days: Iterable[date]):
+        """
+        Ghi các row thuộc `days` rồi mới đánh dấu coverage, để coverage không bao giờ
+        trỏ tới ngày chưa ghi xong.
+        """
+        day_strs = sorted(day.isoformat() for day in days)
+        if not day_strs:
+            return
+
+        now = datetime.now(timezone.utc)
+        wanted = set(day_strs)
+        scope_id = "_".join(str(scope[key]) for key in sorted(scope))
+        operations = []
+        for row in rows:
+            stat_day = row_day(row)
+            if stat_day not in wanted:
+                continue
+            unique_id = (
+                f"{scope_id}_"
+                f"{row.get('campaign_id')}_"
+                f"{row.get('item_group_id', '')}_"
+                f"{row.get('item_id', '')}_"
+                f"{stat_day}"
+            )
+            operations.append(UpdateOne(
+                {"_id": unique_id},
+                {"$set": {**row, **scope, "stat_day": stat_day, "updated_at": now}},
+                upsert=True
+            ))
+
+        try:
+            if operations:
+                self.db[self.rows_collection].bulk_write(operations, ordered=False)
+            self.db[self.COVERAGE_COLLECTION].update_one(
+                {"_id": self._coverage_id(scope)},
+                {
+                    "$set": {**scope, "collection": self.collection_name, "updated_at": now},
+                    "$addToSet": {"days": {"$each": day_strs}},
+                },
+                upsert=True
+            )
+            print(f"Đã cache {len(operations)} row cho {len(day_strs)} ngày vào '{self.rows_collection}'.")
+        except Exception as e:
+            print(f"WARNING: Không thể ghi cache theo ngày: {e}")
@@ -3,8 +3,11 @@ Facebook Batch Reporter - Base Class
 Xử lý batch requests đến Facebook Graph API với rate limit backoff thông minh
 """
 
+import os
+import uuid
 import requests
 import json
+from urllib3.exceptions import ProtocolError
 import time
 from typing import List, Dict, Any, Optional, Callable
 from .constant import FACEBOOK_REPORT_TEMPLATES_STRUCTURE, CONVERSION_METRICS_MAP
@@ -12,6 +15,13 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 import logging
 from services.facebook.err_handler.rate_limit import EnhancedBackoffHandler
+from services.facebook.usage_governor import FacebookUsageGovernor
+from services.rate_limiter.metrics import LimiterMetrics
+
+try:
+    import ijson
+except ImportError:  # ijson chỉ cần cho chế độ streaming batch response
+    ijson = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -34,7 +44,12 @@ class FacebookAdsBaseReporter:
     MAX_RETRIES = 3
     MAX_PAGES_PER_RETRY = 10
     PLUS_BACKOFF_SEC = 3 # Thời gian đệm thêm khi backoff
-    
+    # Parse batch response theo từng sub-response thay vì load toàn bộ body (cần ijson)
+    STREAM_BATCH_RESPONSES = os.getenv("FB_STREAM_BATCH_RESPONSES", "false").lower() == "true"
+    # Pre-flight level=account để bỏ các account x chunk không có chi tiêu
+    ACCOUNT_PREFLIGHT = os.getenv("FB_ACCOUNT_PREFLIGHT", "true").lower() == "true"
+    PREFLIGHT_MAX_TIME_RANGES = 30  # Số time range tối đa trong 1 request pre-flight
+
     def __init__(
         self, 
         access_token: str, 
@@ -42,7 +57,9 @@ class FacebookAdsBaseReporter:
         batch_api_url: str = BATCH_API_URL,
         email: Optional[str] = None,
         progress_callback: Optional[Callable] = None,
-        job_id: Optional[str] = None
+        job_id: Optional[str] = None,
+        stream_responses: Optional[bool] = None,
+        redis_client: Optional[Any] = None
     ):
         """
         Khởi tạo Facebook Batch Reporter.
@@ -54,6 +71,10 @@ class FacebookAdsBaseReporter:
             email: Email để tracking (optional)
             progress_callback: Callback function để report progress (optional)
             job_id: Job ID để tracking log (optional)
+            stream_responses: Parse batch response theo kiểu streaming
+                (mặc định lấy từ FB_STREAM_BATCH_RESPONSES)
+            redis_client: Redis client để chia sẻ usage với các job khác qua
+                FacebookUsageGovernor và ghi limiter stats (optional)
         """
         self.access_token = access_token
         self.api_version = api_version
@@ -70,7 +91,17 @@ class FacebookAdsBaseReporter:
         self.request_count = 0
 
         self.backoff_handler = EnhancedBackoffHandler(reporter=self)
+        self.usage_governor = FacebookUsageGovernor(redis_client) if redis_client is not None else None
+        # Định danh reporter khi ghi usage vào governor (phân biệt usage của job này với job khác)
+        self.governor_source = uuid.uuid4().hex
+        self.limiter_metrics = LimiterMetrics(redis_client) if redis_client is not None else None
 
+        if stream_responses is None:
+            stream_responses = self.STREAM_BATCH_RESPONSES
+        if stream_responses and ijson is None:
+            logger.warning("ijson chưa được cài đặt, tắt chế độ streaming batch response.")
+            stream_responses = False
+        self.stream_responses = stream_responses
         
     def _report_progress(self, message: str, percentage: int = None):
         """Report progress nếu có callback"""
@@ -215,6 +246,96 @@ class FacebookAdsBaseReporter:
             logger.error(f"Batch request failed: {e}")
             raise
     
+    def _stream_batch_request(self, relative_urls: List[str]):
+        """
+        Gửi batch request và parse response theo kiểu streaming (ijson).
+        Mỗi phần tử của `results[]` được yield ngay khi parse xong, nên bộ nhớ
+        chỉ giữ một sub-response tại một thời điểm thay vì toàn bộ batch.
+        
+        Yields:
+            ("result", dict) cho từng sub-response, ("summary", dict) cho summary
+        """
+        logger.info(relative_urls)
+        
+        payload = {
+            "access_token": self.access_token,
+            "relative_urls": relative_urls,
+            "email": self.email
+        }
+        
+        try:
+            with requests.post(self.batch_api_url, json=payload, timeout=180, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                self.batch_count += 1
+                self.request_count += len(relative_urls)
+                
+                has_results = False
+                builder = None
+                builder_prefix = None
+                
+                for prefix, event, value in ijson.parse(response.raw, use_float=True):
+                    if builder is None:
+                        if prefix == "results" and event == "start_array":
+                            has_results = True
+                        elif event == "start_map" and prefix in ("results.item", "summary"):
+                            builder = ijson.ObjectBuilder()
+                            builder_prefix = prefix
+                            builder.event(event, value)
+                        continue
+                    
+                    builder.event(event, value)
+                    if event == "end_map" and prefix == builder_prefix:
+                        yield ("result" if builder_prefix == "results.item" else "summary"), builder.value
+                        builder = None
+                
+                if not has_results:
+                    raise ValueError("Invalid response from batch server.")
+                
+        except ProtocolError as e:
+            # Đọc trực tiếp response.raw nên lỗi đứt kết nối giữa chừng không được requests bọc lại
+            logger.error(f"Batch response bị ngắt giữa chừng: {e}")
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Batch request failed: {e}")
+            raise
+    
+    def _record_backoff(self, reason: str, seconds: float):
+        if self.limiter_metrics:
+            self.limiter_metrics.record_backoff("facebook", reason, seconds)
+    
+    def _update_usage_governor(self, summary: Optional[Dict[str, Any]]):
+        """Chia sẻ usage mới nhất với các job khác (nếu có governor)"""
+        if self.usage_governor:
+            self.usage_governor.update(summary, source=self.governor_source)
+    
+    def _wait_for_usage_governor(self, batch_slice: List[Dict]):
+        """
+        Hỏi governor trước khi gửi batch: nếu app/account đang có usage cao
+        (do bất kỳ job nào đẩy lên) thì chờ trước, để các job cùng giãn nhịp.
+        Khi backoff_handler đã pacing theo xu hướng usage, usage do chính job này ghi
+        đã được tính sau batch trước nên chỉ còn block/ETA và usage của job khác.
+        """
+        if not self.usage_governor:
+            return
+        
+        account_ids = {
+            req["metadata"]["account"]["id"]
+            for req in batch_slice
+            if isinstance(req.get("metadata"), dict) and isinstance(req["metadata"].get("account"), dict)
+            and req["metadata"]["account"].get("id")
+        }
+        own_source = self.governor_source if self.backoff_handler.PACING_ENABLED else None
+        pacing = self.usage_governor.get_delay(account_ids, skip_source=own_source)
+        delay = min(pacing["delay_seconds"], self.MAX_BACKOFF_SECONDS)
+        if delay <= 0:
+            return
+        
+        self._report_progress(f"  ⏳ Usage governor: chờ {delay:.1f}s ({pacing['reason']})")
+        self._record_backoff("usage_governor", delay)
+        time.sleep(delay)
+        self.total_backoff_sec += delay
+    
     def _execute_single_batch(
         self, 
         urls_for_batch: List[str],
@@ -251,6 +372,7 @@ class FacebookAdsBaseReporter:
                     summary_with_time = response_json.get("summary")
                     summary_with_time["timestamp"] = datetime.now().isoformat()
                     self.summaries.append(summary_with_time)
+                    self._update_usage_governor(summary_with_time)
                 
                 if hasattr(self, 'backoff_handler'):
                     # print("Tồn tại summary: ", response_json["summary"])
@@ -275,6 +397,73 @@ class FacebookAdsBaseReporter:
                 # Exponential backoff
                 sleep_time = (2 ** attempt) * 2
                 logger.info(f"  ⏳ Chờ {sleep_time}s trước khi retry...")
+                self._record_backoff("batch_retry", sleep_time)
+                time.sleep(sleep_time)
+    
+    def _execute_single_batch_streaming(
+        self,
+        urls_for_batch: List[str],
+        batch_metadata: List[Dict],
+        batch_number: int,
+        response_handler: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        """
+        Giống _execute_single_batch nhưng parse response theo kiểu streaming và
+        chuyển từng sub-response cho response_handler ngay khi parse xong.
+        Chỉ giữ lại các response lỗi để backoff handler phân tích.
+        Khi retry, chỉ gửi lại các request chưa được xử lý.
+        """
+        handled_indexes = set()
+        
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            pending_indexes = [i for i in range(len(urls_for_batch)) if i not in handled_indexes]
+            if not pending_indexes:
+                return
+            
+            try:
+                self._report_progress(f"  → Gửi batch {batch_number} ({len(pending_indexes)} requests, streaming)...")
+                
+                error_responses = []
+                summary = None
+                
+                for kind, item in self._stream_batch_request([urls_for_batch[i] for i in pending_indexes]):
+                    if kind == "summary":
+                        summary = item
+                        continue
+                    
+                    idx = pending_indexes[item["request_index"]]
+                    item["request_index"] = idx
+                    item["metadata"] = batch_metadata[idx]["metadata"]
+                    item["original_url"] = batch_metadata[idx]["url"]
+                    
+                    if item.get("status_code") != 200:
+                        error_responses.append(item)
+                    
+                    response_handler(item)
+                    handled_indexes.add(idx)
+                
+                logger.info(f"  ✓ Batch {batch_number} thành công.")
+                
+                if summary is not None:
+                    summary["timestamp"] = datetime.now().isoformat()
+                    self.summaries.append(summary)
+                    self._update_usage_governor(summary)
+                
+                self.total_backoff_sec += self.backoff_handler.analyze_and_backoff(
+                    responses=error_responses,
+                    summary=summary
+                )
+                return
+                
+            except (requests.exceptions.RequestException, ijson.JSONError, ValueError) as e:
+                logger.warning(f"  ✗ Batch {batch_number} lỗi (lần {attempt}/{self.MAX_RETRIES}): {e}")
+                
+                if attempt >= self.MAX_RETRIES:
+                    raise Exception(f"Batch {batch_number} thất bại sau {self.MAX_RETRIES} lần thử: {e}")
+                
+                sleep_time = (2 ** attempt) * 2
+                logger.info(f"  ⏳ Chờ {sleep_time}s trước khi retry...")
+                self._record_backoff("batch_retry", sleep_time)
                 time.sleep(sleep_time)
     
     def _execute_wave(
@@ -282,13 +471,17 @@ class FacebookAdsBaseReporter:
         requests_for_wave: List[Dict],
         batch_size: int,
         sleep_time: float,
-        wave_number: int
+        wave_number: int,
+        response_handler: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> List[Dict[str, Any]]:
         """
         Xử lý một wave (nhiều batches).
         
+        Nếu có response_handler, từng response được chuyển cho handler ngay khi
+        parse xong (streaming) và không được gom vào kết quả trả về.
+        
         Returns:
-            List of all responses from wave
+            List of all responses from wave (rỗng nếu dùng response_handler)
         """
         all_responses = []
         batch_count = (len(requests_for_wave) + batch_size - 1) // batch_size
@@ -300,14 +493,23 @@ class FacebookAdsBaseReporter:
             urls_for_batch = [req["url"] for req in batch_slice]
             batch_number = (i // batch_size) + 1
             
-            batch_responses = self._execute_single_batch(
-                urls_for_batch,
-                batch_slice,
-                batch_number,
-                wave_number
-            )
+            self._wait_for_usage_governor(batch_slice)
             
-            all_responses.extend(batch_responses)
+            if response_handler:
+                self._execute_single_batch_streaming(
+                    urls_for_batch,
+                    batch_slice,
+                    batch_number,
+                    response_handler
+                )
+            else:
+                batch_responses = self._execute_single_batch(
+                    urls_for_batch,
+                    batch_slice,
+                    batch_number,
+                    wave_number
+                )
+                all_responses.extend(batch_responses)
             
             # Sleep giữa các batches (trừ batch cuối)
             if i + batch_size < len(requests_for_wave):
@@ -315,6 +517,118 @@ class FacebookAdsBaseReporter:
         
         return all_responses
     
+    def _execute_and_process_wave(
+        self,
+        requests_for_wave: List[Dict],
+        selected_fields: List[str],
+        batch_size: int,
+        sleep_time: float,
+        wave_number: int
+    ) -> Dict[str, Any]:
+        """
+        Chạy một wave và xử lý responses bằng _process_wave_responses của subclass.
+        Ở chế độ streaming, mỗi response được xử lý ngay khi parse xong và kết quả
+        được gộp lại (list → extend, dict → update).
+        
+        Returns:
+            Kết quả giống _process_wave_responses
+        """
+        if not self.stream_responses:
+            all_responses = self._execute_wave(requests_for_wave, batch_size, sleep_time, wave_number)
+            return self._process_wave_responses(all_responses, selected_fields)
+        
+        wave_result = {"data_rows": [], "next_wave_requests": [], "failed_requests": []}
+        
+        def handle_response(response):
+            processed = self._process_wave_responses([response], selected_fields)
+            for key, value in processed.items():
+                if isinstance(value, dict):
+                    wave_result.setdefault(key, {}).update(value)
+                else:
+                    wave_result.setdefault(key, []).extend(value)
+        
+        self._execute_wave(requests_for_wave, batch_size, sleep_time, wave_number, response_handler=handle_response)
+        return wave_result
+
+    # ==================== ACCOUNT PRE-FLIGHT ====================
+
+    def _create_account_preflight_url(self, account: Dict[str, str], date_chunks: List[Dict[str, str]]) -> str:
+        """URL insights level=account, 1 dòng cho mỗi time range có spend > 0"""
+        params = {
+            "level": "account",
+            "fields": "account_id,spend",
+            "time_ranges": json.dumps([{"since": c["start"], "until": c["end"]} for c in date_chunks]),
+            "filtering": json.dumps([{
+                "field": "spend",
+                "operator": "GREATER_THAN",
+                "value": "0"
+            }]),
+            "limit": len(date_chunks)
+        }
+
+        from urllib.parse import urlencode
+        return f"{account['id']}/insights?{urlencode(params)}"
+
+    def _preflight_active_chunks(
+        self,
+        accounts_to_process: List[Dict[str, str]],
+        date_chunks: List[Dict[str, str]]
+    ) -> Optional[Dict[str, List[Dict[str, str]]]]:
+        """
+        Pre-flight rẻ ở level=account để bỏ các cặp account x chunk không có chi tiêu
+        trước khi lập các wave ad/adset-level tốn kém.
+
+        Mỗi account chỉ tốn 1 request (time_ranges = tất cả chunks), gửi chung trong batch.
+        Account lỗi được giữ nguyên toàn bộ chunks để không mất dữ liệu.
+
+        Returns:
+            {account_id: [chunks có spend > 0]}, hoặc None nếu pre-flight bị tắt/thất bại
+        """
+        if not self.ACCOUNT_PREFLIGHT or not accounts_to_process or not date_chunks:
+            return None
+
+        preflight_requests = []
+        for account in accounts_to_process:
+            for chunk_group in self._chunk_list(date_chunks, self.PREFLIGHT_MAX_TIME_RANGES):
+                preflight_requests.append({
+                    "url": self._create_account_preflight_url(account, chunk_group),
+                    "metadata": {"account": account, "chunks": chunk_group, "phase": "preflight"}
+                })
+
+        self._report_progress(f"Pre-flight: kiểm tra chi tiêu của {len(accounts_to_process)} accounts...")
+
+        try:
+            responses = self._execute_wave(
+                preflight_requests,
+                self.DEFAULT_BATCH_SIZE,
+                self.DEFAULT_SLEEP_TIME,
+                wave_number=0
+            )
+        except Exception as e:
+            logger.warning(f"Pre-flight thất bại, giữ nguyên toàn bộ requests: {e}")
+            return None
+
+        active_chunks = {account["id"]: [] for account in accounts_to_process}
+        for response in responses:
+            account_id = response["metadata"]["account"]["id"]
+            chunks = response["metadata"]["chunks"]
+
+            if response.get("status_code") != 200:
+                active_chunks[account_id].extend(chunks)
+                continue
+
+            spend_starts = {
+                row.get("date_start")
+                for row in (response.get("data") or {}).get("data", [])
+                if float(row.get("spend") or 0) > 0
+            }
+            active_chunks[account_id].extend(c for c in chunks if c["start"] in spend_starts)
+
+        total = len(accounts_to_process) * len(date_chunks)
+        kept = sum(len(chunks) for chunks in active_chunks.values())
+        self._report_progress(f"Pre-flight: giữ {kept}/{total} account x chunk có chi tiêu")
+        return active_chunks
+
     # ==================== HELPER FUNCTIONS ====================
     
     @staticmethod
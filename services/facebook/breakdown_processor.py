@@ -452,20 +452,15 @@ class FacebookBreakdownReporter(FacebookAdsBaseReporter):
             self._report_progress(f"Đang xử lý đợt {wave_count}...", 20 + (wave_count * 10))
             
             try:
-                # Execute wave
-                all_responses_for_wave = self._execute_wave(
+                # Execute wave & process responses
+                wave_result = self._execute_and_process_wave(
                     requests_for_current_wave,
+                    selected_fields,
                     self.DEFAULT_BATCH_SIZE,
                     self.DEFAULT_SLEEP_TIME,
                     wave_count
                 )
                 
-                # Process responses
-                wave_result = self._process_wave_responses(
-                    all_responses_for_wave,
-                    selected_fields
-                )
-                
                 # Collect data
                 all_data_rows.extend(wave_result["data_rows"])
                 all_failed_requests.extend(wave_result["failed_requests"])
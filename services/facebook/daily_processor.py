@@ -193,18 +193,24 @@ class FacebookDailyReporter(FacebookAdsBaseReporter):
         date_chunks: List[Dict[str, str]],
         level: str,
         template_config: Dict[str, Any],
-        selected_fields: List[str]
+        selected_fields: List[str],
+        active_chunks: Optional[Dict[str, List[Dict[str, str]]]] = None
     ) -> List[Dict[str, Any]]:
         """
         Chuẩn bị tất cả requests ban đầu.
         
+        Args:
+            active_chunks: Kết quả pre-flight {account_id: chunks có spend},
+                None = dùng toàn bộ date_chunks
+        
         Returns:
             List of {"url": str, "metadata": dict}
         """
         all_requests = []
         
         for account in accounts_to_process:
-            for chunk in date_chunks:
+            account_chunks = date_chunks if active_chunks is None else active_chunks.get(account["id"], date_chunks)
+            for chunk in account_chunks:
                 if level in ["account", "campaign"]:
                     url = self._create_flat_level_url(account, chunk, template_config, selected_fields)
                 else:
@@ -645,14 +651,20 @@ class FacebookDailyReporter(FacebookAdsBaseReporter):
         date_chunks = self._generate_monthly_date_chunks(start_date, end_date)
         logger.info(f"Chia thành {len(date_chunks)} date chunks")
         
-        # Prepare initial requests
+        # Pre-flight: bỏ các account x chunk không có chi tiêu trước khi lập wave
         level = template_config["api_params"]["level"]
+        active_chunks = None
+        if level != "account":
+            active_chunks = self._preflight_active_chunks(accounts_to_process, date_chunks)
+        
+        # Prepare initial requests
         all_initial_requests = self._prepare_initial_requests(
             accounts_to_process,
             date_chunks,
             level,
             template_config,
-            selected_fields
+            selected_fields,
+            active_chunks
         )
         
         logger.info(f"✓ Đã chuẩn bị {len(all_initial_requests)} requests ban đầu.")
@@ -668,20 +680,15 @@ class FacebookDailyReporter(FacebookAdsBaseReporter):
             self._report_progress(f"Đang xử lý đợt {wave_count}...", 20 + (wave_count * 10))
             
             try:
-                # Execute wave
-                all_responses_for_wave = self._execute_wave(
+                # Execute wave & process responses
+                wave_result = self._execute_and_process_wave(
                     requests_for_current_wave,
+                    selected_fields,
                     self.DEFAULT_BATCH_SIZE,
                     self.DEFAULT_SLEEP_TIME,
                     wave_count
                 )
                 
-                # Process responses
-                wave_result = self._process_wave_responses(
-                    all_responses_for_wave,
-                    selected_fields
-                )
-                
                 # Collect data
                 all_data_rows.extend(wave_result["data_rows"])
                 all_failed_requests.extend(wave_result["failed_requests"])
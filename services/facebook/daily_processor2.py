@@ -27,6 +27,7 @@ class FacebookDailyReporterV2(FacebookAdsBaseReporter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.page_map = {}
+        self.chunk_factor = 1  # Hệ số chia nhỏ chunk tháng (JobPlanner có thể tăng)
     
     # ==================== PHASE 1: INSIGHTS ====================
     
@@ -166,13 +167,15 @@ class FacebookDailyReporterV2(FacebookAdsBaseReporter):
         accounts_to_process: List[Dict[str, str]],
         date_chunks: List[Dict[str, str]],
         template_config: Dict[str, Any],
-        selected_fields: List[str]
+        selected_fields: List[str],
+        active_chunks: Optional[Dict[str, List[Dict[str, str]]]] = None
     ) -> List[Dict[str, Any]]:
-        """Prepare insights requests (Phase 1)"""
+        """Prepare insights requests (Phase 1), bỏ các account x chunk bị pre-flight loại"""
         requests = []
         
         for account in accounts_to_process:
-            for chunk in date_chunks:
+            account_chunks = date_chunks if active_chunks is None else active_chunks.get(account["id"], date_chunks)
+            for chunk in account_chunks:
                 url = self._create_insights_url(
                     account, chunk, template_config, selected_fields
                 )
@@ -470,14 +473,18 @@ class FacebookDailyReporterV2(FacebookAdsBaseReporter):
             self.page_map = self.get_accessible_page_map()
         
         # Prepare date chunks
-        date_chunks = self._generate_monthly_date_chunks(start_date, end_date)
+        date_chunks = self._generate_monthly_date_chunks(start_date, end_date, self.chunk_factor)
         
         # ===== PHASE 1: FETCH INSIGHTS =====
         logger.info("\n===== PHASE 1: FETCHING INSIGHTS =====")
         self._report_progress("Đang lấy insights data...", 20)
         
+        active_chunks = None
+        if level != "account":
+            active_chunks = self._preflight_active_chunks(accounts_to_process, date_chunks)
+        
         insights_requests = self._prepare_insights_requests(
-            accounts_to_process, date_chunks, template_config, selected_fields
+            accounts_to_process, date_chunks, template_config, selected_fields, active_chunks
         )
         
         all_insights_data = []
@@ -487,14 +494,13 @@ class FacebookDailyReporterV2(FacebookAdsBaseReporter):
         while requests_for_wave:
             logger.info(f"Processing insights wave {wave_count}...")
             
-            responses = self._execute_wave(
+            wave_result = self._execute_and_process_wave(
                 requests_for_wave,
+                selected_fields,
                 self.DEFAULT_BATCH_SIZE,
                 self.DEFAULT_SLEEP_TIME,
                 wave_count
             )
-            
-            wave_result = self._process_wave_responses(responses, selected_fields)
             all_insights_data.extend(wave_result["data_rows"])
             requests_for_wave = wave_result["next_wave_requests"]
             wave_count += 1
@@ -526,15 +532,14 @@ class FacebookDailyReporterV2(FacebookAdsBaseReporter):
         while requests_for_wave:
             logger.info(f"Processing metadata wave {wave_count}: {len(requests_for_wave)} requests")
             
-            responses = self._execute_wave(
+            wave_result = self._execute_and_process_wave(
                 requests_for_wave,
+                selected_fields,
                 self.DEFAULT_BATCH_SIZE,
                 self.DEFAULT_SLEEP_TIME,
                 wave_count
             )
-            
-            wave_result = self._process_wave_responses(responses, selected_fields)
-            combined_metadata.update(wave_result["metadata_map"])
+            combined_metadata.update(wave_result.get("metadata_map", {}))
             requests_for_wave = wave_result["next_wave_requests"]
             wave_count += 1
         
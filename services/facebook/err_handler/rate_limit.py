@@ -5,7 +5,8 @@
 
 import time
 import logging
-from typing import Dict, Any, List
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 from services.facebook.err_handler.facebook_error_handler import FacebookErrorHandler, FacebookErrorType
 
 logger = logging.getLogger(__name__)
@@ -20,12 +21,53 @@ class EnhancedBackoffHandler:
     MAX_BACKOFF_SECONDS = 360  # 6 minutes
     PLUS_BACKOFF_SEC = 5  # Extra buffer time
     
+    # Ngưỡng app/account usage (%) và thời gian chờ tương ứng
+    USAGE_WARNING_PCT = 75
+    USAGE_CRITICAL_PCT = 95
+    USAGE_WARNING_BACKOFF_SEC = 60   # 1 minute
+    USAGE_CRITICAL_BACKOFF_SEC = 300  # 5 minutes
+    
+    # Ngưỡng total_time / total_cputime (%) của business use case
+    TIME_WARNING_PCT = 70
+    TIME_CRITICAL_PCT = 90
+    TIME_WARNING_BACKOFF_SEC = 120
+    TIME_CRITICAL_BACKOFF_SEC = 300
+    FAST_RATE_BACKOFF_SEC = 60  # Gọi quá nhanh (nhiều call, mỗi call < 0.5s)
+    
+    # Mã lỗi rate limit tính trên cả app/user, không gắn với một ad account
+    APP_RATE_LIMIT_CODES = {4, 17, 613}
+    
+    # Pacing theo xu hướng usage (thay cho các bước WARNING ở trên khi PACING_ENABLED):
+    # ước lượng mức tăng usage mỗi batch từ các summary liên tiếp và giãn nhịp gửi dần dần
+    # để usage dừng ngay dưới PACING_TARGET_PCT. Các bước CRITICAL vẫn giữ làm lưới an toàn.
+    PACING_ENABLED = True
+    PACING_START_PCT = 50     # Bắt đầu giãn nhịp từ mức usage này
+    PACING_TARGET_PCT = 90    # Mức usage muốn giữ ổn định (dưới USAGE_CRITICAL_PCT)
+    PACING_DECAY_PCT_PER_SEC = 100 / 3600  # Usage tự giảm theo cửa sổ trượt 1 giờ của Facebook
+    PACING_SMOOTHING = 0.5    # Trọng số EWMA cho mức tăng mỗi batch
+    PACING_MAX_DELAY_SEC = 300  # Phải nhỏ hơn MAX_BACKOFF_SECONDS
+    
     def __init__(self, reporter):
         """
         Args:
             reporter: FacebookAdsBaseReporter instance (để access _report_progress)
         """
         self.reporter = reporter
+        self.reset_pacing()
+    
+    def reset_pacing(self):
+        """Xóa lịch sử usage dùng cho pacing (ví dụ khi replay lại từ đầu)."""
+        self._usage_history: Dict[str, Dict[str, float]] = {}
+        self._last_observed_at: Optional[float] = None
+        self._last_backoff_sec = 0.0
+    
+    def backoff_with_buffer(self, decision: Dict[str, Any]) -> float:
+        """Thời gian chờ thực tế của một quyết định: pacing không cộng PLUS_BACKOFF_SEC."""
+        if not decision["should_backoff"]:
+            return 0.0
+        if decision["source"] == "usage_pacing":
+            return float(decision["backoff_seconds"])
+        return float(decision["backoff_seconds"] + self.PLUS_BACKOFF_SEC)
     
     def analyze_and_backoff(
         self, 
@@ -42,6 +84,67 @@ class EnhancedBackoffHandler:
         Raises:
             Exception: Nếu backoff time quá MAX_BACKOFF_SECONDS
         """
+        # 1-3. Quyết định thời gian backoff từ responses + summary
+        decision = self.calculate_backoff(responses, summary)
+        if not decision["should_backoff"]:
+            return 0
+        
+        backoff_seconds = decision["backoff_seconds"]
+        reason = decision["reason"]
+        
+        if decision["source"] == "response_errors":
+            self._share_block(decision, summary)
+        
+        # 4. Check if backoff is too long
+        if backoff_seconds > self.MAX_BACKOFF_SECONDS:
+            error_msg = (
+                f"Rate limit backoff quá lâu ({backoff_seconds}s > {self.MAX_BACKOFF_SECONDS}s). "
+                f"Lý do: {reason}"
+            )
+            logger.error(error_msg)
+            self.reporter._report_progress(message=error_msg)
+            raise Exception(error_msg)
+        
+        # 5. Perform backoff
+        total_backoff = self.backoff_with_buffer(decision)
+        
+        if decision["source"] == "usage_pacing":
+            # Delay nhỏ và đều đặn, không cần báo progress mỗi batch
+            logger.info(f"  ⏱ Pacing {total_backoff}s. Lý do: {reason}")
+            self._record_backoff("usage_pacing", total_backoff)
+            time.sleep(total_backoff)
+            return total_backoff
+        
+        logger.warning(f"⚠ Rate limit detected. Chờ {total_backoff}s. Lý do: {reason}")
+        self.reporter._report_progress(
+            message=f"⚠ Rate limit detected. Chờ {total_backoff}s. Lý do: {reason}"
+        )
+        
+        self._record_backoff(decision["source"], total_backoff)
+        time.sleep(total_backoff)
+        
+        logger.info("✓ Backoff hoàn tất, tiếp tục xử lý.")
+        self.reporter._report_progress(message="✓ Backoff hoàn tất, tiếp tục xử lý.")
+
+        return total_backoff
+    
+    def calculate_backoff(
+        self,
+        responses: List[Dict[str, Any]],
+        summary: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Tính thời gian backoff cần thiết (không sleep), dùng chung cho analyze_and_backoff
+        và replay simulator.
+        
+        Returns:
+            {
+                "should_backoff": bool,
+                "backoff_seconds": int,  # Chưa cộng PLUS_BACKOFF_SEC
+                "reason": str,
+                "source": "response_errors" | "usage_summary" | "usage_pacing" | None
+            }
+        """
         # 1. Analyze individual responses for rate limit errors
         response_backoff = self._analyze_response_errors(responses)
         
@@ -56,7 +159,9 @@ class EnhancedBackoffHandler:
         should_backoff = response_backoff["should_backoff"] or summary_backoff["should_backoff"]
         
         if not should_backoff:
-            return 0
+            decision = {"should_backoff": False, "backoff_seconds": 0, "reason": None, "source": None}
+            self._remember_backoff(summary, decision)
+            return decision
         
         backoff_seconds = max(
             response_backoff.get("backoff_seconds", 0),
@@ -70,32 +175,56 @@ class EnhancedBackoffHandler:
         if summary_backoff.get("reason"):
             reasons.append(summary_backoff["reason"])
         
-        reason = " + ".join(reasons)
-        
-        # 4. Check if backoff is too long
-        if backoff_seconds > self.MAX_BACKOFF_SECONDS:
-            error_msg = (
-                f"Rate limit backoff quá lâu ({backoff_seconds}s > {self.MAX_BACKOFF_SECONDS}s). "
-                f"Lý do: {reason}"
-            )
-            logger.error(error_msg)
-            self.reporter._report_progress(message=error_msg)
-            raise Exception(error_msg)
-        
-        # 5. Perform backoff
-        total_backoff = backoff_seconds + self.PLUS_BACKOFF_SEC
+        if response_backoff.get("backoff_seconds", 0) >= summary_backoff.get("backoff_seconds", 0):
+            source = "response_errors"
+        else:
+            source = "usage_pacing" if summary_backoff.get("pacing") else "usage_summary"
+        decision = {
+            "should_backoff": True,
+            "backoff_seconds": backoff_seconds,
+            "reason": " + ".join(reasons),
+            "source": source,
+            "rate_limit_errors": response_backoff.get("rate_limit_errors", [])
+        }
+        self._remember_backoff(summary, decision)
+        return decision
+    
+    def _remember_backoff(self, summary: Optional[Dict[str, Any]], decision: Dict[str, Any]):
+        """Lưu thời gian chờ sau summary này, để tách thời gian làm việc của batch kế tiếp."""
+        if summary:
+            self._last_backoff_sec = self.backoff_with_buffer(decision)
+    
+    def _share_block(self, decision: Dict[str, Any], summary: Optional[Dict[str, Any]]):
+        """
+        Báo lỗi rate limit trong response cho usage governor để các job khác cùng dừng:
+        - Lỗi cấp app (4/17/613): chặn cả app, trừ khi summary đã có ETA (governor.update đã ghi).
+        - Lỗi cấp account (80000, ...): chặn các account gặp lỗi.
+        """
+        governor = getattr(self.reporter, "usage_governor", None)
+        if not governor:
+            return
         
-        logger.warning(f"⚠ Rate limit detected. Chờ {total_backoff}s. Lý do: {reason}")
-        self.reporter._report_progress(
-            message=f"⚠ Rate limit detected. Chờ {total_backoff}s. Lý do: {reason}"
-        )
+        errors = decision.get("rate_limit_errors", [])
+        seconds = self.backoff_with_buffer(decision)
         
-        time.sleep(total_backoff)
+        app_errors = [err for err in errors if err["error_code"] in self.APP_RATE_LIMIT_CODES]
+        account_details = ((summary or {}).get("rate_limits") or {}).get("account_details", [])
+        has_eta = any((account.get("eta_seconds") or 0) > 0 for account in account_details)
+        if app_errors and not has_eta:
+            governor.block(seconds)
         
-        logger.info("✓ Backoff hoàn tất, tiếp tục xử lý.")
-        self.reporter._report_progress(message="✓ Backoff hoàn tất, tiếp tục xử lý.")
-
-        return total_backoff
+        account_ids = {
+            err["account_id"] for err in errors
+            if err["error_code"] not in self.APP_RATE_LIMIT_CODES and err.get("account_id")
+        }
+        if account_ids:
+            governor.block(seconds, account_ids=account_ids)
+    
+    def _record_backoff(self, reason: str, seconds: float):
+        """Ghi thời gian backoff vào limiter stats của reporter (nếu có)"""
+        metrics = getattr(self.reporter, "limiter_metrics", None)
+        if metrics:
+            metrics.record_backoff("facebook", reason, seconds)
     
     def _analyze_response_errors(self, responses: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -133,8 +262,10 @@ class EnhancedBackoffHandler:
                 if backoff_time > max_backoff:
                     max_backoff = backoff_time
                 
+                account = (response.get("metadata") or {}).get("account")
                 rate_limit_errors.append({
                     "url": response.get("original_url", "unknown"),
+                    "account_id": account.get("id") if isinstance(account, dict) else None,
                     "error_code": error_info["error_code"],
                     "error_subcode": error_info.get("error_subcode"),
                     "rate_limit_type": error_info.get("rate_limit_type"),
@@ -188,14 +319,15 @@ class EnhancedBackoffHandler:
         rate_limits = summary["rate_limits"]
         max_backoff_seconds = 0
         backoff_reason = None
+        use_warning_steps = not self.PACING_ENABLED
         
         # 1. Check app-level usage
         app_usage = rate_limits.get("app_usage_pct", 0)
-        if app_usage >= 95:
-            max_backoff_seconds = max(max_backoff_seconds, 300)  # 5 minutes
+        if app_usage >= self.USAGE_CRITICAL_PCT:
+            max_backoff_seconds = max(max_backoff_seconds, self.USAGE_CRITICAL_BACKOFF_SEC)
             backoff_reason = f"App usage cao: {app_usage}%"
-        elif app_usage >= 75:
-            max_backoff_seconds = max(max_backoff_seconds, 60)  # 1 minute
+        elif use_warning_steps and app_usage >= self.USAGE_WARNING_PCT:
+            max_backoff_seconds = max(max_backoff_seconds, self.USAGE_WARNING_BACKOFF_SEC)
             backoff_reason = f"App usage vừa phải: {app_usage}%"
         
         # 2. Check account-level limits
@@ -205,11 +337,11 @@ class EnhancedBackoffHandler:
             
             # 2a. Insights usage
             insights_usage = account.get("insights_usage_pct", 0)
-            if insights_usage >= 95:
-                max_backoff_seconds = max(max_backoff_seconds, 300)
+            if insights_usage >= self.USAGE_CRITICAL_PCT:
+                max_backoff_seconds = max(max_backoff_seconds, self.USAGE_CRITICAL_BACKOFF_SEC)
                 backoff_reason = f"Account {account_id} insights usage cao: {insights_usage}%"
-            elif insights_usage >= 75:
-                max_backoff_seconds = max(max_backoff_seconds, 60)
+            elif use_warning_steps and insights_usage >= self.USAGE_WARNING_PCT:
+                max_backoff_seconds = max(max_backoff_seconds, self.USAGE_WARNING_BACKOFF_SEC)
                 backoff_reason = f"Account {account_id} insights usage vừa: {insights_usage}%"
             
             # 2b. ETA from business use cases
@@ -231,25 +363,106 @@ class EnhancedBackoffHandler:
                     total_time, 
                     total_cputime, 
                     call_count,
-                    use_case_type
+                    use_case_type,
+                    use_warning_steps
                 )
                 
                 if time_based_backoff["backoff_seconds"] > max_backoff_seconds:
                     max_backoff_seconds = time_based_backoff["backoff_seconds"]
                     backoff_reason = time_based_backoff["reason"]
         
+        # 3. Pacing theo xu hướng usage (chỉ dùng khi không có backoff nào lớn hơn)
+        pacing = self._calculate_pacing_delay(summary) if self.PACING_ENABLED else None
+        if pacing and pacing["backoff_seconds"] > max_backoff_seconds:
+            return {
+                "should_backoff": True,
+                "backoff_seconds": pacing["backoff_seconds"],
+                "reason": pacing["reason"],
+                "pacing": True
+            }
+        
         return {
             "should_backoff": max_backoff_seconds > 0,
             "backoff_seconds": max_backoff_seconds,
             "reason": backoff_reason
         }
     
+    @staticmethod
+    def _usage_meters(rate_limits: Dict[str, Any]) -> Dict[str, float]:
+        """Các chỉ số usage (%) trong summary: app, insights từng account, total_time/cputime từng BUC."""
+        meters = {"App usage": float(rate_limits.get("app_usage_pct") or 0)}
+        for account in rate_limits.get("account_details", []):
+            account_id = account.get("account_id", "unknown")
+            meters[f"Account {account_id} insights usage"] = float(account.get("insights_usage_pct") or 0)
+            for use_case in account.get("business_use_cases", []):
+                use_case_type = use_case.get("type", "unknown")
+                meters[f"Account {account_id} {use_case_type} total_time"] = float(use_case.get("total_time") or 0)
+                meters[f"Account {account_id} {use_case_type} CPU time"] = float(use_case.get("total_cputime") or 0)
+        return meters
+    
+    @staticmethod
+    def _summary_time(summary: Dict[str, Any]) -> float:
+        try:
+            return datetime.fromisoformat(str(summary.get("timestamp"))).timestamp()
+        except (TypeError, ValueError):
+            return time.time()
+    
+    def _calculate_pacing_delay(self, summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Mô hình pacing cho từng meter usage:
+        
+        - Mức tăng mỗi batch: growth = Δusage + phần usage tự giảm trong khoảng giữa 2 summary
+          (cửa sổ trượt 1 giờ), làm mượt bằng EWMA.
+        - Để usage đứng yên, mỗi chu kỳ batch phải dài growth / DECAY giây. Từ PACING_START_PCT
+          đến PACING_TARGET_PCT chu kỳ mong muốn tăng tuyến tính đến mức cân bằng đó, nên tốc độ
+          gửi giảm dần thay vì dừng hẳn. Vượt target thì chờ thêm phần usage vượt / DECAY.
+        - Delay = chu kỳ mong muốn - thời gian làm việc của batch (không tính lần chờ trước).
+        
+        Returns:
+            {"backoff_seconds": float, "reason": str} hoặc None nếu không cần giãn nhịp
+        """
+        observed_at = self._summary_time(summary)
+        elapsed = None
+        if self._last_observed_at is not None and observed_at > self._last_observed_at:
+            elapsed = observed_at - self._last_observed_at
+        work_sec = max(0.0, elapsed - self._last_backoff_sec) if elapsed is not None else 0.0
+        if elapsed is not None or self._last_observed_at is None:
+            self._last_observed_at = observed_at
+        
+        best = None
+        for meter, usage in self._usage_meters(summary.get("rate_limits", {})).items():
+            history = self._usage_history.get(meter)
+            growth = history["growth"] if history else None
+            if history and elapsed is not None:
+                consumed = max(0.0, usage - history["usage"] + self.PACING_DECAY_PCT_PER_SEC * elapsed)
+                growth = consumed if growth is None else (
+                    self.PACING_SMOOTHING * consumed + (1 - self.PACING_SMOOTHING) * growth
+                )
+            self._usage_history[meter] = {"usage": usage, "growth": growth}
+            
+            if usage < self.PACING_START_PCT:
+                continue
+            
+            ramp = min(1.0, (usage - self.PACING_START_PCT) / max(1e-9, self.PACING_TARGET_PCT - self.PACING_START_PCT))
+            cycle_sec = ramp * (growth or 0.0) / self.PACING_DECAY_PCT_PER_SEC
+            overshoot_sec = max(0.0, usage - self.PACING_TARGET_PCT) / self.PACING_DECAY_PCT_PER_SEC
+            delay = min(self.PACING_MAX_DELAY_SEC, max(0.0, cycle_sec - work_sec) + overshoot_sec)
+            
+            if delay > 0 and (best is None or delay > best["backoff_seconds"]):
+                growth_text = f", tăng ~{growth:.2f}%/batch" if growth else ""
+                best = {
+                    "backoff_seconds": round(delay, 2),
+                    "reason": f"Pacing {meter}: {usage}%{growth_text}"
+                }
+        return best
+    
     def _calculate_time_based_backoff(
         self,
         total_time: int,
         total_cputime: int,
         call_count: int,
-        use_case_type: str
+        use_case_type: str,
+        use_warning_steps: bool = True
     ) -> Dict[str, Any]:
         """
         Calculate backoff based on API time metrics.
@@ -268,6 +481,7 @@ class EnhancedBackoffHandler:
             total_cputime: CPU time in seconds
             call_count: Number of API calls made
             use_case_type: "ads_management", "ads_insights", etc.
+            use_warning_steps: False khi pacing đã thay cho các bước WARNING
             
         Returns:
             {"backoff_seconds": int, "reason": str}
@@ -275,50 +489,35 @@ class EnhancedBackoffHandler:
         backoff_seconds = 0
         reason = None
         
-        THRESHOLDS = {
-            "ads_management": {
-                "critical_cputime": 90,  
-                "warning_cputime": 70,   
-                "critical_time": 90,
-                "warning_time": 70
-            },
-            "ads_insights": {
-                "critical_cputime": 90,  
-                "warning_cputime": 70,   
-                "critical_time": 90,
-                "warning_time": 70
-            },
-            "default": {
-                "critical_cputime": 90,
-                "warning_cputime": 70,
-                "critical_time": 90,
-                "warning_time": 70
-            }
+        # Hiện tại mọi use case (ads_management, ads_insights, ...) dùng chung ngưỡng
+        thresholds = {
+            "critical_cputime": self.TIME_CRITICAL_PCT,
+            "warning_cputime": self.TIME_WARNING_PCT,
+            "critical_time": self.TIME_CRITICAL_PCT,
+            "warning_time": self.TIME_WARNING_PCT
         }
         
-        thresholds = THRESHOLDS.get(use_case_type, THRESHOLDS["default"])
-        
         if total_cputime >= thresholds["critical_cputime"]:
-            backoff_seconds = 300  
+            backoff_seconds = self.TIME_CRITICAL_BACKOFF_SEC
             reason = f"{use_case_type}: CPU time cao ({total_cputime}s / ~100s limit)"
             
-        elif total_cputime >= thresholds["warning_cputime"]:
-            backoff_seconds = 120  
+        elif use_warning_steps and total_cputime >= thresholds["warning_cputime"]:
+            backoff_seconds = self.TIME_WARNING_BACKOFF_SEC
             reason = f"{use_case_type}: CPU time vừa ({total_cputime}s / ~100s limit)"
         
         if total_time >= thresholds["critical_time"]:
-            backoff_seconds = max(backoff_seconds, 300)
+            backoff_seconds = max(backoff_seconds, self.TIME_CRITICAL_BACKOFF_SEC)
             reason = f"{use_case_type}: Total time cao ({total_time}s)"
                 
-        elif total_time >= thresholds["warning_time"]:
-            backoff_seconds = max(backoff_seconds, 120)
+        elif use_warning_steps and total_time >= thresholds["warning_time"]:
+            backoff_seconds = max(backoff_seconds, self.TIME_WARNING_BACKOFF_SEC)
             if not reason:
                 reason = f"{use_case_type}: Total time vừa ({total_time}s)"
         
         if call_count > 100 and total_time < 100:
             avg_time_per_call = total_time / call_count if call_count > 0 else 0
             if avg_time_per_call < 0.5:
-                backoff_seconds = max(backoff_seconds, 60)
+                backoff_seconds = max(backoff_seconds, self.FAST_RATE_BACKOFF_SEC)
                 if not reason:
                     reason = f"{use_case_type}: Request rate quá nhanh ({call_count} calls in {total_time}s)"
         
@@ -0,0 +1,169 @@
+"""
+Facebook Usage Governor
+Trạng thái usage (app_usage_pct, insights_usage_pct, eta_seconds) dùng chung trong Redis
+cho tất cả các job Facebook, để các job chạy song song cùng giảm tốc thay vì mỗi job tự
+đẩy usage lên 95% rồi cùng ngủ 300s.
+"""
+
+import time
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FacebookUsageGovernor:
+    """
+    Mỗi reporter cập nhật governor bằng summary.rate_limits nhận được sau mỗi batch,
+    và hỏi governor cần chờ bao lâu trước khi gửi batch tiếp theo.
+
+    Redis keys (hash, có TTL):
+        fb_usage:app                   -> usage_pct, updated_at, source, blocked_until
+        fb_usage:account:{account_id}  -> usage_pct, eta_seconds, updated_at, source, blocked_until
+
+    `source` là reporter đã ghi usage mới nhất. Reporter đã tự pacing theo usage của mình
+    (EnhancedBackoffHandler.PACING_ENABLED) hỏi get_delay với skip_source là chính nó: chỉ
+    chờ block/ETA dùng chung và usage do job khác ghi, không ngủ lần hai theo cùng một summary.
+    """
+
+    KEY_PREFIX = "fb_usage"
+    KEY_TTL_SEC = 900
+    STALE_AFTER_SEC = 300  # Số liệu cũ hơn khoảng này không còn dùng để pacing
+
+    # Ngưỡng pacing theo usage (%)
+    SOFT_USAGE_PCT = 50
+    WARNING_USAGE_PCT = 75
+    CRITICAL_USAGE_PCT = 95
+    WARNING_DELAY_SEC = 5
+    HIGH_DELAY_SEC = 30
+    CRITICAL_DELAY_SEC = 60
+
+    def __init__(self, redis_client: Any):
+        self.redis = redis_client
+
+    @staticmethod
+    def _normalize_account_id(account_id: Any) -> str:
+        account_id = str(account_id)
+        return account_id[len("act_"):] if account_id.startswith("act_") else account_id
+
+    def _app_key(self) -> str:
+        return f"{self.KEY_PREFIX}:app"
+
+    def _account_key(self, account_id: Any) -> str:
+        return f"{self.KEY_PREFIX}:account:{self._normalize_account_id(account_id)}"
+
+    # ==================== UPDATE ====================
+
+    def update(self, summary: Optional[Dict[str, Any]], source: Optional[str] = None):
+        """Ghi usage mới nhất từ summary.rate_limits của batch server (source: reporter ghi)."""
+        rate_limits = (summary or {}).get("rate_limits")
+        if not rate_limits:
+            return
+
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+
+            if "app_usage_pct" in rate_limits:
+                pipe.hset(self._app_key(), mapping={
+                    "usage_pct": float(rate_limits.get("app_usage_pct") or 0),
+                    "updated_at": now,
+                    "source": source or "",
+                })
+                pipe.expire(self._app_key(), self.KEY_TTL_SEC)
+
+            for account in rate_limits.get("account_details", []):
+                if not account.get("account_id"):
+                    continue
+                key = self._account_key(account["account_id"])
+                eta = float(account.get("eta_seconds") or 0)
+                mapping = {
+                    "usage_pct": float(account.get("insights_usage_pct") or 0),
+                    "eta_seconds": eta,
+                    "updated_at": now,
+                    "source": source or "",
+                }
+                if eta > 0:
+                    mapping["blocked_until"] = now + eta
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.KEY_TTL_SEC)
+
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không thể cập nhật usage governor: {e}")
+
+    def block(self, seconds: float, account_ids: Optional[Iterable[Any]] = None):
+        """Chặn app (hoặc các account) trong `seconds` giây cho tất cả các job."""
+        if seconds <= 0:
+            return
+
+        blocked_until = time.time() + seconds
+        keys = [self._account_key(a) for a in account_ids] if account_ids else [self._app_key()]
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.hset(key, "blocked_until", blocked_until)
+                pipe.expire(key, max(self.KEY_TTL_SEC, int(seconds) + 60))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không thể ghi trạng thái block vào usage governor: {e}")
+
+    # ==================== CONSULT ====================
+
+    def _pacing_delay(self, usage_pct: float) -> float:
+        """Delay tăng dần theo usage để các job cùng chậm lại trước khi chạm ngưỡng critical."""
+        if usage_pct >= self.CRITICAL_USAGE_PCT:
+            return self.CRITICAL_DELAY_SEC
+        if usage_pct >= self.WARNING_USAGE_PCT:
+            ratio = (usage_pct - self.WARNING_USAGE_PCT) / (self.CRITICAL_USAGE_PCT - self.WARNING_USAGE_PCT)
+            return self.WARNING_DELAY_SEC + ratio * (self.HIGH_DELAY_SEC - self.WARNING_DELAY_SEC)
+        if usage_pct >= self.SOFT_USAGE_PCT:
+            ratio = (usage_pct - self.SOFT_USAGE_PCT) / (self.WARNING_USAGE_PCT - self.SOFT_USAGE_PCT)
+            return ratio * self.WARNING_DELAY_SEC
+        return 0.0
+
+    def get_delay(self, account_ids: Optional[Iterable[Any]] = None, skip_source: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Thời gian nên chờ trước khi gửi batch cho các account này.
+        skip_source: bỏ qua pacing theo usage do chính reporter này ghi (block vẫn được tính).
+
+        Returns:
+            {"delay_seconds": float, "usage_pct": float, "reason": str}
+        """
+        keys = [self._app_key()] + [self._account_key(a) for a in (account_ids or [])]
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            states = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không thể đọc usage governor: {e}")
+            return {"delay_seconds": 0.0, "usage_pct": 0.0, "reason": None}
+
+        now = time.time()
+        delay, max_usage, reason = 0.0, 0.0, None
+
+        for key, state in zip(keys, states):
+            if not state:
+                continue
+
+            blocked_until = float(state.get("blocked_until") or 0)
+            if blocked_until > now and blocked_until - now > delay:
+                delay = blocked_until - now
+                reason = f"{key} bị chặn thêm {delay:.0f}s"
+
+            age = now - float(state.get("updated_at") or 0)
+            if age > self.STALE_AFTER_SEC:
+                continue
+            if skip_source and state.get("source") == skip_source:
+                continue
+
+            usage = float(state.get("usage_pct") or 0)
+            max_usage = max(max_usage, usage)
+            # Delay tính từ lúc ghi nhận usage: job đã ngủ/chạy sau đó bao lâu thì trừ đi bấy nhiêu
+            usage_delay = self._pacing_delay(usage) - age
+            if usage_delay > delay:
+                delay = usage_delay
+                reason = f"{key} usage {usage:.0f}%"
+
+        return {"delay_seconds": round(delay, 2), "usage_pct": max_usage, "reason": reason}
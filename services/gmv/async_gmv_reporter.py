@@ -0,0 +1,204 @@
+"""
+Async GMV Reporter
+Bản asyncio của GMVReporter: HTTP bất đồng bộ (httpx), chờ rate limiter / AIMD bằng asyncio.sleep
+và kiểm tra hủy tác vụ không chặn event loop. Một worker process có thể chạy các bước
+(campaign list, product performance, creative, metadata) của nhiều advertiser cùng lúc
+trên một event loop thay vì mỗi request giữ một thread.
+"""
+
+import time
+import random
+import asyncio
+
+try:
+    import httpx
+except ImportError:  # httpx chỉ cần cho AsyncGMVReporter
+    httpx = None
+
+from .gmv_reporter import GMVReporter
+from ..rate_limiter.fair_queue import FairRateLimiter
+
+
+class AsyncGMVReporter(GMVReporter):
+    """
+    Dùng lại cấu hình, rate limiter, metrics và cache của GMVReporter; các đường I/O được
+    thay bằng coroutine. Rate limiter Redis, AIMD và timeline response dùng chung logic với
+    bản đồng bộ nên quota của advertiser vẫn được chia đúng giữa job sync và async.
+
+    Dùng trong `async with` (hoặc gọi aclose()) để đóng client HTTP và trả token đã thuê,
+    hoặc qua run_sync() từ code đồng bộ. Reporter cụ thể: AsyncGMVCampaignProductDetailReporter.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if httpx is None:
+            raise ImportError("AsyncGMVReporter cần thư viện httpx (pip install httpx).")
+        super().__init__(*args, **kwargs)
+        self._client = None
+        # Bộ đếm được ghi nhận trên event loop nhưng chỉ ghi Redis qua thread (_flush_counters_async)
+        for counter in (self.limiter_metrics, self.api_call_counter):
+            if counter:
+                counter.auto_flush = False
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Client tạo lười trong event loop đang chạy, pool kết nối cỡ như session đồng bộ."""
+        if self._client is None:
+            pool_size = self.HTTP_POOL_MAXSIZE or self.PAGE_CONCURRENCY_MAX * self.CAMPAIGN_BATCH_WORKERS
+            self._client = httpx.AsyncClient(
+                timeout=60,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        return self._client
+
+    async def _close_client(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def aclose(self):
+        await self._close_client()
+        await asyncio.to_thread(self.release_limiters)
+
+    def run_sync(self, func, *args):
+        """
+        Chạy coroutine func(*args) trên event loop riêng cho bên gọi đồng bộ (worker Celery),
+        đóng client HTTP khi xong. Token đã thuê vẫn do bên gọi trả qua release_limiters().
+        """
+        async def main():
+            try:
+                return await func(*args)
+            finally:
+                await self._close_client()
+        return asyncio.run(main())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    # --- Điều khiển tác vụ ---
+    async def _check_for_cancellation_async(self):
+        """Như _check_for_cancellation, lệnh Redis chạy ngoài event loop."""
+        if self.redis_client and self.cancel_key:
+            await asyncio.to_thread(self._check_for_cancellation)
+
+    async def _run_in_parallel_async(self, func, tasks: list, max_concurrency: int = None) -> list:
+        """
+        Chạy coroutine func(*task) cho từng task, tối đa max_concurrency cùng lúc
+        (mặc định CAMPAIGN_BATCH_WORKERS). Kết quả theo thứ tự tasks; một task lỗi
+        thì các task còn lại bị hủy và lỗi được ném lại.
+        """
+        if not tasks:
+            return []
+        semaphore = asyncio.Semaphore(max_concurrency or self.CAMPAIGN_BATCH_WORKERS)
+
+        async def run(task):
+            async with semaphore:
+                return await func(*task)
+
+        pending = [asyncio.ensure_future(run(task)) for task in tasks]
+        try:
+            return await asyncio.gather(*pending)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _flush_counters_async(self):
+        """Ghi limiter stats / số lần gọi API đã đến hạn vào Redis mà không chặn event loop."""
+        for counter in (self.limiter_metrics, self.api_call_counter):
+            if counter and counter.flush_due():
+                await asyncio.to_thread(counter.flush)
+
+    # --- Gọi API ---
+    async def check_rate_limit_async(self, url):
+        rate_limit_key = self._rate_limit_key(url)
+        # gmv_limiter đã bao gồm rule của basic_limiter
+        limiter: FairRateLimiter = self.gmv_limiter if url == self.PERFORMANCE_API_URL else self.basic_limiter
+        await limiter.wait_for_slot_async(rate_limit_key, job_id=self.job_id, weight=self.limiter_weight)
+
+    async def _make_api_request_with_backoff_async(self, url: str, params: dict, max_retries: int = 6, base_delay: int = 3) -> dict | None:
+        """Bản asyncio của _make_api_request_with_backoff (phân loại response qua _handle_api_response dùng chung)."""
+        await self._check_for_cancellation_async()
+        concurrency = self._get_concurrency_limiter(url)
+        client = self._get_client()
+
+        retry_reason = None
+        for attempt in range(max_retries):
+            delay = (base_delay ** (attempt + 1)) + random.uniform(0, 1)
+            latency, overloaded = None, False
+            await concurrency.acquire_async()
+            try:
+                if self.redis_client:
+                    await self.check_rate_limit_async(url)
+                request_started = time.monotonic()
+                response = await client.get(url, params=params, headers=self.request_headers)
+                response.raise_for_status()
+                data = response.json()
+
+                elapsed = time.monotonic() - request_started
+                outcome = self._handle_api_response(url, data, elapsed, attempt, max_retries)
+                if outcome == "ok":
+                    latency = elapsed
+                    return data
+                if outcome == "permission":
+                    return None # Trả về None cho lỗi quyền truy cập
+                retry_reason, overloaded = outcome, True
+
+            except (httpx.HTTPError, ValueError) as e:  # ValueError: body không phải JSON hợp lệ
+                retry_reason = self._handle_network_error(url, e, attempt, max_retries)
+            finally:
+                # Quá tải -> AIMD tạm dừng cả endpoint, các coroutine khác chờ trong acquire_async
+                concurrency.release(latency=latency, overloaded=overloaded, pause_sec=delay)
+                self.log_api_counter(url)
+                await self._flush_counters_async()
+
+            if attempt < max_retries - 1:
+                print(f"  Thử lại sau {delay:.2f} giây.")
+                self._record_backoff(retry_reason or "retry", delay, url)
+                if not overloaded:
+                    await asyncio.sleep(delay)
+
+        print("  [THẤT BẠI] Đã thử lại tối đa.")
+        raise Exception("Hết số lần thử, vui lòng kiểm tra kết nối hoặc trạng thái API và thử lại sau.")
+
+    async def _iter_pages_async(self, url: str, params: dict):
+        """
+        Async generator trả về (page_num, rows) ngay khi từng trang về (trang 1 luôn đầu tiên).
+        Các trang còn lại được gửi cùng lúc; AIMD của endpoint quyết định số request thực sự bay.
+        Nếu bên gọi dừng sớm, các trang chưa xong bị hủy. Trang lỗi được ghi vào failed_chunks.
+        """
+        first_page_data = await self._make_api_request_with_backoff_async(url, {**params, "page": 1})
+        if not first_page_data or first_page_data.get("code") != 0:
+            self._record_page_failure(params)
+            return
+
+        page_data = first_page_data.get("data", {})
+        total_pages = page_data.get("page_info", {}).get("total_page", 1)
+        print(f"   [PHÂN TRANG] Lấy trang 1/{total_pages}. Tổng số trang: {total_pages}.")
+        yield 1, page_data.get("list", []) or page_data.get("store_products", [])
+
+        if total_pages <= 1:
+            return
+
+        async def fetch_page(page_num):
+            data = await self._make_api_request_with_backoff_async(url, {**params, "page": page_num})
+            if data and data.get("code") == 0:
+                page_data = data.get("data", {})
+                print(f"   [PHÂN TRANG] Đã lấy xong trang {page_num}/{total_pages}.")
+                return page_num, page_data.get("list", []) or page_data.get("store_products", [])
+            print(f"   [PHÂN TRANG] Lỗi khi lấy trang {page_num}/{total_pages}.")
+            self._record_page_failure(params)
+            return page_num, []
+
+        pending = [asyncio.ensure_future(fetch_page(page_num)) for page_num in range(2, total_pages + 1)]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                yield await next_done
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _fetch_all_pages_async(self, url: str, params: dict) -> list:
+        """Lấy tất cả các trang, trả về theo đúng thứ tự trang."""
+        pages = {page_num: rows async for page_num, rows in self._iter_pages_async(url, params)}
+        return [row for page_num in sorted(pages) for row in pages[page_num]]
@@ -1,7 +1,8 @@
 import json
 import time
+import threading
+from collections import defaultdict
 from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from .gmv_reporter import GMVReporter
 
@@ -15,9 +16,19 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
     Bao gồm việc lấy dữ liệu hiệu suất theo campaign, sản phẩm, creative,
     kết hợp với thông tin chi tiết từ danh mục sản phẩm.
     """
+    # Số cặp (campaign_id, item_group_id) gộp vào một request metadata creative
+    METADATA_GROUP_SIZE = 20
+    # Số item_group_id mỗi request creative: tính từ số dòng creative/sản phẩm quan sát được
+    # để mỗi request vừa trong 1 trang (page_size 1000)
+    CREATIVE_PAGE_SIZE = 1000
+    CREATIVE_PAGE_FILL = 0.8        # Chừa khoảng trống vì số creative mỗi sản phẩm dao động
+    CREATIVE_CHUNK_DEFAULT = 20     # Khi chưa có số liệu quan sát
+    CREATIVE_CHUNK_MIN = 5
+    CREATIVE_CHUNK_MAX = 100
+    CREATIVE_STATS_SMOOTHING = 0.3  # Trọng số EWMA cho số dòng/sản phẩm
 
     def __init__(self, access_token: str, advertiser_id: str, store_id: str, progress_callback=None,
-                 job_id: str = None, redis_client=None):
+                 job_id: str = None, redis_client=None, db_client=None):
         """
         Khởi tạo reporter.
 
@@ -27,44 +38,81 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
             store_id (str): ID của cửa hàng TikTok Shop.
         """
         
-        super().__init__(access_token, advertiser_id, store_id, progress_callback, job_id, redis_client)
+        super().__init__(access_token, advertiser_id, store_id, progress_callback, job_id, redis_client, db_client)
+        # Số dòng creative trung bình mỗi item_group_id (dùng chung giữa các batch chạy đồng thời)
+        self._creative_rows_per_product = None
+        self._creative_stats_lock = threading.Lock()
 
  
-    def _fetch_creative_metadata(self, campaign_id: str, item_group_id: str, start_date: str, end_date: str) -> list:
-        """Lấy thông tin metadata của creative cho một cặp (campaign_id, item_group_id)."""
+    def _fetch_creative_metadata(self, campaign_ids: list, item_group_ids: list, start_date: str, end_date: str) -> list:
+        """
+        Lấy metadata của creative cho nhiều campaign và item_group trong một lần gọi
+        (filtering nhận list). Mỗi dòng trả về có đủ campaign_id / item_group_id / item_id
+        để gắn lại đúng creative.
+        """
         params = {
             "advertiser_id": self.advertiser_id,
             "store_ids": json.dumps([self.store_id]),
             "start_date": start_date,
             "end_date": end_date,
-            "dimensions": json.dumps(["item_id"]),
+            "dimensions": json.dumps(["campaign_id", "item_group_id", "item_id"]),
             "metrics": json.dumps([
                 "title", "tt_account_name", "tt_account_profile_image_url",
                 "tt_account_authorization_type", "shop_content_type"
             ]),
             "filtering": json.dumps({
-                "campaign_ids": [campaign_id],
-                "item_group_ids": [item_group_id]
+                "campaign_ids": campaign_ids,
+                "item_group_ids": item_group_ids
             }),
             "page_size": 1000,
         }
         
-        return self._fetch_all_pages(self.PERFORMANCE_API_URL, params, throttling_delay=0.3)
+        return self._fetch_all_pages(self.PERFORMANCE_API_URL, params)
+
+    def _fetch_metadata_group(self, pairs: list[tuple], start_date: str, end_date: str) -> dict:
+        """
+        Lấy metadata cho một nhóm cặp (campaign_id, item_group_id).
+        Filtering theo list là tích chéo campaign × item_group, nên chỉ giữ các dòng
+        thuộc đúng các cặp được yêu cầu.
 
-    def _get_product_catalog(self) -> list:
-        """Lấy danh mục sản phẩm từ BC ID hợp lệ đầu tiên tìm thấy."""
-        bc_ids_list = self._get_bc_ids()
-        if not bc_ids_list:
+        Returns:
+            dict: {(campaign_id, item_group_id, item_id): metrics}
+        """
+        campaign_ids = list(dict.fromkeys(cid for cid, _ in pairs))
+        item_group_ids = list(dict.fromkeys(igid for _, igid in pairs))
+        wanted = set(pairs)
+        
+        metadata_map = {}
+        for item in self._fetch_creative_metadata(campaign_ids, item_group_ids, start_date, end_date):
+            dimensions = item.get("dimensions", {})
+            pair = (dimensions.get("campaign_id"), dimensions.get("item_group_id"))
+            if pair in wanted:
+                metadata_map[(*pair, dimensions.get("item_id"))] = item.get("metrics", {})
+        return metadata_map
+
+    def _get_chunk_campaigns(self, chunk_start: str, chunk_end: str) -> list[tuple]:
+        """Lấy danh sách (campaign_id, campaign_name) của một date chunk."""
+        print(f"\n--- XỬ LÝ CHUNK: {chunk_start} to {chunk_end} ---")
+        self._report_progress(f"Xử lý chunk: {chunk_start} to {chunk_end}")
+        params = {
+            "advertiser_id": self.advertiser_id, 
+            "store_ids": json.dumps([self.store_id]),
+            "start_date": chunk_start, 
+            "end_date": chunk_end,
+            "dimensions": json.dumps(["campaign_id"]), 
+            "metrics": json.dumps(["campaign_name"]),
+            "filtering": json.dumps({"gmv_max_promotion_types": ["PRODUCT"]}), 
+            "page_size": 1000,
+        }
+        all_campaign_items = self._fetch_all_pages(self.PERFORMANCE_API_URL, params)
+        
+        if not all_campaign_items:
+            print(f"==> Không tìm thấy campaign nào trong chunk {chunk_start} to {chunk_end}.")
             return []
-        products = []
-        for bc_id in bc_ids_list:
-            bc_products = self._fetch_all_tiktok_products(bc_id)
-            if products:
-                print(f"\n=> Tìm thấy BC ID hợp lệ: {bc_id}. Đã lấy {len(products)} sản phẩm.")
-                self._report_progress(f"Đã lấy {len(products)} sản phẩm.", 80)
-                # return products
-            products.extend(bc_products)
-        return products
+
+        campaigns_map = {item["dimensions"]["campaign_id"]: item["metrics"]["campaign_name"] for item in all_campaign_items}
+        print(f"==> Tìm thấy {len(campaigns_map)} campaigns trong chunk {chunk_start} to {chunk_end}.")
+        return list(campaigns_map.items())
 
     def _process_campaign_batch(self, campaign_batch: list[tuple], start_date: str, end_date: str) -> list:
         """Xử lý một lô campaign để lấy dữ liệu hiệu suất sản phẩm và creative."""
@@ -85,29 +133,40 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
             "filtering": json.dumps({"campaign_ids": batch_ids}),
             "page_size": 1000,
         }
-        product_perf_list = self._fetch_all_pages(self.PERFORMANCE_API_URL, params_product)
-
+        # Xử lý từng trang sản phẩm ngay khi về: đủ một lô item_group_id mới là lấy creative luôn,
+        # trong lúc các trang còn lại vẫn đang tải.
+        product_pages = {}
+        seen_product_ids = set()
+        pending_product_ids = []
+        all_creative_results = []
+        creative_chunk_count = 0
+        
+        for page_num, rows in self._iter_pages(self.PERFORMANCE_API_URL, params_product):
+            product_pages[page_num] = rows
+            for row in rows:
+                product_id = row["dimensions"]["item_group_id"]
+                if product_id not in seen_product_ids:
+                    seen_product_ids.add(product_id)
+                    pending_product_ids.append(product_id)
+            
+            while len(pending_product_ids) >= self._creative_chunk_width():
+                width = self._creative_chunk_width()
+                p_chunk, pending_product_ids = pending_product_ids[:width], pending_product_ids[width:]
+                all_creative_results.extend(self._fetch_creative_chunk(batch_ids, p_chunk, start_date, end_date))
+                creative_chunk_count += 1
+        
+        # Giữ thứ tự trang gốc để kết quả ổn định
+        product_perf_list = [row for page_num in sorted(product_pages) for row in product_pages[page_num]]
         if not product_perf_list:
             print(f"  [KẾT THÚC BATCH] Lô campaigns không có dữ liệu sản phẩm.")
             return list(batch_results.values())
-
-        product_ids = list(set([p["dimensions"]["item_group_id"] for p in product_perf_list]))
-        product_id_chunks = list(self._chunk_list(product_ids, 20))
-        all_creative_results = []
         
-        print(f"  Tìm thấy {len(product_ids)} sản phẩm duy nhất, chia thành {len(product_id_chunks)} lô để lấy creative.")
-        for p_chunk in product_id_chunks:
-            params_creative = {
-                "advertiser_id": self.advertiser_id, "store_ids": json.dumps([self.store_id]),
-                "start_date": start_date, "end_date": end_date,
-                "dimensions": json.dumps(["campaign_id", "item_group_id", "item_id"]),
-                "metrics": json.dumps(["cost","orders","cost_per_order","gross_revenue","roi","product_impressions","product_clicks","product_click_rate","ad_conversion_rate","creative_delivery_status","ad_video_view_rate_2s","ad_video_view_rate_6s","ad_video_view_rate_p25","ad_video_view_rate_p50","ad_video_view_rate_p75","ad_video_view_rate_p100"]),
-                "filtering": json.dumps({"campaign_ids": batch_ids, "item_group_ids": p_chunk}),
-                "page_size": 1000,
-            }
-            creative_results = self._fetch_all_pages(self.PERFORMANCE_API_URL, params_creative)
-            all_creative_results.extend(creative_results)
-            time.sleep(1.2)
+        while pending_product_ids:
+            width = self._creative_chunk_width()
+            p_chunk, pending_product_ids = pending_product_ids[:width], pending_product_ids[width:]
+            all_creative_results.extend(self._fetch_creative_chunk(batch_ids, p_chunk, start_date, end_date))
+            creative_chunk_count += 1
+        print(f"  Tìm thấy {len(seen_product_ids)} sản phẩm duy nhất, đã lấy creative theo {creative_chunk_count} lô.")
         
         enriched_product_list = self._enrich_with_creative_details(product_perf_list, all_creative_results)
         
@@ -119,6 +178,44 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
         print(f"  [HOÀN THÀNH BATCH] Đã xử lý xong lô: {', '.join(batch_names)}")
         return list(batch_results.values())
 
+    def _fetch_creative_chunk(self, batch_ids: list, product_ids: list, start_date: str, end_date: str) -> list:
+        """Lấy hiệu suất creative của một lô item_group_id trong các campaign của batch."""
+        params_creative = {
+            "advertiser_id": self.advertiser_id, "store_ids": json.dumps([self.store_id]),
+            "start_date": start_date, "end_date": end_date,
+            "dimensions": json.dumps(["campaign_id", "item_group_id", "item_id"]),
+            "metrics": json.dumps(["cost","orders","cost_per_order","gross_revenue","roi","product_impressions","product_clicks","product_click_rate","ad_conversion_rate","creative_delivery_status","ad_video_view_rate_2s","ad_video_view_rate_6s","ad_video_view_rate_p25","ad_video_view_rate_p50","ad_video_view_rate_p75","ad_video_view_rate_p100"]),
+            "filtering": json.dumps({"campaign_ids": batch_ids, "item_group_ids": product_ids}),
+            "page_size": 1000,
+        }
+        # Nhịp gửi do Redis limiter quyết định, không cần sleep thêm
+        creative_results = self._fetch_all_pages(self.PERFORMANCE_API_URL, params_creative)
+        self._observe_creative_rows(len(product_ids), len(creative_results))
+        return creative_results
+
+    def _observe_creative_rows(self, product_count: int, row_count: int):
+        """Cập nhật số dòng creative trung bình mỗi item_group_id từ một request vừa xong."""
+        if product_count <= 0:
+            return
+        rows_per_product = row_count / product_count
+        with self._creative_stats_lock:
+            if self._creative_rows_per_product is None:
+                self._creative_rows_per_product = rows_per_product
+            else:
+                self._creative_rows_per_product = (
+                    self.CREATIVE_STATS_SMOOTHING * rows_per_product
+                    + (1 - self.CREATIVE_STATS_SMOOTHING) * self._creative_rows_per_product
+                )
+
+    def _creative_chunk_width(self) -> int:
+        """Số item_group_id mỗi request creative sao cho kết quả vừa 1 trang."""
+        with self._creative_stats_lock:
+            rows_per_product = self._creative_rows_per_product
+        if rows_per_product is None:
+            return self.CREATIVE_CHUNK_DEFAULT
+        width = int(self.CREATIVE_PAGE_SIZE * self.CREATIVE_PAGE_FILL / max(rows_per_product, 1e-6))
+        return max(self.CREATIVE_CHUNK_MIN, min(self.CREATIVE_CHUNK_MAX, width))
+
     # --- CÁC HÀM LÀM GIÀU DỮ LIỆU (STATIC) ---
     @staticmethod
     def _create_product_info_map(product_list: list) -> dict:
@@ -180,12 +277,13 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
     def _enrich_with_creative_metadata(self, performance_results: list) -> list:
         """
         Làm giàu dữ liệu hiệu suất bằng cách thêm metadata cho từng creative.
-        Xử lý gọi API một cách tuần tự.
+        Các cặp (campaign, product) cùng khoảng ngày được gộp thành nhóm METADATA_GROUP_SIZE
+        cặp mỗi request, các nhóm chạy đồng thời dưới Redis limiter.
         """
-        print("Bắt đầu làm giàu dữ liệu với metadata của creative (tuần tự)...")
+        print("Bắt đầu làm giàu dữ liệu với metadata của creative (theo nhóm)...")
         self._report_progress("Làm giàu dữ liệu với metadata của creative")
-        # Tạo danh sách các cặp (campaign, product) cần lấy metadata
-        tasks = []
+        # Gom các cặp (campaign, product) cần lấy metadata theo khoảng ngày
+        pairs_by_range = defaultdict(lambda: defaultdict(list))
         for campaign in performance_results:
             start_date = campaign.get("start_date")
             end_date = campaign.get("end_date")
@@ -194,29 +292,30 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
                 campaign_id = product_perf.get("dimensions", {}).get("campaign_id")
                 # Chỉ thêm vào danh sách nếu có creative cần làm giàu
                 if campaign_id and item_group_id and product_perf.get("creative_details"):
-                    tasks.append((product_perf, campaign_id, item_group_id, start_date, end_date))
+                    pairs_by_range[(start_date, end_date)][(campaign_id, item_group_id)].append(product_perf)
+
+        # Sắp theo campaign để mỗi nhóm trải trên ít campaign nhất (tích chéo filtering nhỏ hơn)
+        groups = []
+        for (s_date, e_date), pairs in pairs_by_range.items():
+            for group in self._chunk_list(sorted(pairs), self.METADATA_GROUP_SIZE):
+                groups.append((group, s_date, e_date))
+        total_pairs = sum(len(pairs) for pairs in pairs_by_range.values())
+        print(f"   {total_pairs} cặp sản phẩm, gộp thành {len(groups)} request metadata.")
+        self._report_progress(f"Lấy metadata: {total_pairs} cặp, {len(groups)} request", 80)
 
-        # Xử lý tuần tự
         self.is_fetching_creative = True
-        for i, (product_perf, cid, igid, s_date, e_date) in enumerate(tasks, 1):
-            print(f"   Đang lấy metadata cho cặp ({cid}, {igid}) - {i}/{len(tasks)}...", end='\r')
-            if (i % 10 == 0):
-                self._report_progress(f"Lấy metadata: {i}/{len(tasks)}", 80)
-            metadata_list = self._fetch_creative_metadata(cid, igid, s_date, e_date)
-            
-            # Tạo map để tra cứu nhanh metadata theo item_id
-            metadata_map = {
-                item.get("dimensions", {}).get("item_id"): item.get("metrics", {})
-                for item in metadata_list
-            }
-            
-            # Gắn metadata vào từng creative
-            for creative in product_perf.get("creative_details", []):
-                item_id = creative.get("item_id")
-                if item_id in metadata_map:
-                    creative["metadata"] = metadata_map[item_id]
+        group_results = self._run_in_parallel(self._fetch_metadata_group, groups)
         self.is_fetching_creative = False
-        print(f"\nHoàn thành làm giàu metadata cho {len(tasks)} cặp sản phẩm.")
+        
+        # Gắn metadata vào từng creative theo (campaign_id, item_group_id, item_id)
+        for (group, s_date, e_date), metadata_map in zip(groups, group_results):
+            for cid, igid in group:
+                for product_perf in pairs_by_range[(s_date, e_date)][(cid, igid)]:
+                    for creative in product_perf.get("creative_details", []):
+                        key = (cid, igid, creative.get("item_id"))
+                        if key in metadata_map:
+                            creative["metadata"] = metadata_map[key]
+        print(f"Hoàn thành làm giàu metadata cho {total_pairs} cặp sản phẩm.")
         return performance_results
 
     @staticmethod
@@ -254,38 +353,22 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
         # date_chunks = self._generate_monthly_date_chunks(start_date, end_date)
         all_performance_results = []
         
-        for chunk in date_chunks:
-            chunk_start, chunk_end = chunk['start'], chunk['end']
-            print(f"\n--- XỬ LÝ CHUNK: {chunk_start} to {chunk_end} ---")
-            self._report_progress(f"Xử lý chunk: {chunk_start} to {chunk_end}")
-            params = {
-                "advertiser_id": self.advertiser_id, 
-                "store_ids": json.dumps([self.store_id]),
-                "start_date": chunk_start, 
-                "end_date": chunk_end,
-                "dimensions": json.dumps(["campaign_id"]), 
-                "metrics": json.dumps(["campaign_name"]),
-                "filtering": json.dumps({"gmv_max_promotion_types": ["PRODUCT"]}), 
-                "page_size": 1000,
-            }
-            all_campaign_items = self._fetch_all_pages(self.PERFORMANCE_API_URL, params)
-            
-            if not all_campaign_items:
-                print(f"==> Không tìm thấy campaign nào trong chunk này.")
-                continue
-
-            campaigns_map = {item["dimensions"]["campaign_id"]: item["metrics"]["campaign_name"] for item in all_campaign_items}
-            print(f"==> Tìm thấy {len(campaigns_map)} campaigns trong chunk này.")
-            
-            campaign_list = list(campaigns_map.items())
-            campaign_batches = list(self._chunk_list(campaign_list, 10))
-            
-            with ThreadPoolExecutor(max_workers=1) as executor: # Giữ max_workers=1 để tránh rate limit
-                future_to_batch = {executor.submit(self._process_campaign_batch, batch, chunk_start, chunk_end): batch for batch in campaign_batches}
-                for future in as_completed(future_to_batch):
-                    batch_result = future.result()
-                    # Chỉ thêm các campaign có dữ liệu
-                    all_performance_results.extend([res for res in batch_result if res.get("performance_data")])
+        # Lấy danh sách campaign của các chunk đồng thời, sau đó xử lý tất cả các lô campaign
+        # trong cùng một pool. Kết quả được gom theo thứ tự (chunk, lô) nên luôn ổn định.
+        chunk_campaigns = self._run_in_parallel(
+            self._get_chunk_campaigns, [(chunk['start'], chunk['end']) for chunk in date_chunks]
+        )
+        
+        batch_tasks = []
+        for chunk, campaign_list in zip(date_chunks, chunk_campaigns):
+            batch_tasks.extend(
+                (batch, chunk['start'], chunk['end']) for batch in self._chunk_list(campaign_list, 10)
+            )
+        
+        print(f"\n==> Xử lý {len(batch_tasks)} lô campaign (tối đa {self.CAMPAIGN_BATCH_WORKERS} lô đồng thời).")
+        for batch_result in self._run_in_parallel(self._process_campaign_batch, batch_tasks):
+            # Chỉ thêm các campaign có dữ liệu
+            all_performance_results.extend([res for res in batch_result if res.get("performance_data")])
 
         print("\n--- HOÀN TẤT GIAI ĐOẠN 1: ĐÃ LẤY XONG DỮ LIỆU HIỆU SUẤT ---")
         
@@ -293,7 +376,11 @@ class GMVCampaignCreativeDetailReporter(GMVReporter):
         print("\n--- GIAI ĐOẠN 2: BẮT ĐẦU LẤY DANH MỤC SẢN PHẨM ---")
         self._report_progress("Bắt đầu lấy dữ liệu sản phẩm...", 50)
 
-        product_catalog = self._get_product_catalog()
+        required_ids = {
+            product.get("dimensions", {}).get("item_group_id")
+            for campaign in all_performance_results for product in campaign.get("performance_data", [])
+        }
+        product_catalog = self._get_store_products(required_ids)
         if not product_catalog:
             print("CẢNH BÁO: Không thể lấy danh mục sản phẩm. Dữ liệu cuối cùng sẽ không có chi tiết sản phẩm.")
 
@@ -1,8 +1,9 @@
 import json
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 from typing import List, Dict, Any
 from .gmv_reporter import GMVReporter
+from .async_gmv_reporter import AsyncGMVReporter
 from dotenv import load_dotenv
 
 # Tải các biến môi trường một lần khi module được import
@@ -16,7 +17,7 @@ class GMVCampaignProductDetailReporter(GMVReporter):
     Đã được nâng cấp với cơ chế backoff và throttling để tăng độ ổn định.
     """
 
-    def __init__(self, access_token: str, advertiser_id: str, store_id: str, progress_callback=None, job_id: str = None, redis_client=None):
+    def __init__(self, access_token: str, advertiser_id: str, store_id: str, progress_callback=None, job_id: str = None, redis_client=None, db_client=None):
         """
         Khởi tạo reporter.
 
@@ -26,60 +27,65 @@ class GMVCampaignProductDetailReporter(GMVReporter):
             store_id (str): ID của cửa hàng TikTok Shop.
         """
         
-        super().__init__(access_token, advertiser_id, store_id, progress_callback, job_id, redis_client)
+        super().__init__(access_token, advertiser_id, store_id, progress_callback, job_id, redis_client, db_client)
         
 
-    def _get_product_map(self) -> dict | None:
-        """Lấy toàn bộ sản phẩm và chuyển thành một dictionary để tra cứu nhanh."""
-        print("\n--- BƯỚC 1: LẤY VÀ CHUẨN BỊ DỮ LIỆU SẢN PHẨM ---")
-        bc_ids = self._get_bc_ids()
-        if not bc_ids:
-            return None
-
-        all_products = []
-        for bc_id in bc_ids:
-            products_list = self._fetch_all_tiktok_products(bc_id)
-            if products_list is not None:
-                print(f"   => THÀNH CÔNG! Tìm thấy BC ID hợp lệ: {bc_id}. Đã lấy {len(products_list)} sản phẩm.")
-                all_products.extend(products_list)
-                # break 
+    def _get_product_map(self, required_item_group_ids=()) -> dict | None:
+        """
+        Lấy danh mục sản phẩm (cache Mongo hoặc API) và chuyển thành một dictionary để tra cứu nhanh.
+        required_item_group_ids: các sản phẩm job cần, thiếu trong cache thì tải lại catalog.
+        """
+        print("\n--- BƯỚC 2: LẤY VÀ CHUẨN BỊ DỮ LIỆU SẢN PHẨM ---")
+        all_products = self._get_store_products(required_item_group_ids)
         
         if not all_products:
             print("   -> Không tìm thấy BC ID nào có thể truy cập sản phẩm của store này.")
             return None
 
-        print("\n>> Bước 1C: Tạo bản đồ sản phẩm để tra cứu nhanh...")
+        print("\n>> Bước 2C: Tạo bản đồ sản phẩm để tra cứu nhanh...")
         product_map = {p['item_group_id']: p for p in all_products}
         print(f"   -> Đã tạo bản đồ cho {len(product_map)} sản phẩm độc nhất.")
         return product_map
 
-    def _get_all_campaigns(self, start_date, end_date):
-        """Lấy tất cả campaign trong một khoảng thời gian."""
-        params = {
+    def _campaign_list_params(self, start_date, end_date) -> dict:
+        return {
             "advertiser_id": self.advertiser_id, "store_ids": json.dumps([self.store_id]),
             "start_date": start_date, "end_date": end_date,
             "dimensions": json.dumps(["campaign_id"]),
             "metrics": json.dumps(["campaign_name", "operation_status", "bid_type"]),
             "filtering": json.dumps({"gmv_max_promotion_types": ["PRODUCT"]}), "page_size": 1000,
         }
-        items = self._fetch_all_pages(self.PERFORMANCE_API_URL, params)
-        return {
-            item["dimensions"]["campaign_id"]: item["metrics"]
-            for item in items
-        }
 
-    def _fetch_data_for_batch(self, campaign_batch, start_date, end_date):
-        """Lấy dữ liệu hiệu suất chi tiết cho một lô campaign."""
-        batch_ids = list(campaign_batch.keys())
-        params = {
+    def _batch_params(self, batch_ids, start_date, end_date) -> dict:
+        return {
             "advertiser_id": self.advertiser_id, "store_ids": json.dumps([self.store_id]),
             "start_date": start_date, "end_date": end_date,
             "dimensions": json.dumps(["campaign_id", "item_group_id", "stat_time_day"]),
             "metrics": json.dumps(["orders", "gross_revenue", "cost", "cost_per_order", "roi"]),
             "filtering": json.dumps({"campaign_ids": batch_ids}), "page_size": 1000,
         }
+
+    def _get_all_campaigns(self, start_date, end_date):
+        """Lấy tất cả campaign trong một khoảng thời gian."""
+        items = self._fetch_all_pages(self.PERFORMANCE_API_URL, self._campaign_list_params(start_date, end_date))
+        return self._campaigns_from_items(items)
+
+    @staticmethod
+    def _campaigns_from_items(items) -> dict:
+        return {
+            item["dimensions"]["campaign_id"]: item["metrics"]
+            for item in items
+        }
+
+    def _fetch_data_for_batch(self, campaign_batch, start_date, end_date):
+        """Lấy dữ liệu hiệu suất chi tiết cho một lô campaign."""
+        params = self._batch_params(list(campaign_batch.keys()), start_date, end_date)
         perf_list = self._fetch_all_pages(self.PERFORMANCE_API_URL, params)
-        
+        return self._group_batch_results(campaign_batch, perf_list, start_date, end_date)
+
+    @staticmethod
+    def _group_batch_results(campaign_batch, perf_list, start_date, end_date):
+        """Gom các bản ghi hiệu suất của một lô vào từng campaign."""
         results = {}
         for cid, info in campaign_batch.items():
             results[cid] = {
@@ -96,6 +102,24 @@ class GMVCampaignProductDetailReporter(GMVReporter):
                 results[cid]["performance_data"].append(record)
         return list(results.values())
 
+    def _build_batch_tasks(self, date_chunks, chunk_campaigns) -> list:
+        """Chia campaign của từng chunk thành các lô 20 campaign: [(lô, start, end), ...]."""
+        batch_tasks = []
+        for chunk, campaigns in zip(date_chunks, chunk_campaigns):
+            print(f"\n>> Chunk {chunk['start']} to {chunk['end']}: {len(campaigns)} campaigns.")
+            batch_tasks.extend(
+                (dict(batch), chunk['start'], chunk['end'])
+                for batch in self._chunk_list(list(campaigns.items()), 20)
+            )
+        return batch_tasks
+
+    @staticmethod
+    def _required_item_group_ids(campaign_results) -> set:
+        return {
+            record.get("dimensions", {}).get("item_group_id")
+            for campaign in campaign_results for record in campaign.get("performance_data", [])
+        }
+
     def _enrich_campaign_data(self, campaign_results, product_map):
         """
         Làm phẳng và gộp dữ liệu. Mỗi bản ghi hiệu suất sẽ là một mục riêng biệt
@@ -153,43 +177,80 @@ class GMVCampaignProductDetailReporter(GMVReporter):
         Hàm chính để chạy toàn bộ quy trình: lấy sản phẩm, lấy hiệu suất
         chiến dịch, và gộp chúng lại.
         """
-        # BƯỚC 1: Lấy dữ liệu sản phẩm
-        self._report_progress("Đang lấy dữ liệu sản phẩm", 5)
-        product_map = self._get_product_map()
-        if not product_map:
-            print("Không thể lấy dữ liệu sản phẩm. Dừng thực thi.")
-            return []
-
-        # BƯỚC 2: Lấy dữ liệu campaign
-        print("\n--- BƯỚC 2: LẤY DỮ LIỆU CAMPAIGN ---")
-        self._report_progress("Bắt đầu lấy dữ liệu campaign", 15)
+        # BƯỚC 1: Lấy dữ liệu campaign (trước, để biết các sản phẩm cần tra trong catalog)
+        print("\n--- BƯỚC 1: LẤY DỮ LIỆU CAMPAIGN ---")
+        self._report_progress("Bắt đầu lấy dữ liệu campaign", 5)
         # date_chunks = self._generate_monthly_date_chunks(start_date, end_date)
         all_campaign_results = []
 
-        for chunk in date_chunks:
-            print(f"\n>> Xử lý chunk: {chunk['start']} to {chunk['end']}")
-            self._report_progress(f"Xử lý chunk: {chunk['start']} to {chunk['end']}", 60)
-            campaigns = self._get_all_campaigns(chunk['start'], chunk['end'])
-            if not campaigns:
-                print("   -> Không có campaign nào trong khoảng thời gian này.")
-                continue
-            
-            print(f"   -> Tìm thấy {len(campaigns)} campaigns. Chia thành lô để xử lý...")
-            batches = list(self._chunk_list(list(campaigns.items()), 20))
-            
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future_to_batch = {
-                    executor.submit(self._fetch_data_for_batch, dict(batch), chunk['start'], chunk['end']): batch
-                    for batch in batches
-                }
-                for future in as_completed(future_to_batch):
-                    all_campaign_results.extend(future.result())
+        # Các chunk và các lô campaign chạy đồng thời, chỉ bị điều tiết bởi Redis limiter.
+        # Kết quả được gom theo thứ tự (chunk, lô) nên luôn ổn định.
+        chunk_campaigns = self._run_in_parallel(
+            self._get_all_campaigns, [(chunk['start'], chunk['end']) for chunk in date_chunks]
+        )
+        batch_tasks = self._build_batch_tasks(date_chunks, chunk_campaigns)
+        
+        self._report_progress(f"Xử lý {len(batch_tasks)} lô campaign", 60)
+        for batch_result in self._run_in_parallel(self._fetch_data_for_batch, batch_tasks):
+            all_campaign_results.extend(batch_result)
+
+        # BƯỚC 2: Lấy dữ liệu sản phẩm
+        self._report_progress("Đang lấy dữ liệu sản phẩm", 70)
+        required_ids = self._required_item_group_ids(all_campaign_results)
+        product_map = self._get_product_map(required_ids)
+        if not product_map:
+            print("Không thể lấy dữ liệu sản phẩm. Dừng thực thi.")
+            return []
 
         # BƯỚC 3: Gộp dữ liệu
         self._report_progress("Bắt đầu gộp dữ liệu...", 80)
         final_data = self._enrich_campaign_data(all_campaign_results, product_map)
         return final_data
 
+
+class AsyncGMVCampaignProductDetailReporter(AsyncGMVReporter, GMVCampaignProductDetailReporter):
+    """
+    Bản asyncio của GMVCampaignProductDetailReporter: danh sách campaign và hiệu suất của mọi
+    chunk / lô campaign chạy đồng thời trên một event loop thay vì mỗi request giữ một thread.
+    Catalog sản phẩm (thường đọc từ cache Mongo) vẫn lấy bằng đường đồng bộ trong thread riêng.
+    get_data() giữ nguyên giao diện đồng bộ cho worker.
+    """
+
+    async def _get_all_campaigns_async(self, start_date, end_date):
+        items = await self._fetch_all_pages_async(self.PERFORMANCE_API_URL, self._campaign_list_params(start_date, end_date))
+        return self._campaigns_from_items(items)
+
+    async def _fetch_data_for_batch_async(self, campaign_batch, start_date, end_date):
+        params = self._batch_params(list(campaign_batch.keys()), start_date, end_date)
+        perf_list = await self._fetch_all_pages_async(self.PERFORMANCE_API_URL, params)
+        return self._group_batch_results(campaign_batch, perf_list, start_date, end_date)
+
+    async def get_data_async(self, date_chunks) -> list:
+        print("\n--- BƯỚC 1: LẤY DỮ LIỆU CAMPAIGN (ASYNC) ---")
+        self._report_progress("Bắt đầu lấy dữ liệu campaign", 5)
+        chunk_campaigns = await self._run_in_parallel_async(
+            self._get_all_campaigns_async, [(chunk['start'], chunk['end']) for chunk in date_chunks]
+        )
+        batch_tasks = self._build_batch_tasks(date_chunks, chunk_campaigns)
+
+        self._report_progress(f"Xử lý {len(batch_tasks)} lô campaign", 60)
+        all_campaign_results = []
+        for batch_result in await self._run_in_parallel_async(self._fetch_data_for_batch_async, batch_tasks):
+            all_campaign_results.extend(batch_result)
+
+        self._report_progress("Đang lấy dữ liệu sản phẩm", 70)
+        required_ids = self._required_item_group_ids(all_campaign_results)
+        product_map = await asyncio.to_thread(self._get_product_map, required_ids)
+        if not product_map:
+            print("Không thể lấy dữ liệu sản phẩm. Dừng thực thi.")
+            return []
+
+        self._report_progress("Bắt đầu gộp dữ liệu...", 80)
+        return self._enrich_campaign_data(all_campaign_results, product_map)
+
+    def get_data(self, date_chunks) -> list:
+        return self.run_sync(self.get_data_async, date_chunks)
+
 def _flatten_product_report(
     campaign_data_list: List[Dict[str, Any]],
     context: Dict[str, Any]
@@ -1,11 +1,22 @@
+import os
+import json
+import hashlib
 import requests
 import time
 import random
-from datetime import datetime, date, timedelta, timezone
+from datetime import datetime, date, timedelta
 from calendar import monthrange
 from ..exceptions import TaskCancelledException
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ..rate_limiter.rate_limiter import RedisRateLimiter
+from ..rate_limiter.fair_queue import FairRateLimiter
+from ..rate_limiter.leased_limiter import LeasedRateLimiter
+from ..rate_limiter.composite_limiter import CompositeRateLimiter, LeasedCompositeRateLimiter
+from ..rate_limiter.metrics import LimiterMetrics, ApiCallCounter
+from ..rate_limiter.adaptive_concurrency import AIMDConcurrencyLimiter
+from .product_catalog_cache import ProductCatalogCache
+from .http_session import get_shared_session
 from collections import defaultdict
 
 class GMVReporter:
@@ -17,8 +28,19 @@ class GMVReporter:
     PERFORMANCE_API_URL = "https://business-api.tiktok.com/open_api/v1.3/gmv_max/report/get/"
     PRODUCT_API_URL = "https://business-api.tiktok.com/open_api/v1.3/store/product/get/"
     BC_API_URL = "https://business-api.tiktok.com/open_api/v1.3/bc/get/"
+    # Số token thuê mỗi lần từ Redis (0 = tắt, mỗi request đều kiểm tra Redis)
+    LIMITER_LEASE_SIZE = int(os.getenv("TIKTOK_LIMITER_LEASE_SIZE", "0"))
+    # Số request đồng thời tối đa mỗi endpoint khi lấy nhiều trang (AIMD tự điều chỉnh bên dưới mức này)
+    PAGE_CONCURRENCY_MAX = int(os.getenv("TIKTOK_PAGE_CONCURRENCY_MAX", "8"))
+    # Số lô campaign / date chunk xử lý đồng thời; Redis limiter (2/s, 45/phút) là cơ chế điều tiết duy nhất
+    CAMPAIGN_BATCH_WORKERS = int(os.getenv("TIKTOK_CAMPAIGN_BATCH_WORKERS", "4"))
+    # Số kết nối keep-alive tới TikTok API trong session dùng chung (0 = theo mức đồng thời tối đa)
+    HTTP_POOL_MAXSIZE = int(os.getenv("TIKTOK_HTTP_POOL_MAXSIZE", "0"))
+    MAX_TIMELINE_EVENTS = 5000  # Số response tối đa được ghi lại cho replay simulator
+    # Thời gian giữ danh sách BC ID của token (và các BC sở hữu sản phẩm của store) trong Redis
+    BC_CACHE_TTL_SEC = int(os.getenv("TIKTOK_BC_CACHE_TTL_SEC", str(24 * 3600)))
     def __init__(self, access_token: str, advertiser_id: str, store_id: str,
-                 progress_callback=None, job_id: str = None, redis_client=None):
+                 progress_callback=None, job_id: str = None, redis_client=None, db_client=None):
 
         if not all([access_token, advertiser_id, store_id]):
             raise ValueError("access_token, advertiser_id, và store_id không được để trống.")
@@ -28,16 +50,18 @@ class GMVReporter:
         self.advertiser_id = advertiser_id
         self.store_id = store_id
         
-        # Session dùng chung cho các request
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Session dùng chung trong process (giữ kết nối giữa các job), token gửi theo từng request
+        self.session = get_shared_session(
+            "tiktok_api", self.HTTP_POOL_MAXSIZE or self.PAGE_CONCURRENCY_MAX * self.CAMPAIGN_BATCH_WORKERS
+        )
+        self.request_headers = {
             "Access-Token": self.access_token,
             "Content-Type": "application/json",
-        })
+        }
 
-        # Thuộc tính cho cơ chế throttling và backoff
-        self.throttling_delay = 0.0
-        self.recovery_factor = 0.8
+        # Giới hạn đồng thời thích ứng (AIMD) theo từng endpoint, thay cho throttling_delay dùng chung
+        self._concurrency_limiters = {}
+        self._concurrency_lock = threading.Lock()
 
         # Thuộc tính cho việc kiểm soát tác vụ nền
         self.progress_callback = progress_callback
@@ -46,19 +70,62 @@ class GMVReporter:
         self.cancel_key = f"job:{self.job_id}:cancel_requested" if self.job_id else None
         
         self.api_usage = defaultdict(int)
+        self._api_usage_lock = threading.Lock()
+        # Các khoảng (start_date, end_date) có trang bị lỗi/không có quyền -> dữ liệu không đầy đủ,
+        # worker không đánh dấu coverage cache theo ngày cho các khoảng này
+        self.failed_chunks = set()
+        # Timeline response (offset, url, kết quả, latency) để replay trong services/simulator
+        self.response_timeline = []
+        self._timeline_started = time.monotonic()
+        # Trọng số khi chia slot rate limiter với các job khác cùng advertiser
+        self.limiter_weight = 1.0
+        # Bộ đếm granted/denied/thời gian chờ/backoff, hiển thị trên dashboard
+        self.limiter_metrics = LimiterMetrics(redis_client) if redis_client else None
+        # Số lần gọi API theo endpoint cho dashboard, ghi gộp thay vì 2 round trip mỗi request
+        self.api_call_counter = ApiCallCounter(redis_client) if redis_client else None
+        # Cache danh mục sản phẩm của store trong MongoDB (None = luôn tải từ API)
+        self.catalog_cache = ProductCatalogCache(db_client) if db_client else None
         
         if self.redis_client:
             gmv_rules = [
                 (2, 1), # 2 request mỗi giây
                 (45, 60) # 45 request mỗi phút
             ]
-            self.gmv_limiter = RedisRateLimiter(redis_client, rules = gmv_rules)
-            
             basic_rules = [
                 (8, 1), # 8 request mỗi giây
                 (550, 60) # 550 requests mỗi phút
             ]
-            self.basic_limiter = RedisRateLimiter(redis_client, rules = basic_rules)
+            basic_limiter = self._create_limiter(basic_rules, "basic")
+            self.basic_limiter = FairRateLimiter(redis_client, basic_limiter)
+            # Endpoint GMV MAX phải qua cả 2 limiter -> gộp lại, kiểm tra trong 1 lần gọi Redis
+            self.gmv_limiter = FairRateLimiter(
+                redis_client,
+                self._create_composite_limiter([self._create_limiter(gmv_rules, "gmv"), basic_limiter])
+            )
+
+    def _create_limiter(self, rules, name: str) -> RedisRateLimiter:
+        """Limiter kiểm tra Redis mỗi request, hoặc thuê token theo block nếu bật LIMITER_LEASE_SIZE."""
+        if self.LIMITER_LEASE_SIZE > 1:
+            return LeasedRateLimiter(self.redis_client, rules = rules, name = name, lease_size = self.LIMITER_LEASE_SIZE,
+                                     metrics = self.limiter_metrics)
+        return RedisRateLimiter(self.redis_client, rules = rules, name = name, metrics = self.limiter_metrics)
+
+    def _create_composite_limiter(self, limiters) -> CompositeRateLimiter:
+        """Gộp các limiter để kiểm tra tất cả rule trong 1 round trip."""
+        if self.LIMITER_LEASE_SIZE > 1:
+            return LeasedCompositeRateLimiter(self.redis_client, limiters, lease_size = self.LIMITER_LEASE_SIZE,
+                                              metrics = self.limiter_metrics)
+        return CompositeRateLimiter(self.redis_client, limiters, metrics = self.limiter_metrics)
+
+    def release_limiters(self):
+        """Trả các token đã thuê nhưng chưa dùng và ghi nốt các bộ đếm khi reporter chạy xong."""
+        if not self.redis_client:
+            return
+        for fair_limiter in (self.gmv_limiter, self.basic_limiter):
+            if isinstance(fair_limiter.limiter, LeasedRateLimiter):
+                fair_limiter.limiter.release()
+        self.limiter_metrics.flush()
+        self.api_call_counter.flush()
 
     # --- Các phương thức điều khiển tác vụ ---
     def _check_for_cancellation(self):
@@ -124,120 +191,208 @@ class GMVReporter:
         for i in range(0, len(data), size):
             yield data[i:i + size]
             
+    def _run_in_parallel(self, func, tasks: list, max_workers: int = None) -> list:
+        """
+        Chạy func(*task) cho từng task trong tasks đồng thời (tối đa max_workers,
+        mặc định CAMPAIGN_BATCH_WORKERS). Kết quả trả về theo đúng thứ tự của tasks,
+        không phụ thuộc thứ tự hoàn thành. Nếu một task lỗi (kể cả bị hủy), các task
+        chưa chạy bị bỏ và lỗi được ném lại.
+        """
+        if not tasks:
+            return []
+        workers = min(max_workers or self.CAMPAIGN_BATCH_WORKERS, len(tasks))
+        if workers <= 1:
+            return [func(*task) for task in tasks]
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(func, *task) for task in tasks]
+            return [future.result() for future in futures]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_concurrency_limiter(self, url: str) -> AIMDConcurrencyLimiter:
+        """Bộ giới hạn đồng thời AIMD riêng cho mỗi endpoint, dùng chung giữa các thread."""
+        with self._concurrency_lock:
+            if url not in self._concurrency_limiters:
+                self._concurrency_limiters[url] = AIMDConcurrencyLimiter(max_limit=self.PAGE_CONCURRENCY_MAX)
+            return self._concurrency_limiters[url]
+
+    @staticmethod
+    def _classify_response(data: dict) -> str:
+        """Phân loại body response của TikTok API: ok, rate_limit, timeout, permission hoặc fatal."""
+        if data.get("code") == 0:
+            return "ok"
+        error_message = data.get("message", "")
+        if "Too many requests" in error_message or "Request too frequent" in error_message:
+            return "rate_limit"
+        if "Internal time out" in error_message:
+            return "timeout"
+        if "permission" in error_message:
+            return "permission"
+        return "fatal"
+
+    def _handle_api_response(self, url: str, data: dict, elapsed: float, attempt: int, max_retries: int) -> str:
+        """
+        Ghi nhận một response theo _classify_response (timeline, log) và trả về kết quả phân loại.
+        Dùng chung cho bản đồng bộ và bản asyncio. Lỗi không thể phục hồi -> raise.
+        """
+        outcome = self._classify_response(data)
+        if outcome == "ok":
+            self._record_response(url, "ok", elapsed)
+        elif outcome == "rate_limit":
+            self._record_response(url, "rate_limit", elapsed)
+            print(f"  [RATE LIMIT] Gặp lỗi (lần {attempt + 1}/{max_retries})...")
+        elif outcome == "timeout":
+            self._record_response(url, "timeout", elapsed)
+            print(f"  [TIME OUT] Gặp lỗi (lần {attempt + 1}/{max_retries})...")
+        else:
+            error_message = data.get("message", "")
+            print(f"  [LỖI API] {error_message}")
+            # Không thử lại với các lỗi không thể phục hồi
+            if outcome == "fatal":
+                raise Exception(f"[LỖI API KHÔNG THỂ PHỤC HỒI] {error_message}")
+        return outcome
+
+    def _handle_network_error(self, url: str, error: Exception, attempt: int, max_retries: int) -> str:
+        self._record_response(url, "network", None)
+        print(f"  [LỖI MẠNG] (lần {attempt + 1}/{max_retries}): {error}")
+        return "network"
+
     def _make_api_request_with_backoff(self, url: str, params: dict, max_retries: int = 6, base_delay: int = 3) -> dict | None:
-        """Thực hiện gọi API với cơ chế thử lại (exponential backoff) và throttling."""
+        """Thực hiện gọi API với cơ chế thử lại (exponential backoff) và giới hạn đồng thời thích ứng."""
         self._check_for_cancellation()
-        if self.throttling_delay > 0:
-            print(f"  [THROTTLING] Áp dụng delay hãm tốc {self.throttling_delay:.2f} giây.")
-            time.sleep(self.throttling_delay)
+        concurrency = self._get_concurrency_limiter(url)
         
+        retry_reason = None
         for attempt in range(max_retries):
+            delay = (base_delay ** (attempt + 1)) + random.uniform(0, 1)
+            latency, overloaded = None, False
+            concurrency.acquire()
             try:
                 if self.redis_client:
                     self.check_rate_limit(url)
-                response = self.session.get(url, params=params, timeout=60)
+                request_started = time.monotonic()
+                response = self.session.get(url, params=params, headers=self.request_headers, timeout=60)
                 response.raise_for_status()
                 data = response.json()
                 
-                if data.get("code") == 0: 
-                    # Giảm dần delay nếu yêu cầu thành công
-                    self.throttling_delay *= self.recovery_factor
-                    if (self.throttling_delay > 190):
-                        self.throttling_delay = 0 # recover sau 5 phút đợi
-                    if self.throttling_delay < 0.1: self.throttling_delay = 0
+                elapsed = time.monotonic() - request_started
+                outcome = self._handle_api_response(url, data, elapsed, attempt, max_retries)
+                if outcome == "ok":
+                    latency = elapsed
                     return data
-                
-                # Xử lý các lỗi cụ thể từ API
-                error_message = data.get("message", "")
-                if "Too many requests" in error_message or "Request too frequent" in error_message:
-                    print(f"  [RATE LIMIT] Gặp lỗi (lần {attempt + 1}/{max_retries})...")
-                elif "Internal time out" in error_message:
-                    print(f"  [TIME OUT] Gặp lỗi (lần {attempt + 1}/{max_retries})...")
-                else:
-                    print(f"  [LỖI API] {error_message}")
-                    # Không thử lại với các lỗi không thể phục hồi
-                    if ("permission" not in error_message):
-                        raise Exception(f"[LỖI API KHÔNG THỂ PHỤC HỒI] {error_message}")
+                if outcome == "permission":
                     return None # Trả về None cho lỗi quyền truy cập
+                retry_reason, overloaded = outcome, True
             
             except requests.exceptions.RequestException as e:
-                print(f"  [LỖI MẠNG] (lần {attempt + 1}/{max_retries}): {e}")
+                retry_reason = self._handle_network_error(url, e, attempt, max_retries)
             finally:
+                # API quá tải -> giảm số request đồng thời và tạm dừng cả endpoint, không chỉ thread này
+                concurrency.release(latency=latency, overloaded=overloaded, pause_sec=delay)
                 self.log_api_counter(url)
                 
             if attempt < max_retries - 1:
-                delay = (base_delay ** (attempt + 1)) + random.uniform(0, 1)
-                self.throttling_delay = delay  # Kích hoạt throttling
-                print(f"  Thử lại sau {delay:.2f} giây.")
-                time.sleep(delay)
+                print(f"  Thử lại sau {delay:.2f} giây.")
+                self._record_backoff(retry_reason or "retry", delay, url)
+                if not overloaded:
+                    time.sleep(delay)
 
-        print("  [THẤT BẠI] Đã thử lại tối đa.")
+        print("  [THẤT BẠI] Đã thử lại tối đa.")
         raise Exception("Hết số lần thử, vui lòng kiểm tra kết nối hoặc trạng thái API và thử lại sau.")
 
+    def _record_response(self, url: str, outcome: str, latency: float | None):
+        if len(self.response_timeline) >= self.MAX_TIMELINE_EVENTS:
+            return
+        self.response_timeline.append({
+            "t": round(time.monotonic() - self._timeline_started, 3),
+            "url": url,
+            "outcome": outcome,
+            "latency": round(latency, 3) if latency is not None else None,
+        })
+
+    def _rate_limit_key(self, url: str) -> str:
+        return f"ratelimit:{self.advertiser_id}:{url}"
+
+    def _record_backoff(self, reason: str, seconds: float, url: str | None = None):
+        if self.limiter_metrics:
+            key = self._rate_limit_key(url) if url else None
+            self.limiter_metrics.record_backoff("tiktok_api", reason, seconds, key=key)
+
+    def _record_page_failure(self, params: dict):
+        chunk = (params.get("start_date"), params.get("end_date"))
+        if chunk[0] and chunk[1]:
+            with self._api_usage_lock:
+                self.failed_chunks.add(chunk)
+
     def log_api_counter(self, url):
-        
-        self.api_usage[url] += 1
-            
-        if self.redis_client:
-                try:
-                    api_call_key = f"api_calls_total:{url}"
-                    self.redis_client.incr(api_call_key)
-                    
-                    # Tạo key theo giờ, ví dụ: 'api_calls:gmv_report:2025-10-06-17'
-                    current_hour = datetime.now(timezone.utc).strftime('%Y-%m-%d-%H')
-                    api_call_key = f"api_calls:{url}:{current_hour}"
-                    
-                    # Dùng pipeline để đảm bảo 2 lệnh được thực hiện nguyên tử
-                    pipe = self.redis_client.pipeline()
-                    pipe.incr(api_call_key)
-                    pipe.expire(api_call_key, 3600 * 24) # Giữ dữ liệu trong 24 giờ
-                    pipe.execute()
-                except Exception as e:
-                    print(f"WARNING: Không thể ghi log API call: {e}")
-                    
-    def _fetch_all_tiktok_products(self, bc_id: str) -> list:
-        """Lấy tất cả sản phẩm từ một Business Center ID cụ thể."""
+        with self._api_usage_lock:
+            self.api_usage[url] += 1
+        if self.api_call_counter:
+            self.api_call_counter.record_call(url)
+
+    def _fetch_all_tiktok_products(self, bc_id: str) -> list | None:
+        """
+        Lấy tất cả sản phẩm từ một Business Center ID cụ thể.
+        Trả về None nếu lấy thất bại hoặc thiếu trang, để phân biệt với BC không có sản phẩm nào ([]).
+        """
         print(f"--- Bắt đầu lấy dữ liệu sản phẩm cho BC ID: {bc_id} ---")
         params = {'bc_id': bc_id, 'store_id': self.store_id, 'page_size': 100, 'advertiser_id': self.advertiser_id, 'filtering': '{"ad_creation_eligible":"GMV_MAX"}'}
         try:
-            all_products = self._fetch_all_pages(self.PRODUCT_API_URL, params, max_threads=5)
+            # strict: thiếu trang thì catalog không đầy đủ -> coi như BC lỗi, không xóa sản phẩm khỏi cache
+            all_products = self._fetch_all_pages(self.PRODUCT_API_URL, params, strict=True)
+        except TaskCancelledException:
+            raise
         except Exception as e:
-            print(e)
-            all_products = []
+            print(f"--- Lỗi khi lấy sản phẩm cho BC ID: {bc_id}: {e} ---")
+            return None
         print(f"--- Hoàn tất lấy sản phẩm cho BC ID: {bc_id}. Tổng cộng: {len(all_products)} sản phẩm. ---")
         self._report_progress(f"Đã lấy tổng cộng: {len(all_products)} sản phẩm.")
         return all_products
    
     
-    def _fetch_all_pages(self, url: str, params: dict, max_threads = 1, throttling_delay = None) -> list:
+    def _fetch_all_pages(self, url: str, params: dict, max_threads = None, throttling_delay = None, strict = False) -> list:
         """
-        Lấy dữ liệu từ tất cả các trang của một endpoint API.
-        Sử dụng đa luồng để tăng tốc nếu max_threads > 1.
+        Lấy dữ liệu từ tất cả các trang của một endpoint API, trả về theo đúng thứ tự trang.
+        Dùng _iter_pages nếu muốn xử lý từng trang ngay khi về.
+        """
+        pages = dict(self._iter_pages(url, params, max_threads, throttling_delay, strict))
+        return [row for page_num in sorted(pages) for row in pages[page_num]]
+
+    def _iter_pages(self, url: str, params: dict, max_threads = None, throttling_delay = None, strict = False):
+        """
+        Generator trả về (page_num, rows) ngay khi từng trang về (trang 1 luôn đầu tiên,
+        các trang sau theo thứ tự hoàn thành).
+        Các trang còn lại được lấy song song; số request đồng thời thực tế do
+        AIMDConcurrencyLimiter của endpoint quyết định (tối đa max_threads, mặc định PAGE_CONCURRENCY_MAX).
+        throttling_delay: khoảng dừng chung cho endpoint trước mỗi trang (optional).
+        Nếu bên gọi dừng sớm (đóng generator), các trang chưa chạy sẽ bị hủy.
+        Trang lỗi (vd. lỗi quyền truy cập) được ghi vào failed_chunks theo start_date/end_date của params.
+        strict=True: trang 2 trở đi bị lỗi thì raise thay vì trả về trang rỗng
+        (lỗi quyền ngay trang đầu vẫn là "không có dữ liệu").
         """
-        all_results = []
-        
         # --- BƯỚC 1: LUÔN LẤY TRANG ĐẦU TIÊN ĐỂ LẤY total_pages ---
         first_page_params = params.copy()
         first_page_params['page'] = 1
         
         if (throttling_delay):
-            self.throttling_delay = throttling_delay
+            self._get_concurrency_limiter(url).pause(throttling_delay)
         first_page_data = self._make_api_request_with_backoff(url, first_page_params)
 
         if not first_page_data or first_page_data.get("code") != 0:
-            return [] # Trả về rỗng nếu có lỗi ngay trang đầu
+            self._record_page_failure(params)
+            return # Không có trang nào nếu có lỗi ngay trang đầu
         
         page_data = first_page_data.get("data", {})
-        result_list = page_data.get("list", []) or page_data.get("store_products", [])
-        all_results.extend(result_list)
-        
         total_pages = page_data.get("page_info", {}).get("total_page", 1)
         print(f"   [PHÂN TRANG] Lấy trang 1/{total_pages}. Tổng số trang: {total_pages}.")
+        yield 1, page_data.get("list", []) or page_data.get("store_products", [])
 
         if total_pages <= 1:
-            return all_results
+            return
 
-        # --- BƯỚC 2: LẤY CÁC TRANG CÒN LẠI ĐỒNG THỜI (NẾU max_threads > 1) ---
+        # --- BƯỚC 2: LẤY CÁC TRANG CÒN LẠI ĐỒNG THỜI (AIMD TỰ ĐIỀU CHỈNH SỐ LUỒNG THỰC SỰ CHẠY) ---
         
         pages_to_fetch = list(range(2, total_pages + 1))
 
@@ -248,7 +403,7 @@ class GMVReporter:
             page_params['page'] = page_num
             
             if throttling_delay:
-                self.throttling_delay = throttling_delay
+                self._get_concurrency_limiter(url).pause(throttling_delay)
             data = self._make_api_request_with_backoff(url, page_params)
             
             if data and data.get("code") == 0:
@@ -257,22 +412,121 @@ class GMVReporter:
                 print(f"   [PHÂN TRANG] Đã lấy xong trang {page_num}/{total_pages}.")
                 return results
             print(f"   [PHÂN TRANG] Lỗi khi lấy trang {page_num}/{total_pages}.")
+            self._record_page_failure(params)
+            if strict:
+                raise Exception(f"Lỗi khi lấy trang {page_num}/{total_pages}, dữ liệu không đầy đủ.")
             return []
 
-        # Sử dụng ThreadPoolExecutor để chạy các request đồng thời
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            # executor.map sẽ chạy hàm fetch_page cho mỗi phần tử trong pages_to_fetch
-            results_from_threads = executor.map(fetch_page, pages_to_fetch)
-            
-            # Gom kết quả từ các luồng
-            for result in results_from_threads:
-                all_results.extend(result)
-        
-        return all_results
+        # Sử dụng ThreadPoolExecutor để chạy các request đồng thời, trả từng trang khi xong
+        max_threads = min(max_threads or self.PAGE_CONCURRENCY_MAX, len(pages_to_fetch))
+        executor = ThreadPoolExecutor(max_workers=max_threads)
+        try:
+            future_to_page = {executor.submit(fetch_page, page_num): page_num for page_num in pages_to_fetch}
+            for future in as_completed(future_to_page):
+                yield future_to_page[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
 
     
+    def _get_product_catalog(self, required_item_group_ids=()) -> tuple[list, bool]:
+        """
+        Tải danh mục sản phẩm của store từ API. Nếu Redis đã ghi nhận các BC sở hữu sản phẩm
+        của store thì chỉ lấy từ các BC đó; ngược lại (hoặc khi các BC đó lỗi, không còn sản phẩm
+        hay thiếu item_group_id cần dùng) lấy đồng thời từ tất cả BC của token, bỏ các BC không
+        trả về sản phẩm và ghi nhớ các BC còn lại. BC sở hữu chỉ được ghi nhớ khi không BC nào lỗi.
+
+        Returns:
+            (products, complete): complete=False nếu có BC lấy thất bại.
+        """
+        required_item_group_ids = set(required_item_group_ids)
+        owner_bc_ids = self._get_cached_bc_ids(self._store_bc_cache_key())
+        if owner_bc_ids:
+            products_by_bc, failed = self._fetch_products_from_bcs(owner_bc_ids)
+            products = [product for bc_products in products_by_bc.values() for product in bc_products]
+            missing = required_item_group_ids - {product.get("item_group_id") for product in products}
+            if products and not failed and not missing:
+                self._report_progress(f"Đã lấy {len(products)} sản phẩm.", 80)
+                return products, True
+            if failed:
+                print(f"   -> {len(failed)} BC đã ghi nhận bị lỗi, thử lại với tất cả BC.")
+            elif missing:
+                print(f"   -> Các BC đã ghi nhận thiếu {len(missing)} sản phẩm, thử lại với tất cả BC.")
+            else:
+                print("   -> Các BC đã ghi nhận không còn trả về sản phẩm, thử lại với tất cả BC.")
+
+        bc_ids_list = self._get_bc_ids()
+        if not bc_ids_list:
+            return [], False
+        products_by_bc, failed = self._fetch_products_from_bcs(bc_ids_list)
+        owners = [bc_id for bc_id, bc_products in products_by_bc.items() if bc_products]
+        products = [product for bc_products in products_by_bc.values() for product in bc_products]
+        
+        print(f"\n=> {len(owners)}/{len(bc_ids_list)} BC ID có sản phẩm của store. Đã lấy {len(products)} sản phẩm.")
+        if failed:
+            print(f"   -> {len(failed)} BC lỗi, không ghi nhớ BC sở hữu store lần này.")
+        elif owners:
+            self._set_cached_bc_ids(self._store_bc_cache_key(), owners)
+        self._report_progress(f"Đã lấy {len(products)} sản phẩm.", 80)
+        return products, not failed
+
+    def _fetch_products_from_bcs(self, bc_ids: list[str]) -> tuple[dict, list[str]]:
+        """Lấy sản phẩm từ các BC song song. Trả về ({bc_id: products} của các BC thành công, [bc_id lỗi])."""
+        results = self._run_in_parallel(self._fetch_all_tiktok_products, [(bc_id,) for bc_id in bc_ids])
+        products_by_bc = {bc_id: bc_products for bc_id, bc_products in zip(bc_ids, results) if bc_products is not None}
+        failed = [bc_id for bc_id, bc_products in zip(bc_ids, results) if bc_products is None]
+        return products_by_bc, failed
+
+    # --- Cache BC ID trong Redis (theo hash của access token, không lưu token gốc) ---
+    def _bc_cache_key(self) -> str:
+        token_hash = hashlib.sha256(self.access_token.encode("utf-8")).hexdigest()[:32]
+        return f"tiktok_bc_ids:{token_hash}"
+
+    def _store_bc_cache_key(self) -> str:
+        return f"{self._bc_cache_key()}:store:{self.store_id}"
+
+    def _get_cached_bc_ids(self, key: str) -> list[str] | None:
+        if not self.redis_client:
+            return None
+        try:
+            cached = self.redis_client.get(key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            print(f"WARNING: Không thể đọc cache BC ID: {e}")
+            return None
+
+    def _set_cached_bc_ids(self, key: str, bc_ids: list[str]):
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.set(key, json.dumps(bc_ids), ex=self.BC_CACHE_TTL_SEC)
+        except Exception as e:
+            print(f"WARNING: Không thể ghi cache BC ID: {e}")
+
+    def _get_store_products(self, required_item_group_ids=()) -> list:
+        """
+        Danh mục sản phẩm của store: đọc từ cache Mongo nếu còn hạn và có đủ các
+        item_group_id cần dùng, ngược lại tải lại từ API và ghi vào cache.
+        """
+        required_item_group_ids = {i for i in required_item_group_ids if i}
+        if self.catalog_cache:
+            products = self.catalog_cache.get(self.store_id, required_item_group_ids)
+            if products is not None:
+                print(f"   -> Dùng danh mục sản phẩm đã cache ({len(products)} sản phẩm).")
+                self._report_progress(f"Dùng {len(products)} sản phẩm từ cache.", 80)
+                return products
+
+        products, complete = self._get_product_catalog(required_item_group_ids)
+        if self.catalog_cache and products:
+            self.catalog_cache.save(self.store_id, products, required_item_group_ids, complete=complete)
+        return products
+
     def _get_bc_ids(self) -> list[str]:
-        """Lấy danh sách Business Center ID."""
+        """Lấy danh sách Business Center ID (cache Redis theo token, hết hạn sau BC_CACHE_TTL_SEC)."""
+        cached_bc_ids = self._get_cached_bc_ids(self._bc_cache_key())
+        if cached_bc_ids:
+            print(f"Dùng {len(cached_bc_ids)} BC ID đã cache.")
+            return cached_bc_ids
+        
         print("Đang lấy danh sách BC ID...")
         
         # SỬA LỖI: Luôn dùng phương thức đã được chuẩn hóa.
@@ -283,6 +537,8 @@ class GMVReporter:
             bc_list = data.get("data", {}).get("list", [])
             bc_ids = [bc.get("bc_info", {}).get("bc_id") for bc in bc_list if bc.get("bc_info", {}).get("bc_id")]
             print(f"Đã lấy thành công {len(bc_ids)} BC ID.")
+            if bc_ids:
+                self._set_cached_bc_ids(self._bc_cache_key(), bc_ids)
             # Dòng _report_progress này có thể không cần nữa nếu bạn đã báo cáo trong get_data
             # self._report_progress(f"Đã lấy thành công {len(bc_ids)} BC ID.", 80)
             return bc_ids
@@ -294,12 +550,13 @@ class GMVReporter:
     def check_rate_limit(self, url):
         # Rate limiter cho GMV MAX
         
-        rate_limit_key = f"ratelimit:{self.advertiser_id}:{url}"
+        rate_limit_key = self._rate_limit_key(url)
         if (url == self.PERFORMANCE_API_URL) :
+            # gmv_limiter đã bao gồm rule của basic_limiter
             self.check_limiter(self.gmv_limiter, rate_limit_key)
-        self.check_limiter(self.basic_limiter, rate_limit_key)
+        else:
+            self.check_limiter(self.basic_limiter, rate_limit_key)
             
-    def check_limiter(self, limiter : RedisRateLimiter, key : str):
-        while not limiter.acquire(key):
-            print(f"  [RATE LIMITER] Đã đạt giới hạn, đang chờ 1 giây...")
-            time.sleep(1)
\ No newline at end of file
+    def check_limiter(self, limiter : FairRateLimiter, key : str):
+        # Xếp hàng công bằng giữa các job, chờ đúng thời gian đến slot kế tiếp thay vì poll mỗi giây
+        limiter.wait_for_slot(key, job_id=self.job_id, weight=self.limiter_weight)
\ No newline at end of file
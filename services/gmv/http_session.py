@@ -0,0 +1,42 @@
+"""
+HTTP Session Registry
+Session `requests` dùng chung trong mỗi process cho các client TikTok API, để giữ kết nối
+keep-alive (không phải TLS handshake lại) giữa các request, các thread và các job.
+"""
+
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_sessions: Dict[Tuple[int, str], requests.Session] = {}
+_pool_sizes: Dict[Tuple[int, str], int] = {}
+_lock = threading.Lock()
+
+
+def get_shared_session(name: str, pool_maxsize: int) -> requests.Session:
+    """
+    Lấy (hoặc tạo) session dùng chung theo tên trong process hiện tại.
+
+    - Pool kết nối mỗi host có kích thước pool_maxsize (nên >= số request đồng thời tối đa),
+      nếu lần gọi sau cần pool lớn hơn thì adapter được thay bằng pool lớn hơn.
+    - Key gồm cả PID: process con của Celery (prefork) không dùng lại socket của process cha.
+    - Session không lưu header xác thực và không giữ cookie, header token phải truyền theo từng request.
+    """
+    key = (os.getpid(), name)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _sessions[key] = session
+
+        if pool_maxsize > _pool_sizes.get(key, 0):
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _pool_sizes[key] = pool_maxsize
+        return session
@@ -0,0 +1,119 @@
+"""
+Product Catalog Cache
+Lưu danh mục sản phẩm TikTok Shop của từng store trong MongoDB, để các job GMV không phải
+tải lại toàn bộ catalog (page_size=100, mọi BC) mỗi lần chạy.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+
+class ProductCatalogCache:
+    """
+    - `product_catalog`: mỗi sản phẩm một document (_id = "{store_id}_{item_group_id}").
+    - `product_catalog_meta`: mỗi store một document (_id = store_id) ghi thời điểm làm mới
+      và các item_group_id đã biết là không có trong catalog (không làm mới lại vì chúng).
+
+    Cache dùng được khi còn trong TTL và chứa đủ các item_group_id job cần; ngược lại
+    reporter tải lại catalog từ API và ghi đè vào cache (refresh-on-miss).
+    Chỉ lần làm mới đầy đủ (mọi BC đều lấy thành công) mới xóa sản phẩm cũ và ghi
+    missing_item_group_ids; lần làm mới có BC lỗi chỉ upsert các sản phẩm lấy được.
+    """
+
+    PRODUCTS_COLLECTION = "product_catalog"
+    META_COLLECTION = "product_catalog_meta"
+    TTL_HOURS = float(os.getenv("TIKTOK_CATALOG_TTL_HOURS", "24"))
+
+    def __init__(self, db_client: Any, ttl_hours: Optional[float] = None):
+        self.db = db_client.db
+        self.ttl = timedelta(hours=ttl_hours if ttl_hours is not None else self.TTL_HOURS)
+        try:
+            self.db[self.PRODUCTS_COLLECTION].create_index([("store_id", ASCENDING)], name="store_idx")
+        except Exception as e:
+            print(f"⚠️ Không thể tạo index cho {self.PRODUCTS_COLLECTION}: {e}")
+
+    def get(self, store_id: str, required_item_group_ids: Iterable[str] = ()) -> Optional[List[Dict[str, Any]]]:
+        """
+        Trả về danh sách sản phẩm đã cache của store, hoặc None nếu cần tải lại
+        (chưa có cache, hết TTL, hoặc thiếu item_group_id chưa từng được xác nhận là không tồn tại).
+        """
+        try:
+            meta = self.db[self.META_COLLECTION].find_one({"_id": store_id})
+            if not meta or not self._is_fresh(meta.get("refreshed_at")):
+                return None
+
+            products = [
+                doc["product"]
+                for doc in self.db[self.PRODUCTS_COLLECTION].find({"store_id": store_id}, {"product": 1})
+            ]
+        except Exception as e:
+            print(f"WARNING: Không thể đọc cache danh mục sản phẩm: {e}")
+            return None
+
+        known_ids = {p.get("item_group_id") for p in products} | set(meta.get("missing_item_group_ids", []))
+        missing = set(required_item_group_ids) - known_ids
+        if missing:
+            print(f"   -> Cache danh mục thiếu {len(missing)} sản phẩm, cần làm mới.")
+            return None
+        return products
+
+    def save(
+        self,
+        store_id: str,
+        products: List[Dict[str, Any]],
+        required_item_group_ids: Iterable[str] = (),
+        complete: bool = True,
+    ):
+        """
+        Ghi catalog vừa tải (upsert từng sản phẩm).
+        complete=True: catalog là toàn bộ sản phẩm của store -> xóa các sản phẩm không còn
+        trong catalog, ghi missing_item_group_ids và đánh dấu thời điểm làm mới.
+        complete=False (có BC lỗi): chỉ upsert, không đánh dấu làm mới để job sau tải lại.
+        """
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne(
+                {"_id": f"{store_id}_{product['item_group_id']}"},
+                {"$set": {
+                    "store_id": store_id,
+                    "item_group_id": product["item_group_id"],
+                    "product": product,
+                    "updated_at": now,
+                }},
+                upsert=True
+            )
+            for product in products if product.get("item_group_id")
+        ]
+        fetched_ids = {product.get("item_group_id") for product in products if product.get("item_group_id")}
+        missing_ids = sorted(set(required_item_group_ids) - fetched_ids)
+
+        try:
+            if operations:
+                self.db[self.PRODUCTS_COLLECTION].bulk_write(operations, ordered=False)
+            if not complete:
+                print("   -> Catalog chưa đầy đủ (có BC lỗi), chỉ cập nhật các sản phẩm đã lấy được.")
+                return
+            self.db[self.PRODUCTS_COLLECTION].delete_many(
+                {"store_id": store_id, "item_group_id": {"$nin": sorted(fetched_ids)}}
+            )
+            self.db[self.META_COLLECTION].update_one(
+                {"_id": store_id},
+                {"$set": {
+                    "refreshed_at": now,
+                    "product_count": len(operations),
+                    "missing_item_group_ids": missing_ids,
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"WARNING: Không thể ghi cache danh mục sản phẩm: {e}")
+
+    def _is_fresh(self, refreshed_at: Optional[datetime]) -> bool:
+        if not refreshed_at:
+            return False
+        if refreshed_at.tzinfo is None:
+            refreshed_at = refreshed_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - refreshed_at < self.ttl
@@ -0,0 +1,288 @@
+"""
+Job Planner
+Ước lượng chi phí API (số request, số trang, thời gian chạy) của một job trước khi chạy,
+dựa trên lịch sử các job đã hoàn thành trong task_logs.
+"""
+
+import math
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobPlanner:
+    """
+    Lập kế hoạch cho một job dựa trên lịch sử theo (template, level, account).
+
+    Các chỉ số lịch sử được dùng:
+        - rows_per_account_day: số dòng dữ liệu trên mỗi account-ngày
+        - pages_per_request: số request thực tế / số request ban đầu (phân trang, retry)
+        - seconds_per_request: thời gian xử lý trung bình cho mỗi request (không tính backoff)
+        - backoff_sec_per_request: thời gian backoff trung bình cho mỗi request
+    """
+
+    HISTORY_LIMIT = 50
+    SOFT_TIME_LIMIT_SEC = 1500  # Khớp với soft_time_limit của run_report_job
+    TIME_BUDGET_RATIO = 0.8  # Chỉ dùng 80% thời gian cho phép, phần còn lại để ghi sheet
+    ROWS_PER_PAGE = 500  # limit của các URL insights
+    TARGET_PAGES_PER_REQUEST = 4
+    MAX_CHUNK_FACTOR = 4
+    DEFAULT_BATCH_SIZE = 20
+    MIN_BATCH_SIZE = 5
+
+    # Giá trị mặc định khi chưa có lịch sử
+    DEFAULT_METRICS = {
+        "rows_per_account_day": 20.0,
+        "pages_per_request": 1.5,
+        "seconds_per_request": 1.0,
+        "backoff_sec_per_request": 0.0,
+    }
+
+    # Các task type chỉ tạo 1 request cho mỗi account (không chia chunk theo tháng)
+    SINGLE_REQUEST_TASK_TYPES = {"facebook_performance", "facebook_breakdown"}
+    # Các task type hỗ trợ chia nhỏ chunk tháng (factor)
+    CHUNK_FACTOR_TASK_TYPES = {"facebook_daily"}
+
+    def __init__(self, db_client: Any):
+        self.db_client = db_client
+
+    # ==================== KEY & HISTORY ====================
+
+    @staticmethod
+    def _resolve_level(context: Dict[str, Any]) -> str:
+        """Lấy level của job (ad, adset, campaign, ...) từ template Facebook."""
+        template_name = context.get("template_name")
+        if not template_name:
+            return "campaign"
+
+        from services.facebook.base_processor import FacebookAdsBaseReporter
+        config = FacebookAdsBaseReporter.get_facebook_template_config_by_name(template_name) or {}
+        return config.get("api_params", {}).get("level", "unknown")
+
+    @staticmethod
+    def _get_account_ids(context: Dict[str, Any]) -> List[str]:
+        """Danh sách account của job (Facebook accounts hoặc TikTok advertiser)."""
+        accounts = context.get("accounts") or []
+        if accounts:
+            return [a.get("id") if isinstance(a, dict) else str(a) for a in accounts]
+        if context.get("advertiser_id"):
+            return [context["advertiser_id"]]
+        return []
+
+    def _build_key(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "template": context.get("template_name") or context.get("task_type"),
+            "level": self._resolve_level(context),
+            "accounts": self._get_account_ids(context),
+        }
+
+    def _find_history(self, context: Dict[str, Any], account_ids: List[str]) -> List[Dict]:
+        """
+        Lấy các job SUCCESS gần nhất cùng template.
+        Ưu tiên lịch sử của cùng account, nếu không có thì dùng lịch sử của cả template.
+        """
+        if not self.db_client:
+            return []
+
+        base_query = {"status": "SUCCESS", "task_type": context.get("task_type")}
+        if context.get("template_name"):
+            base_query["template_name"] = context["template_name"]
+
+        account_query = dict(base_query)
+        if context.get("accounts"):
+            account_query["accounts.id"] = {"$in": account_ids}
+        elif context.get("advertiser_id"):
+            account_query["advertiser_id"] = context["advertiser_id"]
+
+        try:
+            for query in (account_query, base_query):
+                logs = list(
+                    self.db_client.db.task_logs.find(query)
+                    .sort("start_time", -1)
+                    .limit(self.HISTORY_LIMIT)
+                )
+                if logs:
+                    return logs
+        except Exception as e:
+            logger.warning(f"Không thể đọc lịch sử task_logs cho planner: {e}")
+        return []
+
+    @staticmethod
+    def _count_requests(api_usage: Any) -> int:
+        """Tổng số request thực tế: Facebook lưu request_count, TikTok lưu {url: count}."""
+        if not isinstance(api_usage, dict):
+            return 0
+        if "request_count" in api_usage:
+            return int(api_usage.get("request_count") or 0)
+        return sum(v for v in api_usage.values() if isinstance(v, int))
+
+    @staticmethod
+    def _count_days(start_date: str, end_date: str) -> int:
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            end = datetime.strptime(end_date, "%Y-%m-%d")
+            return max(1, (end - start).days + 1)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _count_months(start_date: str, end_date: str) -> int:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        return (end.year - start.year) * 12 + (end.month - start.month) + 1
+
+    def _aggregate_history(self, logs: List[Dict]) -> Dict[str, Any]:
+        """Tính các chỉ số lịch sử (tỉ lệ của tổng để ít bị ảnh hưởng bởi job nhỏ)."""
+        rows = account_days = 0
+        requests = 0
+        planned_requests = actual_requests_with_plan = 0
+        work_seconds = backoff_seconds = 0.0
+
+        for log in logs:
+            days = self._count_days(log.get("date_start"), log.get("date_stop"))
+            n_accounts = len(log.get("accounts") or []) or 1
+            total_rows = (log.get("stats") or {}).get("total_rows")
+            api_usage = log.get("api_total_counts") or {}
+            log_requests = self._count_requests(api_usage)
+            log_backoff = float(api_usage.get("total_backoff_sec", 0) or 0) if isinstance(api_usage, dict) else 0.0
+            duration = log.get("duration_seconds") or 0
+
+            if total_rows is not None and days:
+                rows += total_rows
+                account_days += days * n_accounts
+
+            if log_requests and duration and duration > 0:
+                requests += log_requests
+                backoff_seconds += log_backoff
+                work_seconds += max(0.0, duration - log_backoff)
+
+            initial_requests = (log.get("plan") or {}).get("initial_requests")
+            if initial_requests and log_requests:
+                planned_requests += initial_requests
+                actual_requests_with_plan += log_requests
+
+        metrics = dict(self.DEFAULT_METRICS)
+        if account_days:
+            metrics["rows_per_account_day"] = rows / account_days
+        if planned_requests:
+            metrics["pages_per_request"] = max(1.0, actual_requests_with_plan / planned_requests)
+        if requests:
+            metrics["seconds_per_request"] = work_seconds / requests
+            metrics["backoff_sec_per_request"] = backoff_seconds / requests
+
+        metrics["history_jobs"] = len(logs)
+        return metrics
+
+    # ==================== ESTIMATE ====================
+
+    def _split_date_range(self, start_date: str, end_date: str, parts: int) -> List[Dict[str, str]]:
+        """Chia khoảng thời gian thành `parts` khoảng liên tiếp có số ngày gần bằng nhau."""
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        total_days = self._count_days(start_date, end_date)
+        parts = max(1, min(parts, total_days))
+        days_per_part = math.ceil(total_days / parts)
+
+        ranges = []
+        cursor = start
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        while cursor <= end:
+            part_end = min(cursor + timedelta(days=days_per_part - 1), end)
+            ranges.append({"start": cursor.strftime("%Y-%m-%d"), "end": part_end.strftime("%Y-%m-%d")})
+            cursor = part_end + timedelta(days=1)
+        return ranges
+
+    def estimate(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ước lượng chi phí của job và chọn chunk factor, batch size (Facebook) hoặc
+        concurrency (TikTok GMV), có cần chia job hay không.
+
+        should_split / split_ranges chỉ là gợi ý: worker báo cho người dùng nhưng vẫn chạy
+        toàn bộ khoảng ngày, nên job quá lớn vẫn có thể chạm soft_time_limit.
+
+        Returns:
+            Dict plan (lưu được vào MongoDB)
+        """
+        task_type = context.get("task_type")
+        start_date, end_date = context["start_date"], context["end_date"]
+
+        key = self._build_key(context)
+        metrics = self._aggregate_history(self._find_history(context, key["accounts"]))
+
+        n_accounts = max(1, len(key["accounts"]))
+        days = self._count_days(start_date, end_date)
+        chunks_per_account = 1 if task_type in self.SINGLE_REQUEST_TASK_TYPES else self._count_months(start_date, end_date)
+
+        initial_requests = n_accounts * chunks_per_account
+        expected_rows = metrics["rows_per_account_day"] * n_accounts * days
+        rows_per_request = expected_rows / initial_requests
+        pages_per_request = max(metrics["pages_per_request"], math.ceil(rows_per_request / self.ROWS_PER_PAGE))
+
+        # Chia nhỏ chunk tháng nếu mỗi request phải phân trang quá nhiều
+        chunk_factor = 1
+        if task_type in self.CHUNK_FACTOR_TASK_TYPES and pages_per_request > self.TARGET_PAGES_PER_REQUEST:
+            chunk_factor = min(self.MAX_CHUNK_FACTOR, math.ceil(pages_per_request / self.TARGET_PAGES_PER_REQUEST))
+            initial_requests *= chunk_factor
+            pages_per_request = max(1.0, pages_per_request / chunk_factor)
+
+        estimated_requests = math.ceil(initial_requests * pages_per_request)
+        seconds_per_request = metrics["seconds_per_request"] + metrics["backoff_sec_per_request"]
+        estimated_seconds = estimated_requests * seconds_per_request
+
+        # Giảm batch size / concurrency khi lịch sử cho thấy backoff chiếm phần lớn thời gian
+        backoff_share = metrics["backoff_sec_per_request"] / seconds_per_request if seconds_per_request else 0.0
+        batch_size = concurrency = None
+        if task_type and task_type.startswith("facebook"):
+            # Số request mỗi batch (FacebookAdsBaseReporter.DEFAULT_BATCH_SIZE)
+            batch_size = max(self.MIN_BATCH_SIZE, round(self.DEFAULT_BATCH_SIZE * (1 - backoff_share)))
+        else:
+            # Số lô campaign / date chunk chạy đồng thời (GMVReporter.CAMPAIGN_BATCH_WORKERS)
+            from services.gmv.gmv_reporter import GMVReporter
+            concurrency = 1 if backoff_share > 0.3 else GMVReporter.CAMPAIGN_BATCH_WORKERS
+
+        time_budget = self.SOFT_TIME_LIMIT_SEC * self.TIME_BUDGET_RATIO
+        should_split = estimated_seconds > time_budget
+        split_ranges = []
+        if should_split:
+            split_ranges = self._split_date_range(start_date, end_date, math.ceil(estimated_seconds / time_budget))
+
+        return {
+            "key": key,
+            "history_jobs": metrics["history_jobs"],
+            "metrics": {k: round(v, 4) for k, v in metrics.items() if k != "history_jobs"},
+            "initial_requests": initial_requests,
+            "estimated_pages_per_request": round(pages_per_request, 2),
+            "estimated_requests": estimated_requests,
+            "estimated_rows": round(expected_rows),
+            "estimated_seconds": round(estimated_seconds, 1),
+            "chunk_factor": chunk_factor,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "should_split": should_split,
+            "split_ranges": split_ranges,
+        }
+
+    def plan_and_record(self, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ước lượng và lưu plan vào task_logs, cạnh các số liệu thực tế của job."""
+        try:
+            plan = self.estimate(context)
+        except Exception as e:
+            logger.warning(f"[Job {context.get('job_id')}] Không thể ước lượng chi phí job: {e}")
+            return None
+
+        if self.db_client:
+            try:
+                self.db_client.db.task_logs.update_one(
+                    {"job_id": context.get("job_id")},
+                    {"$set": {"plan": plan}}
+                )
+            except Exception as e:
+                logger.warning(f"[Job {context.get('job_id')}] Không thể lưu plan: {e}")
+
+        logger.info(
+            f"[Job {context.get('job_id')}] Plan: ~{plan['estimated_requests']} requests, "
+            f"~{plan['estimated_seconds']}s, chunk_factor={plan['chunk_factor']}, "
+            f"batch_size={plan['batch_size']}, concurrency={plan['concurrency']}, split={plan['should_split']}"
+        )
+        return plan
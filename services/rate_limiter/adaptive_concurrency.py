@@ -0,0 +1,129 @@
+# services/rate_limiter/adaptive_concurrency.py
+import time
+import asyncio
+import threading
+from typing import Optional
+
+
+class AIMDConcurrencyLimiter:
+    """
+    Giới hạn số request đồng thời tới một endpoint theo AIMD
+    (additive increase / multiplicative decrease), thread-safe.
+
+    - Mỗi request thành công: limit += 1/limit (tăng ~1 sau mỗi "vòng" request).
+    - API báo quá tải ("Too many requests", "Internal time out"): limit *= OVERLOAD_DECREASE,
+      và mọi thread cùng tạm dừng trong `pause_sec` giây (thay cho throttling_delay dùng chung).
+    - Latency tăng vượt LATENCY_TOLERANCE lần so với baseline: limit *= LATENCY_DECREASE.
+    - Limit lúc bị quá tải lần gần nhất được ghi nhớ; khi tiến lại gần mức đó, limit chỉ tăng
+      với tốc độ PROBE_INCREASE để không lặp lại cùng một lần quá tải (tránh răng cưa).
+
+    Mỗi lần giảm cách nhau ít nhất DECREASE_COOLDOWN_SEC, để nhiều request đang bay cùng
+    thất bại chỉ tính là một tín hiệu quá tải.
+    """
+    OVERLOAD_DECREASE = 0.5
+    LATENCY_DECREASE = 0.9
+    LATENCY_TOLERANCE = 2.0
+    LATENCY_SMOOTHING = 0.2  # Trọng số mẫu mới trong EWMA latency
+    BASELINE_DRIFT = 0.01    # Baseline trôi dần lên để không bị kẹt ở 1 mẫu nhanh bất thường
+    DECREASE_COOLDOWN_SEC = 1.0
+    PROBE_INCREASE = 0.1     # Hệ số tăng khi limit ở gần mức từng gây quá tải
+    ASYNC_POLL_SEC = 0.05    # Chu kỳ thử lại của acquire_async khi hết slot (coroutine không chờ được Condition)
+
+    def __init__(self, initial_limit: float = 2, min_limit: float = 1, max_limit: float = 8):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.latency_baseline: Optional[float] = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._overload_limit: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Chờ đến khi hết thời gian tạm dừng và còn slot đồng thời."""
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def try_acquire(self) -> float:
+        """Không chờ: chiếm slot và trả 0, hoặc trả số giây nên chờ trước khi thử lại."""
+        with self._cond:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                return pause
+            if self.in_flight >= int(self.limit):
+                return self.ASYNC_POLL_SEC
+            self.in_flight += 1
+            return 0.0
+
+    async def acquire_async(self):
+        """Bản asyncio của acquire: chờ bằng asyncio.sleep, không chặn event loop."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False, pause_sec: float = 0.0):
+        """
+        Trả slot và cập nhật limit theo kết quả request.
+
+        Args:
+            latency: Thời gian phản hồi (giây) của request thành công
+            overloaded: API báo quá tải
+            pause_sec: Khi quá tải, thời gian tất cả thread cùng tạm dừng
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if overloaded:
+                if now - self._last_decrease >= self.DECREASE_COOLDOWN_SEC:
+                    self._overload_limit = self.limit
+                self._decrease(self.OVERLOAD_DECREASE, now)
+                self._paused_until = max(self._paused_until, now + pause_sec)
+            elif latency is not None:
+                if self._latency_degraded(latency):
+                    self._decrease(self.LATENCY_DECREASE, now)
+                else:
+                    self._increase()
+
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Tạm dừng mọi request mới tới endpoint trong `seconds` giây."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _latency_degraded(self, latency: float) -> bool:
+        if self.latency_ewma is None:
+            self.latency_ewma = self.latency_baseline = latency
+            return False
+
+        self.latency_ewma += self.LATENCY_SMOOTHING * (latency - self.latency_ewma)
+        self.latency_baseline = min(self.latency_ewma, self.latency_baseline * (1 + self.BASELINE_DRIFT))
+        return self.latency_ewma > self.LATENCY_TOLERANCE * self.latency_baseline
+
+    def _increase(self):
+        step = 1.0 / self.limit
+        if self._overload_limit is not None:
+            if self.limit + 1 >= self._overload_limit:
+                step *= self.PROBE_INCREASE
+            if self.limit >= self._overload_limit + 1:
+                self._overload_limit = None  # Đã vượt mức cũ mà không quá tải -> tăng bình thường
+        self.limit = min(self.max_limit, self.limit + step)
+
+    def _decrease(self, factor: float, now: float):
+        if now - self._last_decrease < self.DECREASE_COOLDOWN_SEC:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
@@ -0,0 +1,34 @@
+# services/rate_limiter/composite_limiter.py
+from redis import Redis
+from typing import List
+
+from .rate_limiter import RedisRateLimiter
+from .leased_limiter import LeasedRateLimiter
+
+
+class CompositeRateLimiter(RedisRateLimiter):
+    """
+    Gộp nhiều RedisRateLimiter thành một: tất cả rule của mọi limiter được kiểm tra
+    trong cùng 1 lần gọi script (1 round trip, nguyên tử) và trả về 1 thời gian chờ duy nhất.
+
+    Key của từng rule giữ nguyên như limiter con ({base_key}:{name}:{period}s:sw), nên
+    request đi qua composite và request đi qua limiter con riêng lẻ vẫn tính chung quota.
+    Slot chỉ bị tiêu khi TẤT CẢ limiter đều cho phép.
+    """
+
+    def __init__(self, redis_client: Redis, limiters: List[RedisRateLimiter], **kwargs):
+        if not limiters:
+            raise ValueError("Phải có ít nhất một limiter.")
+        rules = [rule for limiter in limiters for rule in limiter.rules]
+        name = "+".join(limiter.name or "default" for limiter in limiters)
+        super().__init__(redis_client, rules, name, **kwargs)
+        self.limiters = limiters
+        # Giữ đúng thứ tự rule của từng limiter con để khớp với _rule_keys
+        self.rules = rules
+
+    def _rule_keys(self, base_key: str) -> List[str]:
+        return [key for limiter in self.limiters for key in limiter._rule_keys(base_key)]
+
+
+class LeasedCompositeRateLimiter(CompositeRateLimiter, LeasedRateLimiter):
+    """CompositeRateLimiter thuê token theo block: mỗi token giữ chỗ trên mọi limiter con."""
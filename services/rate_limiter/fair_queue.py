@@ -0,0 +1,240 @@
+# services/rate_limiter/fair_queue.py
+import time
+import random
+import asyncio
+import uuid
+from redis import Redis
+from typing import List, Optional, Tuple
+
+from .rate_limiter import RedisRateLimiter
+
+# Ticket queue công bằng (weighted fair queuing) trên sorted set.
+# Mỗi job có "finish tag" ảo: ticket mới có score = max(vclock, finish_tag_của_job) + 1/weight,
+# nên các job cùng chờ được xen kẽ theo trọng số thay vì job lớn chiếm hết slot.
+# Score bằng nhau -> sắp theo member (seq tăng dần) = thứ tự đến.
+#
+# KEYS: queue, heartbeats, finish_tags, vclock, seq
+# ARGV: job_id, 1/weight, key_ttl_ms
+ENQUEUE_SCRIPT = """
+local vclock = tonumber(redis.call('GET', KEYS[4]) or '0')
+local last = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+local finish = math.max(vclock, last) + tonumber(ARGV[2])
+local seq = redis.call('INCR', KEYS[5])
+local ticket = string.format('%012d:%s', seq, ARGV[1])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('HSET', KEYS[3], ARGV[1], tostring(finish))
+redis.call('ZADD', KEYS[1], finish, ticket)
+redis.call('ZADD', KEYS[2], now, ticket)
+for i = 1, 5 do
+    redis.call('PEXPIRE', KEYS[i], tonumber(ARGV[3]))
+end
+return ticket
+"""
+
+# Dọn ticket của worker đã chết (không heartbeat), làm mới heartbeat và trả về vị trí.
+# KEYS: queue, heartbeats
+# ARGV: ticket, stale_ms
+# Trả về: rank (0 = đầu hàng), -1 nếu ticket không còn trong hàng
+POSITION_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[2]))
+for _, ticket in ipairs(stale) do
+    redis.call('ZREM', KEYS[1], ticket)
+    redis.call('ZREM', KEYS[2], ticket)
+end
+
+redis.call('ZADD', KEYS[2], 'XX', now, ARGV[1])
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if not rank then
+    return -1
+end
+return rank
+"""
+
+# Rời hàng sau khi được cấp slot, đẩy vclock lên score của ticket.
+# KEYS: queue, heartbeats, vclock
+# ARGV: ticket
+DEQUEUE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+if score then
+    local vclock = tonumber(redis.call('GET', KEYS[3]) or '0')
+    if tonumber(score) > vclock then
+        redis.call('SET', KEYS[3], score, 'KEEPTTL')
+    end
+end
+return 1
+"""
+
+
+class FairRateLimiter:
+    """
+    Hàng đợi ticket công bằng đặt trước một RedisRateLimiter.
+
+    Khi nhiều job dùng chung key ratelimit:{advertiser_id}:{url}, chỉ ticket đứng đầu hàng
+    được thử chiếm slot, nên slot được cấp theo thứ tự đến (có trọng số theo job) thay vì
+    ai poll trước thắng trước. Các ticket khác ngủ theo vị trí trong hàng thay vì busy-wait.
+    """
+    STALE_TICKET_SEC = 30  # Ticket không heartbeat sau khoảng này bị coi là của worker đã chết
+    KEY_TTL_SEC = 3600
+    WAIT_JITTER_SEC = 0.01
+
+    def __init__(self, redis_client: Redis, limiter: RedisRateLimiter):
+        self.redis = redis_client
+        self.limiter = limiter
+        # Khoảng cách tối thiểu giữa 2 slot, dùng để ước lượng thời gian chờ theo vị trí
+        self.min_interval = min(period / limit for limit, period in limiter.rules)
+        self._enqueue_script = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._position_script = self.redis.register_script(POSITION_SCRIPT)
+        self._dequeue_script = self.redis.register_script(DEQUEUE_SCRIPT)
+
+    def _queue_keys(self, base_key: str) -> List[str]:
+        prefix = f"{base_key}:{self.limiter.name}:fq" if self.limiter.name else f"{base_key}:fq"
+        return [f"{prefix}:queue", f"{prefix}:heartbeats", f"{prefix}:finish", f"{prefix}:vclock", f"{prefix}:seq"]
+
+    def _enqueue(self, keys: List[str], job_id: str, weight: float) -> str:
+        return self._enqueue_script(
+            keys=keys,
+            args=[job_id, 1.0 / max(weight, 0.01), self.KEY_TTL_SEC * 1000]
+        )
+
+    def _position(self, keys: List[str], ticket: str) -> int:
+        return int(self._position_script(keys=keys[:2], args=[ticket, self.STALE_TICKET_SEC * 1000]))
+
+    def _dequeue(self, keys: List[str], ticket: str):
+        self._dequeue_script(keys=[keys[0], keys[1], keys[3]], args=[ticket])
+
+    def _record_wait(self, waited: float, base_key: Optional[str] = None):
+        metrics = getattr(self.limiter, "metrics", None)
+        if metrics:
+            metrics.record_wait(self.limiter.name or "default", waited, key=base_key)
+
+    def acquire(self, base_key: str) -> float:
+        """Chiếm slot trực tiếp, không qua hàng đợi (giữ tương thích với RedisRateLimiter)."""
+        return self.limiter.acquire(base_key)
+
+    def _take_turn(self, base_key: str, keys: List[str], ticket: str, job_id: str, weight: float) -> Tuple[Optional[str], float]:
+        """
+        Một vòng kiểm tra hàng đợi.
+
+        Returns:
+            (ticket, wait): ticket None = đã chiếm được slot và rời hàng;
+            ngược lại là ticket hiện tại (có thể mới nếu bị dọn khỏi hàng) và số giây nên chờ
+            trước vòng kế tiếp (0 = thử lại ngay).
+        """
+        rank = self._position(keys, ticket)
+        if rank < 0:
+            return self._enqueue(keys, job_id, weight), 0.0
+
+        if rank == 0:
+            wait = self.limiter.acquire(base_key)
+            if wait <= 0:
+                self._dequeue(keys, ticket)
+                return None, 0.0
+            return ticket, wait
+        return ticket, rank * self.min_interval
+
+    def _leave_queue(self, keys: List[str], ticket: Optional[str]):
+        # Hết timeout hoặc lỗi: rời hàng để không chặn các job khác
+        if ticket:
+            self.redis.zrem(keys[0], ticket)
+            self.redis.zrem(keys[1], ticket)
+
+    def _try_local(self, base_key: str) -> bool:
+        # Còn token đã thuê (LeasedRateLimiter) -> dùng ngay, không cần xếp hàng qua Redis
+        acquire_local = getattr(self.limiter, "acquire_local", None)
+        if acquire_local and acquire_local(base_key):
+            self._record_wait(0.0, base_key)
+            return True
+        return False
+
+    def wait_for_slot(
+        self,
+        base_key: str,
+        timeout: Optional[float] = None,
+        job_id: Optional[str] = None,
+        weight: float = 1.0
+    ) -> bool:
+        """
+        Xếp hàng và chờ đến lượt chiếm slot.
+
+        Args:
+            base_key: Key gốc của limiter
+            timeout: Thời gian chờ tối đa (giây), None = chờ đến khi có slot
+            job_id: Job sở hữu ticket (các request của cùng job chia chung finish tag)
+            weight: Trọng số của job, lớn hơn = được nhiều slot hơn khi tranh chấp
+
+        Returns:
+            True nếu chiếm được slot, False nếu hết timeout
+        """
+        if self._try_local(base_key):
+            return True
+
+        job_id = job_id or uuid.uuid4().hex
+        keys = self._queue_keys(base_key)
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        # Ngủ tối đa 1/3 thời gian stale để heartbeat không bị coi là worker chết
+        max_sleep = self.STALE_TICKET_SEC / 3
+
+        ticket = self._enqueue(keys, job_id, weight)
+        try:
+            while True:
+                ticket, wait = self._take_turn(base_key, keys, ticket, job_id, weight)
+                if ticket is None:
+                    self._record_wait(time.monotonic() - started, base_key)
+                    return True
+                if wait <= 0:
+                    continue
+
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    return False
+
+                time.sleep(min(wait, max_sleep) + random.uniform(0, self.WAIT_JITTER_SEC))
+        finally:
+            self._leave_queue(keys, ticket)
+
+    async def wait_for_slot_async(
+        self,
+        base_key: str,
+        timeout: Optional[float] = None,
+        job_id: Optional[str] = None,
+        weight: float = 1.0
+    ) -> bool:
+        """
+        Bản asyncio của wait_for_slot (cùng tham số và kết quả).
+        Lệnh Redis chạy qua asyncio.to_thread, thời gian chờ dùng asyncio.sleep nên
+        nhiều coroutine có thể cùng xếp hàng mà không giữ thread nào.
+        """
+        if self._try_local(base_key):
+            return True
+
+        job_id = job_id or uuid.uuid4().hex
+        keys = self._queue_keys(base_key)
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        max_sleep = self.STALE_TICKET_SEC / 3
+
+        ticket = await asyncio.to_thread(self._enqueue, keys, job_id, weight)
+        try:
+            while True:
+                ticket, wait = await asyncio.to_thread(self._take_turn, base_key, keys, ticket, job_id, weight)
+                if ticket is None:
+                    self._record_wait(time.monotonic() - started, base_key)
+                    return True
+                if wait <= 0:
+                    continue
+
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    return False
+
+                await asyncio.sleep(min(wait, max_sleep) + random.uniform(0, self.WAIT_JITTER_SEC))
+        finally:
+            # Kể cả khi coroutine bị hủy (CancelledError)
+            await asyncio.to_thread(self._leave_queue, keys, ticket)
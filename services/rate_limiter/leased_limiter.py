@@ -0,0 +1,187 @@
+# services/rate_limiter/leased_limiter.py
+import time
+import threading
+import uuid
+from redis import Redis
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import LimiterMetrics
+from .rate_limiter import RedisRateLimiter
+
+# Thuê (lease) một block token trên cùng sliding window của RedisRateLimiter.
+#
+# Token đang được thuê được ghi với score = thời điểm hết hạn lease (tương lai), nên mọi worker
+# khác đều tính chúng vào quota cho đến khi lease được trả. Khi trả lease (gộp vào lần thuê kế
+# tiếp), các reservation được thay bằng thời điểm dùng thực tế, token chưa dùng được trả lại.
+# Nhờ vậy giới hạn toàn cục vẫn đúng dù token được tiêu cục bộ, không cần gọi Redis mỗi request.
+#
+# KEYS: 1 key cho mỗi rule
+# ARGV: lease_id, block, ttl_ms, prev_id, prev_count, prev_start_ms, n_used, offset_1..offset_n,
+#       limit_1, period_ms_1, limit_2, period_ms_2, ...
+# Trả về: {granted, wait_ms, now_ms}
+LEASE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local lease_id = ARGV[1]
+local block = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local prev_id = ARGV[4]
+local prev_count = tonumber(ARGV[5])
+local prev_start = tonumber(ARGV[6])
+local n_used = tonumber(ARGV[7])
+local rule_base = 7 + n_used
+
+-- 1. Trả lease cũ: xoá reservation, ghi lại thời điểm dùng thực tế
+if prev_count > 0 then
+    for _, key in ipairs(KEYS) do
+        for j = 0, prev_count - 1 do
+            redis.call('ZREM', key, prev_id .. ':' .. j)
+        end
+        for j = 1, n_used do
+            redis.call('ZADD', key, prev_start + tonumber(ARGV[7 + j]), prev_id .. ':u' .. j)
+        end
+    end
+end
+
+if block <= 0 then
+    return {0, 0, now}
+end
+
+-- 2. Số token còn trống nhỏ nhất trên tất cả các rule
+local grant = block
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[rule_base + 2 * i - 1])
+    local period = tonumber(ARGV[rule_base + 2 * i])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - period)
+    local count = redis.call('ZCARD', key)
+    local room = limit - count
+    if room < grant then
+        grant = room
+    end
+    if room <= 0 then
+        local oldest = redis.call('ZRANGE', key, count - limit, count - limit, 'WITHSCORES')
+        local rule_wait = tonumber(oldest[2]) + period - now
+        if rule_wait > wait then
+            wait = rule_wait
+        end
+    end
+end
+
+if grant <= 0 then
+    return {0, math.max(wait, 1), now}
+end
+
+-- 3. Ghi reservation cho block mới
+local lease_end = now + ttl
+for i, key in ipairs(KEYS) do
+    for j = 0, grant - 1 do
+        redis.call('ZADD', key, lease_end, lease_id .. ':' .. j)
+    end
+    redis.call('PEXPIRE', key, tonumber(ARGV[rule_base + 2 * i]) + ttl)
+end
+return {grant, 0, now}
+"""
+
+
+class LeasedRateLimiter(RedisRateLimiter):
+    """
+    RedisRateLimiter thuê token theo block (ví dụ 5 trong quota 45/phút) và tiêu cục bộ.
+
+    Mỗi lần thuê tốn 1 lệnh Redis cho tối đa `lease_size` request, nên số lệnh Redis trên
+    mỗi API call < 1. Lease hết hạn sau `lease_ttl` giây, token chưa dùng được trả lại ở
+    lần thuê kế tiếp hoặc khi gọi release().
+    """
+    DEFAULT_LEASE_SIZE = 5
+    DEFAULT_LEASE_TTL_SEC = 2.0
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        rules: List[Tuple[int, int]],
+        name: Optional[str] = None,
+        lease_size: int = DEFAULT_LEASE_SIZE,
+        lease_ttl: float = DEFAULT_LEASE_TTL_SEC,
+        metrics: Optional[LimiterMetrics] = None
+    ):
+        super().__init__(redis_client, rules, name, metrics)
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self._lease_script = self.redis.register_script(LEASE_SCRIPT)
+        self._leases: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _spend_local(self, base_key: str) -> bool:
+        lease = self._leases.get(base_key)
+        now = time.monotonic()
+        if not lease or lease["remaining"] <= 0 or now >= lease["expires_at"]:
+            return False
+
+        lease["remaining"] -= 1
+        lease["used"].append(int((now - lease["started_at"]) * 1000))
+        return True
+
+    def _renew(self, base_key: str, block: int) -> Tuple[int, int]:
+        """Trả lease hiện tại (nếu có) và thuê block mới trong cùng 1 lần gọi script."""
+        prev = self._leases.pop(base_key, None)
+        lease_id = uuid.uuid4().hex
+        started_at = time.monotonic()
+
+        args = [lease_id, block, int(self.lease_ttl * 1000)]
+        if prev:
+            args.extend([prev["id"], prev["count"], prev["start_ms"], len(prev["used"])])
+            args.extend(prev["used"])
+        else:
+            args.extend(["", 0, 0, 0])
+        for limit, period in self.rules:
+            args.extend([limit, int(period * 1000)])
+
+        granted, wait_ms, now_ms = self._lease_script(keys=self._rule_keys(base_key), args=args)
+        granted = int(granted)
+
+        if granted > 0:
+            # started_at đo trước khi gọi Redis nên offset/expiry luôn thiên về an toàn
+            self._leases[base_key] = {
+                "id": lease_id,
+                "count": granted,
+                "remaining": granted,
+                "start_ms": int(now_ms),
+                "started_at": started_at,
+                "expires_at": started_at + self.lease_ttl,
+                "used": [],
+            }
+        return granted, int(wait_ms)
+
+    def acquire_local(self, base_key: str) -> bool:
+        """Tiêu 1 token của lease hiện tại nếu còn, không gọi Redis."""
+        with self._lock:
+            spent = self._spend_local(base_key)
+        if spent:
+            self._record_acquire(0.0, base_key)
+        return spent
+
+    def acquire(self, base_key: str) -> float:
+        """
+        Chiếm 1 slot, ưu tiên token đã thuê.
+
+        Returns:
+            0.0 nếu được phép, ngược lại là số giây cần chờ đến slot kế tiếp
+        """
+        with self._lock:
+            if self._spend_local(base_key):
+                wait = 0.0
+            else:
+                granted, wait_ms = self._renew(base_key, self.lease_size)
+                if granted > 0:
+                    self._spend_local(base_key)
+                wait = 0.0 if granted > 0 else wait_ms / 1000.0
+        self._record_acquire(wait, base_key)
+        return wait
+
+    def release(self, base_key: Optional[str] = None):
+        """Trả các lease đang giữ (token chưa dùng được hoàn lại cho các worker khác)."""
+        with self._lock:
+            keys = [base_key] if base_key else list(self._leases.keys())
+            for key in keys:
+                if key in self._leases:
+                    self._renew(key, 0)
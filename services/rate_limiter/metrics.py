@@ -0,0 +1,215 @@
+# services/rate_limiter/metrics.py
+import time
+import threading
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from redis import Redis
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cận trên (ms) của các bucket histogram thời gian chờ, bucket cuối là "inf"
+WAIT_BUCKETS_MS = [0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+STATS_KEY_PREFIX = "limiter_stats"
+SCOPES_KEY = f"{STATS_KEY_PREFIX}:scopes"
+STATS_TTL_SEC = 3600 * 24 * 2  # Giữ số liệu theo giờ trong 48 giờ
+
+
+def wait_bucket_field(wait_ms: float) -> str:
+    """Tên field histogram cho một khoảng chờ, ví dụ 'wait_le_250' hoặc 'wait_le_inf'."""
+    idx = bisect_left(WAIT_BUCKETS_MS, wait_ms)
+    return f"wait_le_{WAIT_BUCKETS_MS[idx]}" if idx < len(WAIT_BUCKETS_MS) else "wait_le_inf"
+
+
+def stats_key(scope: str, hour: str) -> str:
+    return f"{STATS_KEY_PREFIX}:{scope}:{hour}"
+
+
+def keyed_scope(scope: str, key: Optional[str] = None) -> str:
+    """Scope theo từng key của limiter, ví dụ 'gmv+basic|ratelimit:{advertiser_id}:{url}'."""
+    return f"{scope}|{key}" if key else scope
+
+
+class LimiterMetrics:
+    """
+    Bộ đếm cho rate limiter và backoff, ghi vào Redis theo giờ:
+
+        limiter_stats:{scope}:{YYYY-mm-dd-HH}  (hash)
+            granted / denied            số lần acquire được cấp / bị từ chối
+            waits / wait_ms             số lần chờ slot và tổng thời gian chờ (ms)
+            wait_le_{ms}                histogram thời gian chờ
+            backoff_count:{reason}      số lần backoff theo lý do
+            backoff_ms:{reason}         tổng thời gian backoff (ms) theo lý do
+        limiter_stats:scopes  (set)     các scope đã có số liệu
+
+    scope = tên limiter / nguồn backoff, kèm key (advertiser/url) nếu có: "{scope}|{key}",
+    để tách số liệu của từng advertiser/endpoint khi tinh chỉnh limit.
+
+    Số liệu được cộng dồn trong bộ nhớ (thread-safe) và ghi bằng 1 pipeline HINCRBY
+    mỗi FLUSH_INTERVAL_SEC giây, nên instrumentation không thêm round trip cho mỗi request.
+    auto_flush=False: không tự ghi khi đến hạn, bên dùng tự gọi flush() khi flush_due()
+    (ví dụ từ thread riêng khi ghi nhận số liệu trên event loop).
+    """
+    FLUSH_INTERVAL_SEC = 5.0
+
+    def __init__(self, redis_client: Redis, flush_interval: Optional[float] = None, auto_flush: bool = True):
+        self.redis = redis_client
+        self.flush_interval = self.FLUSH_INTERVAL_SEC if flush_interval is None else flush_interval
+        self.auto_flush = auto_flush
+        self._pending: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _add(self, scope: str, fields: Dict[str, int]):
+        with self._lock:
+            counters = self._pending[scope]
+            for field, value in fields.items():
+                counters[field] += value
+            due = self.auto_flush and time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def record_acquire(self, scope: str, granted: bool, key: Optional[str] = None):
+        """Một lần thử chiếm slot của limiter."""
+        self._add(keyed_scope(scope, key), {"granted" if granted else "denied": 1})
+
+    def record_wait(self, scope: str, wait_sec: float, key: Optional[str] = None):
+        """Tổng thời gian một request đã chờ trước khi có slot."""
+        wait_ms = max(0, int(wait_sec * 1000))
+        self._add(keyed_scope(scope, key), {"waits": 1, "wait_ms": wait_ms, wait_bucket_field(wait_ms): 1})
+
+    def record_backoff(self, scope: str, reason: str, seconds: float, key: Optional[str] = None):
+        """Một lần ngủ do backoff/retry, phân loại theo lý do."""
+        self._add(
+            keyed_scope(scope, key),
+            {f"backoff_count:{reason}": 1, f"backoff_ms:{reason}": max(0, int(seconds * 1000))}
+        )
+
+    def flush_due(self) -> bool:
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        """Ghi toàn bộ số liệu đang chờ vào Redis bằng 1 pipeline."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        hour = datetime.now(timezone.utc).strftime('%Y-%m-%d-%H')
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for scope, counters in pending.items():
+                key = stats_key(scope, hour)
+                for field, value in counters.items():
+                    pipe.hincrby(key, field, value)
+                pipe.expire(key, STATS_TTL_SEC)
+            pipe.sadd(SCOPES_KEY, *pending.keys())
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không thể ghi limiter stats: {e}")
+
+
+API_CALLS_TTL_SEC = 3600 * 24  # Giữ số lần gọi API theo giờ trong 24 giờ
+
+
+class ApiCallCounter:
+    """
+    Đếm số lần gọi API theo endpoint, cùng key với dashboard (get_api_total_counts /
+    get_api_timeseries_counts):
+
+        api_calls_total:{url}                   tổng số lần gọi
+        api_calls:{url}:{YYYY-mm-dd-HH}         số lần gọi theo giờ (hết hạn sau 24 giờ)
+
+    Như LimiterMetrics: cộng dồn trong bộ nhớ (thread-safe), mỗi lần gọi được tính vào giờ
+    lúc nó xảy ra, và ghi bằng 1 pipeline INCRBY mỗi FLUSH_INTERVAL_SEC giây hoặc khi flush().
+    """
+    FLUSH_INTERVAL_SEC = 5.0
+
+    def __init__(self, redis_client: Redis, flush_interval: Optional[float] = None, auto_flush: bool = True):
+        self.redis = redis_client
+        self.flush_interval = self.FLUSH_INTERVAL_SEC if flush_interval is None else flush_interval
+        self.auto_flush = auto_flush
+        self._pending: Dict[tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record_call(self, url: str):
+        hour = datetime.now(timezone.utc).strftime('%Y-%m-%d-%H')
+        with self._lock:
+            self._pending[(url, hour)] += 1
+            due = self.auto_flush and time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush_due(self) -> bool:
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        """Ghi các delta đang chờ vào Redis bằng 1 pipeline."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        totals = defaultdict(int)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for (url, hour), count in pending.items():
+                totals[url] += count
+                hour_key = f"api_calls:{url}:{hour}"
+                pipe.incrby(hour_key, count)
+                pipe.expire(hour_key, API_CALLS_TTL_SEC)
+            for url, count in totals.items():
+                pipe.incrby(f"api_calls_total:{url}", count)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Không thể ghi log API call: {e}")
+
+
+def get_limiter_stats_timeseries(redis_client: Redis, hours: int = 24) -> Dict[str, List[Dict[str, Any]]]:
+    """Đọc số liệu limiter theo giờ cho mọi scope, dùng cho dashboard."""
+    scopes = sorted(redis_client.smembers(SCOPES_KEY))
+    if not scopes:
+        return {}
+
+    now = datetime.now(timezone.utc)
+    hours_list = [now.replace(minute=0, second=0, microsecond=0).timestamp() - 3600 * i for i in range(hours)][::-1]
+    hour_strs = [datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d-%H') for ts in hours_list]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for scope in scopes:
+        for hour in hour_strs:
+            pipe.hgetall(stats_key(scope, hour))
+    results = iter(pipe.execute())
+
+    series = {}
+    for scope in scopes:
+        points = []
+        for ts in hours_list:
+            raw = next(results) or {}
+            counters = {field: int(value) for field, value in raw.items()}
+            backoff_sec = {
+                field.split(":", 1)[1]: round(value / 1000, 1)
+                for field, value in counters.items() if field.startswith("backoff_ms:")
+            }
+            points.append({
+                "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "granted": counters.get("granted", 0),
+                "denied": counters.get("denied", 0),
+                "waits": counters.get("waits", 0),
+                "wait_sec": round(counters.get("wait_ms", 0) / 1000, 1),
+                "wait_histogram": {
+                    field[len("wait_le_"):]: value
+                    for field, value in counters.items() if field.startswith("wait_le_")
+                },
+                "backoff_sec": backoff_sec,
+            })
+        series[scope] = points
+    return series
@@ -1,43 +1,139 @@
 # services/utils/rate_limiter.py
 import time
+import random
+import uuid
 from redis import Redis
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from .metrics import LimiterMetrics
+
+# Sliding window log trên sorted set: mỗi request được ghi 1 member với score = thời điểm (ms).
+# Kiểm tra TẤT CẢ các rule trước, chỉ ghi nhận (ZADD) khi mọi rule đều cho phép,
+# nên request bị từ chối không tiêu tốn quota của rule nào.
+#
+# KEYS: 1 key cho mỗi rule
+# ARGV: member, limit_1, period_ms_1, limit_2, period_ms_2, ...
+# Trả về: 0 nếu được phép, ngược lại là số ms cần chờ đến slot kế tiếp
+SLIDING_WINDOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local member = ARGV[1]
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[2 * i])
+    local period = tonumber(ARGV[2 * i + 1])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - period)
+    local count = redis.call('ZCARD', key)
+    if count >= limit then
+        local oldest = redis.call('ZRANGE', key, count - limit, count - limit, 'WITHSCORES')
+        local rule_wait = tonumber(oldest[2]) + period - now
+        if rule_wait > wait then
+            wait = rule_wait
+        end
+    end
+end
+
+if wait > 0 then
+    return wait
+end
+
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 * i + 1]))
+end
+return 0
+"""
+
 
 class RedisRateLimiter:
     """
     Một bộ giới hạn tần suất (rate limiter) sử dụng Redis,
     có khả năng xử lý nhiều quy tắc giới hạn (ví dụ: mỗi giây và mỗi phút).
+
+    Dùng sliding window (không bị burst gấp đôi ở ranh giới cửa sổ như fixed window)
+    và kiểm tra tất cả quy tắc trong 1 Lua script (1 round trip, nguyên tử).
     """
-    def __init__(self, redis_client: Redis, rules: List[Tuple[int, int]]):
+    WAIT_JITTER_SEC = 0.01
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        rules: List[Tuple[int, int]],
+        name: Optional[str] = None,
+        metrics: Optional[LimiterMetrics] = None
+    ):
         """
         Khởi tạo limiter.
         Args:
             redis_client: Instance của redis.Redis.
-            rules (List[Tuple[int, int]]): Một danh sách các quy tắc. 
+            rules (List[Tuple[int, int]]): Một danh sách các quy tắc.
                                            Mỗi quy tắc là một tuple (limit, period).
                                            Ví dụ: [(10, 1), (600, 60)]
+            name: Tên limiter, dùng để tách key khi nhiều limiter dùng chung base_key
+            metrics: Bộ đếm granted/denied/thời gian chờ (optional)
         """
         if not rules:
             raise ValueError("Phải có ít nhất một quy tắc giới hạn.")
         self.redis = redis_client
         self.rules = sorted(rules, key=lambda x: x[1]) # Sắp xếp theo period để tối ưu
+        self.name = name
+        self.metrics = metrics
+        self._script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def _rule_keys(self, base_key: str) -> List[str]:
+        prefix = f"{base_key}:{self.name}" if self.name else base_key
+        return [f"{prefix}:{period}s:sw" for _, period in self.rules]
+
+    @property
+    def metrics_scope(self) -> str:
+        return self.name or "default"
+
+    def _record_acquire(self, wait: float, base_key: Optional[str] = None):
+        if self.metrics:
+            self.metrics.record_acquire(self.metrics_scope, wait <= 0, key=base_key)
+
+    def _record_wait(self, waited: float, base_key: Optional[str] = None):
+        if self.metrics:
+            self.metrics.record_wait(self.metrics_scope, waited, key=base_key)
 
-    def acquire(self, base_key: str) -> bool:
+    def acquire(self, base_key: str) -> float:
         """
-        Cố gắng "chiếm" một slot request. Trả về True nếu được phép theo TẤT CẢ các quy tắc.
+        Cố gắng "chiếm" một slot request theo TẤT CẢ các quy tắc.
+
+        Returns:
+            0.0 nếu được phép, ngược lại là số giây cần chờ đến slot kế tiếp
         """
+        args = [uuid.uuid4().hex]
         for limit, period in self.rules:
-            # Tạo một key duy nhất trong Redis cho mỗi quy tắc
-            key = f"{base_key}:{period}s"
-            
-            current_count = self.redis.incr(key)
-            
-            if current_count == 1:
-                self.redis.expire(key, period)
-            
-            # Nếu vi phạm bất kỳ quy tắc nào, từ chối ngay lập tức
-            if current_count > limit:
+            args.extend([limit, int(period * 1000)])
+
+        wait = int(self._script(keys=self._rule_keys(base_key), args=args)) / 1000.0
+        self._record_acquire(wait, base_key)
+        return wait
+
+    def wait_for_slot(self, base_key: str, timeout: Optional[float] = None) -> bool:
+        """
+        Chờ đến khi chiếm được slot, ngủ đúng khoảng thời gian limiter trả về thay vì poll mỗi giây.
+
+        Args:
+            base_key: Key gốc của limiter
+            timeout: Thời gian chờ tối đa (giây), None = chờ đến khi có slot
+
+        Returns:
+            True nếu chiếm được slot, False nếu hết timeout
+        """
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        while True:
+            wait = self.acquire(base_key)
+            if wait <= 0:
+                self._record_wait(time.monotonic() - started, base_key)
+                return True
+
+            if deadline is not None and time.monotonic() + wait > deadline:
                 return False
-        
-        # Nếu vượt qua tất cả các quy tắc, cho phép request
-        return True
\ No newline at end of file
+
+            # Thêm jitter nhỏ để các worker cùng chờ không đồng loạt thức dậy
+            time.sleep(wait + random.uniform(0, self.WAIT_JITTER_SEC))
@@ -0,0 +1,217 @@
+"""
+Facebook Replay Simulator
+Replay các summary rate limit đã lưu trong task_logs.api_total_counts.summaries với một
+backoff policy khác (EnhancedBackoffHandler với ngưỡng khác), để ước lượng thời gian job,
+số lần chạm rate limit và tổng thời gian backoff mà không tốn quota thật.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from services.facebook.err_handler.rate_limit import EnhancedBackoffHandler
+from services.facebook.err_handler.facebook_error_handler import FacebookErrorHandler
+
+logger = logging.getLogger(__name__)
+
+
+def make_backoff_policy(handler_cls=EnhancedBackoffHandler, **overrides) -> EnhancedBackoffHandler:
+    """
+    Tạo policy từ EnhancedBackoffHandler với các hằng số được ghi đè, ví dụ:
+        make_backoff_policy(USAGE_WARNING_PCT=80, USAGE_WARNING_BACKOFF_SEC=30)
+    """
+    policy = handler_cls(reporter=None)
+    for name, value in overrides.items():
+        if not hasattr(policy, name):
+            raise ValueError(f"{handler_cls.__name__} không có tham số '{name}'.")
+        setattr(policy, name, value)
+    return policy
+
+
+class FacebookReplaySimulator:
+    """
+    Mô hình replay:
+
+    - Mỗi summary là trạng thái sau 1 batch. Mỗi chỉ số usage (app, insights của từng account,
+      total_time / total_cputime của từng business use case) là một "meter" (%).
+    - Meter giảm dần theo thời gian (cửa sổ trượt 1 giờ của Facebook: DECAY_PCT_PER_SEC).
+      Lượng mỗi batch tiêu thụ = thay đổi ghi nhận được + phần đã giảm trong khoảng thời gian đó.
+    - Thời gian làm việc của mỗi batch = khoảng cách giữa 2 summary trừ đi backoff mà policy gốc
+      (baseline) đã ngủ sau summary trước.
+    - Replay: cộng lượng tiêu thụ của từng batch, hỏi policy mới cần backoff bao lâu. Meter
+      chạm 100% = 1 lần rate limit: batch bị từ chối, chờ theo FacebookErrorHandler rồi gửi lại.
+    - Summary dựng lại mang timestamp theo đồng hồ mô phỏng, để pacing của policy ước lượng
+      mức tăng usage giống như khi chạy thật.
+    - Chờ của FacebookUsageGovernor không được mô phỏng: với PACING_ENABLED, governor chỉ thêm
+      block/ETA (đã có trong policy) và usage của job khác, không có trong summary của một job.
+    """
+
+    DECAY_PCT_PER_SEC = 100 / 3600
+    RATE_LIMIT_PCT = 100
+    DEFAULT_BATCH_SEC = 5.0  # Khi summary không có timestamp
+    MAX_RETRIES_PER_BATCH = 3
+    RATE_LIMIT_ERROR = {"code": 80000, "message": "Simulated ads insights rate limit"}
+
+    def __init__(self, summaries: List[Dict[str, Any]], baseline_policy: Optional[EnhancedBackoffHandler] = None):
+        self.summaries = [s for s in (summaries or []) if isinstance(s, dict) and s.get("rate_limits")]
+        self.baseline_policy = baseline_policy or make_backoff_policy()
+        self._meters = [self._extract_meters(s) for s in self.summaries]
+        self._start_time = self._parse_timestamp(self.summaries[0]) if self.summaries else None
+        self._baseline_backoff = self._replay_baseline_backoff()
+        self._work_sec = self._reconstruct_work_time()
+        self._consumption = self._reconstruct_consumption()
+
+    # ==================== RECONSTRUCT ====================
+
+    @staticmethod
+    def _extract_meters(summary: Dict[str, Any]) -> Dict[str, float]:
+        rate_limits = summary.get("rate_limits", {})
+        meters = {"app": float(rate_limits.get("app_usage_pct") or 0)}
+        for account in rate_limits.get("account_details", []):
+            account_id = account.get("account_id", "unknown")
+            meters[f"account:{account_id}"] = float(account.get("insights_usage_pct") or 0)
+            for use_case in account.get("business_use_cases", []):
+                prefix = f"buc:{account_id}:{use_case.get('type', 'unknown')}"
+                meters[f"{prefix}:time"] = float(use_case.get("total_time") or 0)
+                meters[f"{prefix}:cputime"] = float(use_case.get("total_cputime") or 0)
+        return meters
+
+    @staticmethod
+    def _parse_timestamp(summary: Dict[str, Any]) -> Optional[datetime]:
+        try:
+            return datetime.fromisoformat(str(summary.get("timestamp")))
+        except (TypeError, ValueError):
+            return None
+
+    def _policy_backoff(self, policy: EnhancedBackoffHandler, summary: Dict[str, Any], responses=None) -> float:
+        return policy.backoff_with_buffer(policy.calculate_backoff(responses or [], summary))
+
+    def _replay_baseline_backoff(self) -> List[float]:
+        """Thời gian policy gốc đã chờ sau từng summary (theo đúng thứ tự, vì pacing có trạng thái)."""
+        self.baseline_policy.reset_pacing()
+        backoff = [self._policy_backoff(self.baseline_policy, s) for s in self.summaries]
+        self.baseline_policy.reset_pacing()
+        return backoff
+
+    def _reconstruct_work_time(self) -> List[float]:
+        """Thời gian xử lý (không tính backoff) của từng batch."""
+        timestamps = [self._parse_timestamp(s) for s in self.summaries]
+        work = [self.DEFAULT_BATCH_SEC]
+        for i in range(1, len(self.summaries)):
+            if timestamps[i] is None or timestamps[i - 1] is None:
+                work.append(self.DEFAULT_BATCH_SEC)
+                continue
+            gap = (timestamps[i] - timestamps[i - 1]).total_seconds()
+            work.append(max(0.0, gap - self._baseline_backoff[i - 1]))
+        return work
+
+    def _reconstruct_consumption(self) -> List[Dict[str, float]]:
+        """Lượng % mỗi batch tiêu thụ trên từng meter."""
+        consumption = [{}]
+        for i in range(1, len(self._meters)):
+            previous, current = self._meters[i - 1], self._meters[i]
+            gap = self._work_sec[i] + self._baseline_backoff[i - 1]
+            consumption.append({
+                meter: max(0.0, value - previous.get(meter, 0.0) + self.DECAY_PCT_PER_SEC * gap)
+                for meter, value in current.items()
+            })
+        return consumption
+
+    # ==================== REPLAY ====================
+
+    def _build_summary(self, meters: Dict[str, float], elapsed_sec: float) -> Dict[str, Any]:
+        """Dựng lại summary theo format của batch server từ trạng thái meter mô phỏng."""
+        accounts: Dict[str, Dict[str, Any]] = {}
+        for meter, value in meters.items():
+            parts = meter.split(":")
+            if parts[0] == "account":
+                accounts.setdefault(parts[1], {"account_id": parts[1], "business_use_cases": {}})
+                accounts[parts[1]]["insights_usage_pct"] = round(value, 2)
+            elif parts[0] == "buc":
+                account = accounts.setdefault(parts[1], {"account_id": parts[1], "business_use_cases": {}})
+                use_case = account["business_use_cases"].setdefault(parts[2], {"type": parts[2]})
+                use_case["total_time" if parts[3] == "time" else "total_cputime"] = round(value, 2)
+
+        for account in accounts.values():
+            account["business_use_cases"] = list(account["business_use_cases"].values())
+        timestamp = (self._start_time or datetime(2000, 1, 1)) + timedelta(seconds=elapsed_sec)
+        return {
+            "timestamp": timestamp.isoformat(),
+            "rate_limits": {"app_usage_pct": round(meters.get("app", 0.0), 2), "account_details": list(accounts.values())}
+        }
+
+    def _decay(self, meters: Dict[str, float], seconds: float):
+        for meter in meters:
+            meters[meter] = max(0.0, meters[meter] - self.DECAY_PCT_PER_SEC * seconds)
+
+    def run(self, policy: Optional[EnhancedBackoffHandler] = None) -> Dict[str, Any]:
+        """
+        Replay toàn bộ summary với policy (mặc định: baseline).
+
+        Returns:
+            {
+                "batches": int,
+                "duration_sec": float,       # Thời gian job dự kiến
+                "work_sec": float,           # Phần thời gian xử lý (không tính backoff)
+                "total_backoff_sec": float,
+                "backoff_count": int,
+                "rate_limit_hits": int,
+                "max_usage_pct": float,
+                "exceeds_max_backoff": bool  # Policy đòi backoff > MAX_BACKOFF_SECONDS (job sẽ lỗi)
+            }
+        """
+        policy = policy or self.baseline_policy
+        policy.reset_pacing()
+        result = {
+            "batches": len(self.summaries),
+            "duration_sec": 0.0,
+            "work_sec": 0.0,
+            "total_backoff_sec": 0.0,
+            "backoff_count": 0,
+            "rate_limit_hits": 0,
+            "max_usage_pct": 0.0,
+            "exceeds_max_backoff": False,
+        }
+        if not self.summaries:
+            return result
+
+        meters = dict(self._meters[0])
+        hit_response = {"status_code": 400, "error": self.RATE_LIMIT_ERROR}
+        hit_backoff = FacebookErrorHandler.analyze_error(self.RATE_LIMIT_ERROR)["backoff_seconds"]
+
+        # Batch đầu tiên: không có summary trước đó, dùng thời gian mặc định
+        result["work_sec"] += self._work_sec[0]
+
+        for i in range(len(self.summaries)):
+            if i > 0:
+                for _ in range(self.MAX_RETRIES_PER_BATCH):
+                    self._decay(meters, self._work_sec[i])
+                    result["work_sec"] += self._work_sec[i]
+                    if all(meters.get(m, 0.0) + c < self.RATE_LIMIT_PCT for m, c in self._consumption[i].items()):
+                        break
+                    # Batch bị từ chối (không tính usage), chờ theo response lỗi rồi gửi lại
+                    result["rate_limit_hits"] += 1
+                    wait = max(hit_backoff, self._policy_backoff(policy, None, [hit_response]))
+                    result["total_backoff_sec"] += wait
+                    result["backoff_count"] += 1
+                    self._decay(meters, wait)
+                for meter, amount in self._consumption[i].items():
+                    meters[meter] = meters.get(meter, 0.0) + amount
+
+            result["max_usage_pct"] = max(result["max_usage_pct"], max(meters.values(), default=0.0))
+
+            elapsed_sec = result["work_sec"] + result["total_backoff_sec"]
+            decision = policy.calculate_backoff([], self._build_summary(meters, elapsed_sec))
+            if decision["should_backoff"]:
+                if decision["backoff_seconds"] > policy.MAX_BACKOFF_SECONDS:
+                    result["exceeds_max_backoff"] = True
+                wait = policy.backoff_with_buffer(decision)
+                result["total_backoff_sec"] += wait
+                result["backoff_count"] += 1
+                self._decay(meters, wait)
+
+        result["duration_sec"] = round(result["work_sec"] + result["total_backoff_sec"], 2)
+        result["work_sec"] = round(result["work_sec"], 2)
+        result["total_backoff_sec"] = round(result["total_backoff_sec"], 2)
+        result["max_usage_pct"] = round(result["max_usage_pct"], 2)
+        return result
@@ -0,0 +1,159 @@
+"""
+TikTok Replay Simulator
+Replay timeline response của GMVReporter (task_logs.api_total_counts.response_timeline)
+với bộ rule rate limiter khác, để ước lượng thời gian job, số lần bị TikTok từ chối
+("Too many requests") và tổng thời gian chờ/backoff.
+"""
+
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.gmv.gmv_reporter import GMVReporter
+
+logger = logging.getLogger(__name__)
+
+Rules = List[Tuple[int, float]]
+
+# Rule đang chạy production (GMVReporter.__init__)
+DEFAULT_LIMITER_RULES: Dict[str, Rules] = {
+    "gmv": [(2, 1), (45, 60)],
+    "basic": [(8, 1), (550, 60)],
+}
+
+
+class SlidingWindow:
+    """Bản Python của SLIDING_WINDOW_SCRIPT (services/rate_limiter/rate_limiter.py) cho thời gian mô phỏng."""
+
+    def __init__(self, rules: Rules):
+        self.rules = sorted(rules, key=lambda x: x[1])
+        self._logs = [deque() for _ in self.rules]
+
+    def wait_time(self, now: float) -> float:
+        wait = 0.0
+        for (limit, period), log in zip(self.rules, self._logs):
+            while log and log[0] <= now - period:
+                log.popleft()
+            if len(log) >= limit:
+                wait = max(wait, log[len(log) - limit] + period - now)
+        return wait
+
+    def record(self, now: float):
+        for log in self._logs:
+            log.append(now)
+
+
+class TikTokReplaySimulator:
+    """
+    Mô hình replay (tuần tự, 1 luồng):
+
+    - Mỗi response "ok" trong timeline là 1 request logic với latency đã ghi nhận. Các response
+      "rate_limit" bị bỏ (do policy cũ gây ra), "timeout"/"network" được giữ (lỗi phía server).
+    - Client: request chờ limiter (rule ứng viên) trước khi gửi, giống check_rate_limit.
+    - Server: TikTok từ chối request vượt `server_rules` (quota thật, mặc định = rule production).
+      Request bị từ chối/timeout chờ theo exponential backoff của _make_api_request_with_backoff
+      (base_delay ** lần thử) rồi gửi lại.
+    """
+
+    BASE_DELAY = 3
+    MAX_RETRIES = 6
+    DEFAULT_LATENCY_SEC = 0.5
+
+    def __init__(
+        self,
+        timeline: List[Dict[str, Any]],
+        server_rules: Optional[Dict[str, Rules]] = None,
+        performance_url: str = GMVReporter.PERFORMANCE_API_URL
+    ):
+        self.timeline = sorted(
+            (e for e in (timeline or []) if isinstance(e, dict) and e.get("outcome") != "rate_limit"),
+            key=lambda e: e.get("t", 0)
+        )
+        self.server_rules = server_rules or DEFAULT_LIMITER_RULES
+        self.performance_url = performance_url
+
+    @classmethod
+    def from_api_usage(cls, api_usage: Dict[str, Any], duration_sec: float = 0, **kwargs) -> "TikTokReplaySimulator":
+        """
+        Dựng simulator từ api_total_counts của task log. Nếu job chưa ghi response_timeline
+        thì tạo timeline giả từ số request mỗi URL, dàn đều trong thời gian job.
+        """
+        timeline = api_usage.get("response_timeline")
+        if not timeline:
+            counts = [(url, n) for url, n in api_usage.items() if isinstance(n, int) and n > 0]
+            total = sum(n for _, n in counts)
+            latency = (duration_sec / total) if total and duration_sec else cls.DEFAULT_LATENCY_SEC
+            timeline = []
+            for url, n in counts:
+                timeline.extend({"t": 0, "url": url, "outcome": "ok", "latency": latency} for _ in range(n))
+        return cls(timeline, **kwargs)
+
+    def _limiters_for(self, windows: Dict[str, SlidingWindow], url: str) -> List[SlidingWindow]:
+        names = ["gmv", "basic"] if url == self.performance_url else ["basic"]
+        return [windows[name] for name in names if name in windows]
+
+    def run(self, limiter_rules: Optional[Dict[str, Rules]] = None) -> Dict[str, Any]:
+        """
+        Replay timeline với rule limiter ứng viên (mặc định: rule production).
+
+        Returns:
+            {
+                "requests": int,
+                "duration_sec": float,
+                "limiter_wait_sec": float,
+                "total_backoff_sec": float,
+                "rate_limit_hits": int,
+                "failed_requests": int   # Hết số lần thử
+            }
+        """
+        client = {name: SlidingWindow(rules) for name, rules in (limiter_rules or DEFAULT_LIMITER_RULES).items()}
+        server = {name: SlidingWindow(rules) for name, rules in self.server_rules.items()}
+        now = 0.0
+        result = {
+            "requests": len(self.timeline),
+            "duration_sec": 0.0,
+            "limiter_wait_sec": 0.0,
+            "total_backoff_sec": 0.0,
+            "rate_limit_hits": 0,
+            "failed_requests": 0,
+        }
+
+        for event in self.timeline:
+            url = event.get("url", "")
+            latency = event.get("latency") or self.DEFAULT_LATENCY_SEC
+            server_error = event.get("outcome") in ("timeout", "network")
+
+            for attempt in range(self.MAX_RETRIES):
+                # Chờ limiter phía client (gộp tất cả rule như CompositeRateLimiter)
+                client_windows = self._limiters_for(client, url)
+                wait = max((w.wait_time(now) for w in client_windows), default=0.0)
+                now += wait
+                result["limiter_wait_sec"] += wait
+                for w in client_windows:
+                    w.record(now)
+
+                server_windows = self._limiters_for(server, url)
+                rejected = any(w.wait_time(now) > 0 for w in server_windows)
+                if not rejected:
+                    for w in server_windows:
+                        w.record(now)
+                now += latency
+
+                if rejected:
+                    result["rate_limit_hits"] += 1
+                elif server_error:
+                    server_error = False  # Lỗi server chỉ xảy ra 1 lần như trong timeline gốc
+                else:
+                    break
+
+                if attempt == self.MAX_RETRIES - 1:
+                    result["failed_requests"] += 1
+                    break
+                delay = self.BASE_DELAY ** (attempt + 1)
+                now += delay
+                result["total_backoff_sec"] += delay
+
+        result["duration_sec"] = round(now, 2)
+        result["limiter_wait_sec"] = round(result["limiter_wait_sec"], 2)
+        result["total_backoff_sec"] = round(result["total_backoff_sec"], 2)
+        return result
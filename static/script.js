@@ -5,7 +5,10 @@ let charts = {
     status: null,
     endpoint: null,
     tiktokApi: null,
-    fbUsage: null
+    fbUsage: null,
+    tiktokLimiterWait: null,
+    tiktokLimiterDecisions: null,
+    fbBackoffReasons: null
 };
 
 let rawData = null;
@@ -111,8 +114,10 @@ function applyFilterAndRender() {
         renderOverview(filteredTasks);
     } else if (currentTab === 'tiktok') {
         renderTikTokDashboard(filteredTasks, rawData.api_timeseries);
+        renderTikTokLimiterStats(rawData.limiter_stats);
     } else if (currentTab === 'facebook') {
         renderFacebookDashboard(filteredTasks);
+        renderFacebookBackoffReasons(rawData.limiter_stats);
     }
 }
 
@@ -311,6 +316,59 @@ function renderTikTokDashboard(tasks, apiTimeseries) {
     renderTasksTable(tkTasks, 'tiktok-tasks-body', ['job_id', 'task_type', 'user_email', 'status', 'duration_seconds', 'message']);
 }
 
+// Limiter stats: { scope: [{timestamp, granted, denied, waits, wait_sec, wait_histogram, backoff_sec}] }
+// scope = "<limiter>" hoặc "<limiter>|<key>" (key = ratelimit:{advertiser_id}:{url}) -> tách theo advertiser/endpoint
+// -> datasetMap cho renderLineChart: { label: [{timestamp, count}] }
+const BACKOFF_SCOPES = ['tiktok_api', 'facebook'];
+
+function limiterSeries(points, valueFn) {
+    return points.map(p => ({ timestamp: p.timestamp, count: valueFn(p) }));
+}
+
+function scopeBase(scope) {
+    return scope.split('|')[0];
+}
+
+function scopesOf(limiterStats, filterFn) {
+    return Object.keys(limiterStats || {}).filter(scope => filterFn(scopeBase(scope))).sort();
+}
+
+function backoffReasonSeries(limiterStats, base) {
+    const datasetMap = {};
+    scopesOf(limiterStats, b => b === base).forEach(scope => {
+        const points = limiterStats[scope] || [];
+        const reasons = new Set();
+        points.forEach(p => Object.keys(p.backoff_sec || {}).forEach(r => reasons.add(r)));
+        reasons.forEach(reason => {
+            datasetMap[`${scope} backoff: ${reason}`] = limiterSeries(points, p => (p.backoff_sec || {})[reason] || 0);
+        });
+    });
+    return datasetMap;
+}
+
+function renderTikTokLimiterStats(limiterStats) {
+    const waitMap = {};
+    const decisionMap = {};
+
+    // Mọi scope của limiter (không phải scope backoff) mà get_dashboard_data trả về
+    scopesOf(limiterStats, base => !BACKOFF_SCOPES.includes(base)).forEach(scope => {
+        const points = limiterStats[scope] || [];
+        if (!points.length) return;
+        waitMap[`${scope} wait`] = limiterSeries(points, p => p.wait_sec);
+        decisionMap[`${scope} granted`] = limiterSeries(points, p => p.granted);
+        decisionMap[`${scope} denied`] = limiterSeries(points, p => p.denied);
+    });
+    Object.assign(waitMap, backoffReasonSeries(limiterStats, 'tiktok_api'));
+
+    renderLineChart('tiktokLimiterWaitChart', waitMap, charts.tiktokLimiterWait, (c) => charts.tiktokLimiterWait = c);
+    renderLineChart('tiktokLimiterDecisionChart', decisionMap, charts.tiktokLimiterDecisions, (c) => charts.tiktokLimiterDecisions = c);
+}
+
+function renderFacebookBackoffReasons(limiterStats) {
+    const backoffMap = backoffReasonSeries(limiterStats, 'facebook');
+    renderLineChart('fbBackoffReasonChart', backoffMap, charts.fbBackoffReasons, (c) => charts.fbBackoffReasons = c);
+}
+
 // ================================================================
 // TAB 3: FACEBOOK RENDERER
 // ================================================================
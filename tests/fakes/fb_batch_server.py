@@ -0,0 +1,580 @@
+"""
+Fake facebook_batch_server
+Giả lập hợp đồng POST /batch của fb_batch_request_server (results, request_index,
+status_code, summary.rate_limits) để đo hiệu năng các reporter Facebook mà không cần
+Graph API thật.
+
+Dùng in-process:
+    server = FakeFacebookBatchServer(rows_per_request=1000)
+    body = server.handle_batch({"access_token": "x", "relative_urls": [...]})
+
+Hoặc chạy HTTP local và trỏ reporter vào `batch_api_url`:
+    with FakeFacebookBatchServer(latency_sec=0.2) as server:
+        reporter = FacebookDailyReporterV2(access_token="x", batch_api_url=server.batch_api_url)
+
+Chạy độc lập:
+    python -m tests.fakes.fb_batch_server --port 8010 --rows 2000
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, urlencode
+
+GRAPH_BASE_URL = "https://graph.facebook.com/v24.0"
+
+# Các field trả về dạng list [{action_type, value}]
+ACTION_LIST_FIELDS = {
+    "actions", "action_values", "cost_per_action_type", "purchase_roas",
+    "outbound_clicks", "outbound_clicks_ctr", "unique_outbound_clicks",
+    "video_30_sec_watched_actions", "video_avg_time_watched_actions",
+    "video_p25_watched_actions", "video_p50_watched_actions", "video_p75_watched_actions",
+    "video_p95_watched_actions", "video_p100_watched_actions", "video_play_actions",
+    "video_thruplay_watched_actions",
+}
+
+ACTION_TYPES = [
+    "link_click", "landing_page_view", "lead", "omni_purchase", "omni_add_to_cart",
+    "omni_initiated_checkout", "post_engagement", "post_reaction", "page_follow",
+    "video_view", "video_thruplay", "comment", "like",
+    "onsite_conversion.messaging_conversation_started_7d",
+    "onsite_conversion.messaging_first_reply", "offsite_conversion.fb_pixel_purchase",
+]
+
+# Object con lồng trong metadata (campaign{...}, adset{...}, creative{...})
+NESTED_OBJECT_FIELDS = {"campaign", "adset", "creative"}
+
+
+def constant_usage_curve(pct: float) -> Callable[[int], float]:
+    """Usage cố định, không phụ thuộc số request đã phục vụ."""
+    return lambda request_count: pct
+
+
+def linear_usage_curve(pct_per_request: float, start_pct: float = 0.0, max_pct: float = 100.0) -> Callable[[int], float]:
+    """Usage tăng tuyến tính theo số request đã phục vụ (mô phỏng quota bị tiêu dần)."""
+    return lambda request_count: min(max_pct, start_pct + pct_per_request * request_count)
+
+
+def _split_fields(fields_str: str) -> List[str]:
+    """Tách danh sách field theo dấu phẩy, bỏ qua dấu phẩy bên trong {} và ()."""
+    parts, depth, current = [], 0, []
+    for ch in fields_str:
+        if ch in "{(":
+            depth += 1
+        elif ch in "})":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+def _parse_nested_insights(field: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Phân tích field dạng insights.time_range({'since':..,'until':..}).time_increment(1){spend,...}
+
+    Returns:
+        (time_range, insight_fields)
+    """
+    inner_fields = []
+    modifiers = field
+    if field.endswith("}"):
+        # Khối {...} cuối cùng là danh sách insight field
+        depth = 0
+        for i in range(len(field) - 1, -1, -1):
+            if field[i] == "}":
+                depth += 1
+            elif field[i] == "{":
+                depth -= 1
+                if depth == 0:
+                    inner_fields = _split_fields(field[i + 1:-1])
+                    modifiers = field[:i]
+                    break
+
+    time_range = {}
+    marker = "time_range("
+    if marker in modifiers:
+        raw = modifiers[modifiers.index(marker) + len(marker):]
+        raw = raw[:raw.index(")")]
+        try:
+            time_range = json.loads(raw.replace("'", '"'))
+        except ValueError:
+            time_range = {}
+    return time_range, inner_fields
+
+
+class FakeFacebookBatchServer:
+    """
+    Server giả lập /batch.
+
+    Args:
+        rows_per_request: Tổng số dòng insights cho mỗi URL insights (trước khi phân trang)
+        page_size: Số dòng mỗi trang (mặc định lấy theo tham số `limit` của URL)
+        latency_sec: Độ trễ cố định cho mỗi lần gọi /batch
+        latency_jitter_sec: Độ trễ ngẫu nhiên thêm vào (0..jitter)
+        error_rate: Tỉ lệ sub-response lỗi rate limit (status 400, code 80000)
+        server_error_rate: Tỉ lệ sub-response lỗi 5xx
+        usage_curve: Hàm (request_count) -> app_usage_pct
+        account_usage_curve: Hàm (request_count) -> insights_usage_pct của account
+        nested_insights_limit: Số dòng insights lồng trong mỗi object trước khi phân trang
+        inactive_accounts: Các account (act_xxx) không có chi tiêu, luôn trả data rỗng
+        truncate_batches: Số response HTTP /batch đầu tiên bị ngắt kết nối giữa chừng
+            (mô phỏng body streaming bị đứt), chỉ áp dụng khi chạy HTTP
+        truncate_after_results: Số sub-response được gửi trọn trước khi ngắt
+        seed: Seed để dữ liệu sinh ra ổn định giữa các lần chạy
+    """
+
+    def __init__(
+        self,
+        rows_per_request: int = 50,
+        page_size: Optional[int] = None,
+        latency_sec: float = 0.0,
+        latency_jitter_sec: float = 0.0,
+        error_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        usage_curve: Optional[Callable[[int], float]] = None,
+        account_usage_curve: Optional[Callable[[int], float]] = None,
+        nested_insights_limit: int = 25,
+        inactive_accounts: Optional[List[str]] = None,
+        truncate_batches: int = 0,
+        truncate_after_results: int = 1,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.rows_per_request = rows_per_request
+        self.page_size = page_size
+        self.latency_sec = latency_sec
+        self.latency_jitter_sec = latency_jitter_sec
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.usage_curve = usage_curve or constant_usage_curve(0.0)
+        self.account_usage_curve = account_usage_curve or self.usage_curve
+        self.nested_insights_limit = nested_insights_limit
+        self.inactive_accounts = set(inactive_accounts or [])
+        self.truncate_batches = truncate_batches
+        self.truncate_after_results = truncate_after_results
+        self.seed = seed
+        self.host = host
+        self.port = port
+
+        self.batch_count = 0
+        self.request_count = 0
+        self.error_count = 0
+        self.received_urls: List[str] = []
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._httpd = None
+        self._thread = None
+
+    # ==================== HTTP ====================
+
+    @property
+    def batch_api_url(self) -> str:
+        if not self._httpd:
+            raise RuntimeError("Server chưa được start()")
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/batch"
+
+    def start(self) -> "FakeFacebookBatchServer":
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") == "/health":
+                    self._send(200, {"status": "ok"})
+                else:
+                    self._send(404, {"detail": "Not Found"})
+
+            def do_POST(self):
+                if urlparse(self.path).path.rstrip("/") != "/batch":
+                    self._send(404, {"detail": "Not Found"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(422, {"detail": "Invalid JSON body"})
+                    return
+                body = fake.handle_batch(payload)
+                if fake._take_truncation():
+                    self._send_truncated(body)
+                else:
+                    self._send(200, body)
+
+            def _send(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_truncated(self, body: Dict[str, Any]):
+                """Khai báo Content-Length đầy đủ nhưng chỉ gửi vài sub-response đầu rồi đóng kết nối."""
+                data = json.dumps(body).encode("utf-8")
+                kept = body["results"][:fake.truncate_after_results]
+                partial = ('{"status": "success", "results": [' + ", ".join(json.dumps(r) for r in kept) + ", ").encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(partial)
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _take_truncation(self) -> bool:
+        with self._lock:
+            if self.truncate_batches <= 0:
+                return False
+            self.truncate_batches -= 1
+            return True
+
+    # ==================== BATCH ====================
+
+    def handle_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Xử lý 1 request /batch và trả về body giống fb_batch_request_server."""
+        relative_urls = payload.get("relative_urls") or []
+
+        delay = self.latency_sec
+        if self.latency_jitter_sec:
+            delay += self._random.uniform(0, self.latency_jitter_sec)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.batch_count += 1
+            self.request_count += len(relative_urls)
+            self.received_urls.extend(relative_urls)
+            served = self.request_count
+            rolls = [self._random.random() for _ in relative_urls]
+
+        results = []
+        account_ids = []
+        for index, url in enumerate(relative_urls):
+            account_id = self._extract_account_id(url)
+            if account_id and account_id not in account_ids:
+                account_ids.append(account_id)
+
+            roll = rolls[index]
+            if roll < self.server_error_rate:
+                results.append(self._server_error(index))
+            elif roll < self.server_error_rate + self.error_rate:
+                results.append(self._rate_limit_error(index))
+            else:
+                results.append({"request_index": index, "status_code": 200, "data": self.build_response(url)})
+
+        error_count = sum(1 for r in results if r["status_code"] != 200)
+        with self._lock:
+            self.error_count += error_count
+
+        return {
+            "status": "success",
+            "results": results,
+            "summary": {
+                "total_requests": len(relative_urls),
+                "success_count": len(relative_urls) - error_count,
+                "error_count": error_count,
+                "rate_limits": {
+                    "app_usage_pct": round(self.usage_curve(served), 2),
+                    "account_details": [
+                        {
+                            "account_id": account_id,
+                            "insights_usage_pct": round(self.account_usage_curve(served), 2),
+                            "eta_seconds": 0,
+                            "business_use_cases": [],
+                        }
+                        for account_id in account_ids
+                    ],
+                },
+            },
+        }
+
+    @staticmethod
+    def _rate_limit_error(index: int) -> Dict[str, Any]:
+        return {
+            "request_index": index,
+            "status_code": 400,
+            "error": {
+                "message": "(#80000) There have been too many calls from this ad-account. Please wait a bit and try again.",
+                "type": "OAuthException",
+                "code": 80000,
+                "error_subcode": 2446079,
+            },
+        }
+
+    @staticmethod
+    def _server_error(index: int) -> Dict[str, Any]:
+        return {
+            "request_index": index,
+            "status_code": 500,
+            "error": {
+                "message": "An unexpected error has occurred. Please retry your request later.",
+                "type": "OAuthException",
+                "code": 2,
+                "is_transient": True,
+            },
+        }
+
+    @staticmethod
+    def _extract_account_id(url: str) -> Optional[str]:
+        first = url.lstrip("/").split("?")[0].split("/")[0]
+        return first[len("act_"):] if first.startswith("act_") else None
+
+    # ==================== RESPONSE BUILDERS ====================
+
+    def build_response(self, relative_url: str) -> Dict[str, Any]:
+        """Sinh body Graph API cho 1 relative URL."""
+        parsed = urlparse(relative_url.lstrip("/"))
+        path_parts = [p for p in parsed.path.split("/") if p]
+        params = {k: v[0] for k, v in parse_qs(parsed.query, keep_blank_values=True).items()}
+
+        if len(path_parts) >= 2 and path_parts[-1] == "insights":
+            return self._build_insights_page(parsed.path, params, path_parts[0])
+        if len(path_parts) >= 2:
+            return self._build_object_list_page(parsed.path, params, path_parts[0], path_parts[-1].rstrip("s"))
+        return self._build_object(path_parts[0] if path_parts else "0", _split_fields(params.get("fields", "id,name")))
+
+    def _rng(self, *parts: Any) -> random.Random:
+        key = "|".join(str(p) for p in (self.seed,) + parts)
+        return random.Random(zlib.crc32(key.encode("utf-8")))
+
+    @staticmethod
+    def _date_range(params: Dict[str, str]) -> List[Tuple[str, str]]:
+        if params.get("time_ranges"):
+            # time_ranges: mỗi range là 1 dòng (không chia theo ngày)
+            return [(r["since"], r["until"]) for r in json.loads(params["time_ranges"])]
+        try:
+            time_range = json.loads(params.get("time_range") or "{}")
+        except ValueError:
+            time_range = {}
+        return FakeFacebookBatchServer._expand_days(time_range, params.get("time_increment"))
+
+    @staticmethod
+    def _expand_days(time_range: Dict[str, str], time_increment: Any) -> List[Tuple[str, str]]:
+        since = time_range.get("since") or datetime.now().strftime("%Y-%m-%d")
+        until = time_range.get("until") or since
+        if str(time_increment) != "1":
+            return [(since, until)]
+        start = datetime.strptime(since, "%Y-%m-%d")
+        end = datetime.strptime(until, "%Y-%m-%d")
+        days = []
+        while start <= end:
+            day = start.strftime("%Y-%m-%d")
+            days.append((day, day))
+            start += timedelta(days=1)
+        return days
+
+    def _paginate(self, path: str, params: Dict[str, str], total: int, default_limit: int) -> Tuple[int, int, Dict[str, Any]]:
+        """Tính offset/limit từ cursor `after` và sinh object paging giống Graph API."""
+        limit = self.page_size or int(params.get("limit") or default_limit)
+        offset = int(params.get("after") or 0)
+        end = min(total, offset + limit)
+
+        # Giống Graph API: trang rỗng không có paging
+        if offset >= total:
+            return offset, offset, {}
+
+        paging = {"cursors": {"before": str(offset), "after": str(end)}}
+        if end < total:
+            next_params = dict(params)
+            next_params["after"] = str(end)
+            paging["next"] = f"{GRAPH_BASE_URL}/{path.strip('/')}?{urlencode(next_params, safe='{}(),')}"
+        return offset, end, paging
+
+    def _build_insight_row(self, fields: List[str], rng: random.Random, object_id: str, level: str,
+                           account_id: str, date_start: str, date_stop: str) -> Dict[str, Any]:
+        spend = round(rng.uniform(1, 500), 2)
+        impressions = rng.randint(100, 50000)
+        clicks = rng.randint(0, impressions // 10)
+        row = {
+            "account_id": account_id,
+            "date_start": date_start,
+            "date_stop": date_stop,
+        }
+        if level and level != "account":
+            row[f"{level}_id"] = object_id
+            row[f"{level}_name"] = f"{level.capitalize()} {object_id}"
+
+        for field in fields:
+            if field in row:
+                continue
+            if field in ACTION_LIST_FIELDS:
+                row[field] = [
+                    {"action_type": action_type, "value": str(round(rng.uniform(1, 200), 2))}
+                    for action_type in rng.sample(ACTION_TYPES, rng.randint(2, 6))
+                ]
+            elif field == "spend":
+                row[field] = str(spend)
+            elif field == "impressions":
+                row[field] = str(impressions)
+            elif field in ("clicks", "inline_link_clicks", "unique_inline_link_clicks"):
+                row[field] = str(clicks)
+            elif field == "reach":
+                row[field] = str(int(impressions * rng.uniform(0.5, 0.9)))
+            elif field.endswith("_id"):
+                row[field] = f"{zlib.crc32(f'{object_id}|{field}'.encode('utf-8')):d}"
+            elif field.endswith("_name") or field in ("objective", "buying_type", "optimization_goal"):
+                row[field] = f"{field} {object_id}"
+            else:
+                row[field] = str(round(rng.uniform(0, 100), 4))
+        return row
+
+    def _build_insights_page(self, path: str, params: Dict[str, str], node_id: str) -> Dict[str, Any]:
+        """Flat insights: {act_id|object_id}/insights?level=...&time_range=...&fields=..."""
+        fields = _split_fields(params.get("fields", "spend"))
+        level = params.get("level") or "account"
+        days = self._date_range(params)
+        account_id = node_id[len("act_"):] if node_id.startswith("act_") else str(1000 + zlib.crc32(node_id.encode()) % 9000)
+
+        if node_id in self.inactive_accounts:
+            total = 0
+        elif params.get("time_ranges"):
+            total = len(days)
+        elif node_id.startswith("act_"):
+            total = self.rows_per_request
+        else:
+            total = min(self.rows_per_request, len(days))
+        offset, end, paging = self._paginate(path, params, total, 25)
+
+        data = []
+        for i in range(offset, end):
+            date_start, date_stop = days[i % len(days)]
+            if node_id.startswith("act_"):
+                object_id = f"{zlib.crc32(f'{node_id}|{i // len(days)}'.encode('utf-8')):d}"
+            else:
+                object_id = node_id
+            rng = self._rng(path, object_id, date_start)
+            data.append(self._build_insight_row(fields, rng, object_id, level, account_id, date_start, date_stop))
+        return {"data": data, "paging": paging}
+
+    def _build_object_list_page(self, path: str, params: Dict[str, str], node_id: str, level: str) -> Dict[str, Any]:
+        """Nested: {act_id}/{level}s?fields=id,name,...,insights.time_range(...){...}"""
+        fields = _split_fields(params.get("fields", "id,name"))
+        insights_field = next((f for f in fields if f.startswith("insights")), None)
+        object_fields = [f for f in fields if not f.startswith("insights")]
+
+        days, insight_fields = [(None, None)], []
+        if insights_field:
+            time_range, insight_fields = _parse_nested_insights(insights_field)
+            increment = "1" if ".time_increment(1)" in insights_field else "all_days"
+            days = self._expand_days(time_range, increment)
+
+        # Tổng số dòng insights xấp xỉ rows_per_request: mỗi object có len(days) dòng
+        total_objects = 0 if node_id in self.inactive_accounts else max(1, self.rows_per_request // len(days))
+        offset, end, paging = self._paginate(path, params, total_objects, 25)
+        account_id = node_id[len("act_"):] if node_id.startswith("act_") else node_id
+
+        data = []
+        for i in range(offset, end):
+            object_id = f"{zlib.crc32(f'{node_id}|{level}|{i}'.encode('utf-8')):d}"
+            item = self._build_object(object_id, object_fields)
+            if insights_field:
+                insight_rows = [
+                    self._build_insight_row(insight_fields, self._rng(object_id, d[0]), object_id, level, account_id, d[0], d[1])
+                    for d in days[:self.nested_insights_limit]
+                ]
+                insights = {"data": insight_rows}
+                if len(days) > self.nested_insights_limit:
+                    # Trang insights tiếp theo: {object_id}/insights?after=...
+                    next_params = {
+                        "fields": ",".join(insight_fields),
+                        "time_range": json.dumps({"since": days[0][0], "until": days[-1][1]}),
+                        "time_increment": 1,
+                        "limit": self.nested_insights_limit,
+                        "after": str(self.nested_insights_limit),
+                    }
+                    insights["paging"] = {
+                        "cursors": {"after": str(self.nested_insights_limit)},
+                        "next": f"{GRAPH_BASE_URL}/{object_id}/insights?{urlencode(next_params)}",
+                    }
+                item["insights"] = insights
+            data.append(item)
+        return {"data": data, "paging": paging}
+
+    def _build_object(self, object_id: str, fields: List[str]) -> Dict[str, Any]:
+        """Metadata 1 object: {object_id}?fields=id,name,campaign{...},creative{...}"""
+        rng = self._rng("object", object_id)
+        obj = {"id": object_id, "name": f"Object {object_id}"}
+        for field in fields:
+            name = field.split("{")[0].split(".")[0]
+            if name in obj:
+                continue
+            if name in NESTED_OBJECT_FIELDS:
+                child_id = f"{zlib.crc32(f'{object_id}|{name}'.encode('utf-8')):d}"
+                child = {"id": child_id, "name": f"{name.capitalize()} {child_id}"}
+                if "{" in field:
+                    for sub in _split_fields(field[field.index("{") + 1:field.rindex("}")]):
+                        sub_name = sub.split("{")[0]
+                        child.setdefault(sub_name, f"{sub_name} {child_id}")
+                obj[name] = child
+            elif name in ("daily_budget", "lifetime_budget"):
+                obj[name] = str(rng.randint(100, 10000) * 1000)
+            elif name in ("status", "effective_status"):
+                obj[name] = "ACTIVE"
+            elif name.endswith("_time"):
+                obj[name] = "2025-01-01T00:00:00+0700"
+            else:
+                obj[name] = f"{name} {object_id}"
+        return obj
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake facebook_batch_server cho benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--rows", type=int, default=50, help="Số dòng insights mỗi URL")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--usage-per-request", type=float, default=0.0, help="Usage %% tăng thêm mỗi request")
+    args = parser.parse_args()
+
+    server = FakeFacebookBatchServer(
+        rows_per_request=args.rows,
+        latency_sec=args.latency,
+        error_rate=args.error_rate,
+        server_error_rate=args.server_error_rate,
+        usage_curve=linear_usage_curve(args.usage_per_request),
+        host=args.host,
+        port=args.port,
+    ).start()
+    print(f"Fake batch server đang chạy tại {server.batch_api_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from tests.fakes.fb_batch_server import FakeFacebookBatchServer
+from services.facebook.daily_processor import FacebookDailyReporter
+
+ACCOUNTS = [{"id": "act_1", "name": "Active"}, {"id": "act_2", "name": "Empty"}]
+CHUNKS = [
+    {"start": "2025-01-01", "end": "2025-01-31"},
+    {"start": "2025-02-01", "end": "2025-02-28"},
+]
+
+
+class TestAccountPreflight(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeFacebookBatchServer(inactive_accounts=["act_2"])
+        self.reporter = FacebookDailyReporter(access_token="test")
+        self.reporter.DEFAULT_SLEEP_TIME = 0
+
+    def _send(self, relative_urls):
+        self.reporter.request_count += len(relative_urls)
+        return self.server.handle_batch({"relative_urls": relative_urls})
+
+    def test_drops_zero_spend_accounts(self):
+        """Account không có chi tiêu bị bỏ, chỉ tốn 1 request pre-flight mỗi account"""
+        with patch.object(self.reporter, "_send_batch_request", side_effect=self._send):
+            active_chunks = self.reporter._preflight_active_chunks(ACCOUNTS, CHUNKS)
+
+        self.assertEqual(active_chunks, {"act_1": CHUNKS, "act_2": []})
+        self.assertEqual(self.server.request_count, 2)
+
+        template_config = self.reporter.get_facebook_template_config_by_name("Ad Daily Report")
+        requests = self.reporter._prepare_initial_requests(
+            ACCOUNTS, CHUNKS, "ad", template_config, ["spend"], active_chunks
+        )
+        self.assertEqual(len(requests), 2)
+        self.assertTrue(all(r["metadata"]["account"]["id"] == "act_1" for r in requests))
+
+    def test_keeps_chunks_when_preflight_errors(self):
+        """Lỗi 5xx ở pre-flight -> giữ nguyên chunks để không mất dữ liệu"""
+        self.server.server_error_rate = 1.0
+        with patch.object(self.reporter, "_send_batch_request", side_effect=self._send):
+            active_chunks = self.reporter._preflight_active_chunks(ACCOUNTS, CHUNKS)
+
+        self.assertEqual(active_chunks, {"act_1": CHUNKS, "act_2": CHUNKS})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import threading
+import time
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.rate_limiter.adaptive_concurrency import AIMDConcurrencyLimiter
+
+
+class TestAIMDConcurrencyLimiter(unittest.TestCase):
+    def test_additive_increase_on_success(self):
+        """Mỗi vòng request thành công tăng limit ~1, không vượt max_limit"""
+        limiter = AIMDConcurrencyLimiter(initial_limit=2, max_limit=4)
+
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+
+        self.assertGreater(limiter.limit, 3)
+        for _ in range(50):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_overload_halves_limit_and_pauses_all_threads(self):
+        """Quá tải -> limit giảm một nửa (1 lần cho cả loạt lỗi) và endpoint tạm dừng"""
+        limiter = AIMDConcurrencyLimiter(initial_limit=8, max_limit=8)
+        for _ in range(3):
+            limiter.acquire()
+        for _ in range(3):
+            limiter.release(overloaded=True, pause_sec=0.2)
+
+        self.assertEqual(limiter.limit, 4)
+
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_latency_degradation_decreases_limit(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=4, max_limit=8)
+        limiter.acquire()
+        limiter.release(latency=0.1)
+        before = limiter.limit
+
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(latency=1.0)
+
+        self.assertLess(limiter.limit, before)
+
+    def test_in_flight_never_exceeds_limit(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=2, max_limit=2)
+        lock = threading.Lock()
+        state = {"in_flight": 0, "max": 0}
+
+        def work():
+            limiter.acquire()
+            with lock:
+                state["in_flight"] += 1
+                state["max"] = max(state["max"], state["in_flight"])
+            time.sleep(0.01)
+            with lock:
+                state["in_flight"] -= 1
+            limiter.release(latency=0.01)
+
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(state["max"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+import json
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.async_gmv_reporter import AsyncGMVReporter, httpx
+from services.gmv.campaign_product_detail import GMVCampaignProductDetailReporter, AsyncGMVCampaignProductDetailReporter
+from services.exceptions import TaskCancelledException
+
+TOTAL_PAGES = 5
+
+
+@unittest.skipIf(httpx is None, "httpx chưa được cài")
+class TestAsyncGMVReporter(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+
+        async def handler(request):
+            page = int(request.url.params["page"])
+            self.requests.append(page)
+            # Trang sau về trước trang trước
+            await asyncio.sleep(0.01 * (TOTAL_PAGES - page))
+            return httpx.Response(200, json={
+                "code": 0, "data": {"list": [f"row-{page}"], "page_info": {"total_page": TOTAL_PAGES}}
+            })
+
+        self.transport = httpx.MockTransport(handler)
+
+    def make_reporter(self, advertiser_id="adv", redis_client=None, job_id=None):
+        reporter = AsyncGMVReporter("token", advertiser_id, "store", redis_client=redis_client, job_id=job_id)
+        reporter._client = httpx.AsyncClient(transport=self.transport)
+        return reporter
+
+    def test_pages_fetched_concurrently_for_several_advertisers(self):
+        async def run():
+            reporters = [self.make_reporter(f"adv{i}") for i in range(3)]
+            try:
+                return await asyncio.gather(*(
+                    r._fetch_all_pages_async(r.PERFORMANCE_API_URL, {"advertiser_id": r.advertiser_id})
+                    for r in reporters
+                ))
+            finally:
+                for r in reporters:
+                    await r.aclose()
+
+        results = asyncio.run(run())
+        for rows in results:
+            self.assertEqual(rows, [f"row-{p}" for p in range(1, TOTAL_PAGES + 1)])
+        self.assertEqual(len(self.requests), 3 * TOTAL_PAGES)
+
+    def test_cancellation_checked_before_request(self):
+        redis_client = MagicMock()
+        redis_client.exists.return_value = True
+
+        async def run():
+            reporter = self.make_reporter(redis_client=redis_client, job_id="job_1")
+            try:
+                await reporter._make_api_request_with_backoff_async(reporter.PERFORMANCE_API_URL, {"page": 1})
+            finally:
+                await reporter._client.aclose()
+
+        with self.assertRaises(TaskCancelledException):
+            asyncio.run(run())
+        self.assertEqual(self.requests, [])
+
+    def test_invalid_json_retried_and_counters_flushed_off_loop(self):
+        responses = iter([httpx.Response(200, content=b"<html>502</html>")])
+
+        async def handler(request):
+            return next(responses, None) or httpx.Response(200, json={"code": 0, "data": {}})
+
+        self.transport = httpx.MockTransport(handler)
+        redis_client = MagicMock()
+        redis_client.exists.return_value = False
+        flush_threads = []
+
+        async def run():
+            reporter = self.make_reporter(redis_client=redis_client, job_id="job_1")
+            reporter.check_rate_limit_async = AsyncMock()
+            reporter.api_call_counter.flush_interval = 0
+            reporter.api_call_counter.flush = lambda: flush_threads.append(threading.current_thread())
+            try:
+                return await reporter._make_api_request_with_backoff_async(reporter.PERFORMANCE_API_URL, {"page": 1})
+            finally:
+                await reporter._client.aclose()
+
+        with patch("services.gmv.async_gmv_reporter.random.uniform", return_value=0), \
+             patch("services.gmv.async_gmv_reporter.asyncio.sleep", AsyncMock()):
+            data = asyncio.run(run())
+
+        self.assertEqual(data["code"], 0)
+        self.assertEqual(len(flush_threads), 2)
+        self.assertTrue(all(t is not threading.main_thread() for t in flush_threads))
+
+    def test_async_product_reporter_matches_sync(self):
+        """Bản async của product report trả về cùng kết quả với bản đồng bộ"""
+        def respond(params):
+            dimensions = json.loads(params["dimensions"])
+            page = int(params["page"])
+            if dimensions == ["campaign_id"]:
+                rows = [{"dimensions": {"campaign_id": f"c{i}"}, "metrics": {"campaign_name": f"C{i}"}} for i in range(25)]
+                return {"code": 0, "data": {"list": rows, "page_info": {"total_page": 1}}}
+            campaign_ids = json.loads(params["filtering"])["campaign_ids"]
+            rows = [
+                {"dimensions": {"campaign_id": cid, "item_group_id": "p1", "stat_time_day": f"{params['start_date']} 00:00:00"},
+                 "metrics": {"cost": str(page)}}
+                for cid in campaign_ids
+            ]
+            return {"code": 0, "data": {"list": rows, "page_info": {"total_page": 2}}}
+
+        self.transport = httpx.MockTransport(lambda request: httpx.Response(200, json=respond(dict(request.url.params))))
+        chunks = [{"start": "2025-09-01", "end": "2025-09-07"}, {"start": "2025-09-08", "end": "2025-09-14"}]
+        product_map = {"p1": {"item_group_id": "p1", "title": "P1"}}
+
+        sync_reporter = GMVCampaignProductDetailReporter("token", "adv", "store")
+        sync_reporter._make_api_request_with_backoff = lambda url, params: respond(
+            {k: str(v) for k, v in params.items()}
+        )
+        sync_reporter._get_product_map = MagicMock(return_value=product_map)
+
+        async_reporter = AsyncGMVCampaignProductDetailReporter("token", "adv", "store")
+        async_reporter._client = httpx.AsyncClient(transport=self.transport)
+        async_reporter._get_product_map = MagicMock(return_value=product_map)
+
+        expected = sync_reporter.get_data(chunks)
+        self.assertEqual(len(expected), 2 * 25 * 2)
+        self.assertEqual(async_reporter.get_data(chunks), expected)
+        self.assertIsNone(async_reporter._client)
+
+
+if __name__ == '__main__':
+    unittest.main()
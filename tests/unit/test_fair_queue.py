@@ -0,0 +1,127 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.rate_limiter.fair_queue import FairRateLimiter
+from services.rate_limiter.rate_limiter import RedisRateLimiter
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis cần lupa để chạy script Lua)
+except ImportError:
+    fakeredis = None
+
+
+def make_fair_limiter(positions, acquire_waits):
+    """FairRateLimiter với các script Lua được mock theo thứ tự enqueue, position, dequeue"""
+    redis_client = MagicMock()
+    enqueue, position, dequeue = MagicMock(return_value="000000000001:job_1"), MagicMock(), MagicMock()
+    position.side_effect = positions
+    redis_client.register_script.side_effect = [enqueue, position, dequeue]
+
+    limiter = MagicMock(spec=["rules", "name", "acquire"])
+    limiter.rules = [(2, 1), (45, 60)]
+    limiter.name = "gmv"
+    limiter.acquire.side_effect = acquire_waits
+
+    fair = FairRateLimiter(redis_client, limiter)
+    fair.WAIT_JITTER_SEC = 0
+    return fair, redis_client, enqueue, dequeue
+
+
+class TestFairRateLimiter(unittest.TestCase):
+    @patch("services.rate_limiter.fair_queue.time.sleep")
+    def test_only_head_of_queue_acquires(self, mock_sleep):
+        """Ticket chưa đến lượt ngủ theo vị trí, chỉ thử acquire khi đứng đầu hàng"""
+        fair, _, enqueue, dequeue = make_fair_limiter(positions=[2, 0], acquire_waits=[0.0])
+
+        self.assertTrue(fair.wait_for_slot("ratelimit:adv:url", job_id="job_1", weight=2.0))
+
+        mock_sleep.assert_called_once_with(1.0)  # 2 ticket phía trước x 0.5s
+        fair.limiter.acquire.assert_called_once_with("ratelimit:adv:url")
+        self.assertEqual(enqueue.call_args.kwargs["args"][:2], ["job_1", 0.5])
+        self.assertEqual(enqueue.call_args.kwargs["keys"][0], "ratelimit:adv:url:gmv:fq:queue")
+        dequeue.assert_called_once()
+
+    @patch("services.rate_limiter.fair_queue.time.sleep")
+    def test_timeout_leaves_queue(self, mock_sleep):
+        """Hết timeout -> rời hàng để không chặn job khác"""
+        fair, redis_client, _, dequeue = make_fair_limiter(positions=[0], acquire_waits=[30.0])
+
+        self.assertFalse(fair.wait_for_slot("ratelimit:adv:url", timeout=1, job_id="job_1"))
+
+        mock_sleep.assert_not_called()
+        dequeue.assert_not_called()
+        redis_client.zrem.assert_any_call("ratelimit:adv:url:gmv:fq:queue", "000000000001:job_1")
+
+    @patch("services.rate_limiter.fair_queue.asyncio.sleep", new_callable=AsyncMock)
+    def test_async_wait_follows_same_queue(self, mock_sleep):
+        """Bản asyncio xếp hàng giống bản đồng bộ, ngủ bằng asyncio.sleep"""
+        fair, _, _, dequeue = make_fair_limiter(positions=[2, 0], acquire_waits=[0.0])
+
+        self.assertTrue(asyncio.run(fair.wait_for_slot_async("ratelimit:adv:url", job_id="job_1")))
+
+        mock_sleep.assert_awaited_once_with(1.0)
+        dequeue.assert_called_once()
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis[lua] chưa được cài")
+class TestFairQueueScripts(unittest.TestCase):
+    """Chạy các script ticket queue thật trên fakeredis"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        limiter = RedisRateLimiter(self.redis, rules=[(100, 1)], name="gmv")
+        self.fair = FairRateLimiter(self.redis, limiter)
+        self.keys = self.fair._queue_keys("ratelimit:adv:url")
+
+    def queue_jobs(self):
+        return [ticket.split(":", 1)[1] for ticket in self.redis.zrange(self.keys[0], 0, -1)]
+
+    def test_jobs_interleaved_by_weight(self):
+        for _ in range(3):
+            self.fair._enqueue(self.keys, "big", 1.0)
+        for _ in range(3):
+            self.fair._enqueue(self.keys, "small", 1.0)
+        self.assertEqual(self.queue_jobs(), ["big", "small", "big", "small", "big", "small"])
+
+        # Trọng số 2 -> được 2 slot cho mỗi slot của job trọng số 1
+        self.redis.flushall()
+        for _ in range(4):
+            self.fair._enqueue(self.keys, "heavy", 2.0)
+        for _ in range(2):
+            self.fair._enqueue(self.keys, "light", 1.0)
+        self.assertEqual(self.queue_jobs(), ["heavy", "heavy", "light", "heavy", "heavy", "light"])
+
+    def test_head_takes_slot_and_advances_virtual_clock(self):
+        tickets = [self.fair._enqueue(self.keys, "job_a", 1.0) for _ in range(3)]
+        self.assertEqual(self.fair._position(self.keys, tickets[1]), 1)
+
+        # Ticket thứ 2 chưa đến lượt: chờ theo vị trí, không chiếm slot
+        ticket, wait = self.fair._take_turn("ratelimit:adv:url", self.keys, tickets[1], "job_a", 1.0)
+        self.assertEqual((ticket, wait), (tickets[1], self.fair.min_interval))
+
+        self.assertEqual(self.fair._take_turn("ratelimit:adv:url", self.keys, tickets[0], "job_a", 1.0), (None, 0.0))
+        self.assertEqual(self.fair._position(self.keys, tickets[1]), 0)
+        self.assertEqual(float(self.redis.get(self.keys[3])), 1.0)
+
+        # Job đến sau không được "bù" phần đã qua: xếp sau ticket kế tiếp của job_a
+        self.fair._enqueue(self.keys, "job_b", 1.0)
+        self.assertEqual(self.queue_jobs(), ["job_a", "job_b", "job_a"])
+
+    def test_stale_ticket_removed(self):
+        dead = self.fair._enqueue(self.keys, "dead", 1.0)
+        alive = self.fair._enqueue(self.keys, "alive", 1.0)
+        self.redis.zadd(self.keys[1], {dead: 0})  # Heartbeat rất cũ
+
+        self.assertEqual(self.fair._position(self.keys, alive), 0)
+        self.assertEqual(self.fair._position(self.keys, dead), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import json
+import sys
+import os
+import urllib.request
+from urllib.parse import urlencode
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from tests.fakes.fb_batch_server import FakeFacebookBatchServer, linear_usage_curve
+from services.facebook.base_processor import FacebookAdsBaseReporter
+
+
+def insights_url(account_id="act_1", since="2025-01-01", until="2025-01-10", limit=4):
+    params = {
+        "level": "campaign",
+        "time_range": json.dumps({"since": since, "until": until}),
+        "time_increment": 1,
+        "fields": "campaign_id,spend,actions",
+        "limit": limit,
+    }
+    return f"{account_id}/insights?{urlencode(params)}"
+
+
+class TestFakeBatchServer(unittest.TestCase):
+    def test_insights_paging_cursors(self):
+        """Phân trang theo cursor `after` cho đến khi hết rows_per_request"""
+        server = FakeFacebookBatchServer(rows_per_request=10)
+        url, rows = insights_url(), []
+
+        while url:
+            body = server.handle_batch({"relative_urls": [url]})["results"][0]["data"]
+            rows.extend(body["data"])
+            next_url = body.get("paging", {}).get("next")
+            url = FacebookAdsBaseReporter._get_relative_url(next_url) if next_url else None
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]["date_start"], "2025-01-01")
+        self.assertIsInstance(rows[0]["actions"], list)
+
+    def test_error_rates_and_usage_summary(self):
+        """Lỗi 5xx theo tỉ lệ cấu hình, usage tăng theo số request đã phục vụ"""
+        server = FakeFacebookBatchServer(server_error_rate=1.0, usage_curve=linear_usage_curve(10))
+        response = server.handle_batch({"relative_urls": [insights_url(), insights_url("act_2")]})
+
+        self.assertEqual([r["request_index"] for r in response["results"]], [0, 1])
+        self.assertTrue(all(r["status_code"] == 500 for r in response["results"]))
+        rate_limits = response["summary"]["rate_limits"]
+        self.assertEqual(rate_limits["app_usage_pct"], 20)
+        self.assertEqual([a["account_id"] for a in rate_limits["account_details"]], ["1", "2"])
+
+    def test_http_batch_endpoint(self):
+        """Server HTTP local nhận đúng payload của reporter"""
+        with FakeFacebookBatchServer(rows_per_request=3) as server:
+            payload = json.dumps({"access_token": "x", "relative_urls": [insights_url()]}).encode("utf-8")
+            request = urllib.request.Request(
+                server.batch_api_url, data=payload, headers={"Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                body = json.loads(response.read())
+
+        self.assertEqual(body["results"][0]["status_code"], 200)
+        self.assertEqual(len(body["results"][0]["data"]["data"]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+import json
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from tests.fakes.fb_batch_server import FakeFacebookBatchServer
+from services.facebook.base_processor import ijson
+from services.facebook.daily_processor2 import FacebookDailyReporterV2
+
+ACCOUNTS = [{"id": f"act_{i}", "name": f"Account {i}"} for i in range(1, 4)]
+FIELDS = ["date_start", "campaign_id", "campaign_name", "spend", "impressions", "reach", "clicks"]
+BATCH_SIZE = 4
+
+
+def run_report(stream, **server_kwargs):
+    """Chạy FacebookDailyReporterV2 với fake server HTTP, trả về (rows đã sắp xếp, URL server nhận theo thứ tự)"""
+    # Trang lớn hơn buffer đọc của ijson để body bị ngắt vẫn có vài sub-response parse xong
+    with FakeFacebookBatchServer(rows_per_request=600, page_size=300, seed=7, **server_kwargs) as server:
+        reporter = FacebookDailyReporterV2(
+            access_token="x", batch_api_url=server.batch_api_url, stream_responses=stream
+        )
+        reporter.DEFAULT_BATCH_SIZE = BATCH_SIZE
+        reporter.ACCOUNT_PREFLIGHT = False
+        with patch("time.sleep"):
+            rows = reporter.get_report(ACCOUNTS, "2025-01-01", "2025-02-28", "Campaign Overview Report", FIELDS)
+        return sorted(json.dumps(row, sort_keys=True) for row in rows), list(server.received_urls)
+
+
+@unittest.skipIf(ijson is None, "ijson chưa được cài")
+class TestStreamingBatches(unittest.TestCase):
+    def test_streaming_matches_buffered_with_errors(self):
+        """Có lỗi 5xx: streaming ra cùng rows và cùng số request như chế độ đọc cả body"""
+        buffered_rows, buffered_urls = run_report(False, server_error_rate=0.2)
+        streamed_rows, streamed_urls = run_report(True, server_error_rate=0.2)
+
+        self.assertTrue(buffered_rows)
+        self.assertEqual(streamed_rows, buffered_rows)
+        self.assertEqual(len(streamed_urls), len(buffered_urls))
+
+    def test_broken_stream_resends_only_pending_requests(self):
+        """Body bị ngắt giữa chừng: chỉ gửi lại các request chưa xử lý, request_index được ánh xạ lại đúng"""
+        buffered_rows, buffered_urls = run_report(False)
+        streamed_rows, urls = run_report(True, truncate_batches=1, truncate_after_results=3)
+
+        self.assertEqual(streamed_rows, buffered_rows)
+
+        truncated_batch = urls[:BATCH_SIZE]
+        resent = [url for url in urls[BATCH_SIZE:2 * BATCH_SIZE] if url in truncated_batch]
+        self.assertTrue(0 < len(resent) < BATCH_SIZE)
+        self.assertEqual(resent, truncated_batch[BATCH_SIZE - len(resent):])
+        self.assertEqual(len(urls), len(buffered_urls) + len(resent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import json
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.gmv_reporter import GMVReporter
+
+
+class TestBusinessCenterCache(unittest.TestCase):
+    def setUp(self):
+        self.store = {}
+        self.redis = MagicMock()
+        self.redis.get.side_effect = self.store.get
+        self.redis.set.side_effect = lambda key, value, ex=None: self.store.__setitem__(key, value)
+
+        self.reporter = GMVReporter("secret-token", "adv", "store")
+        self.reporter.redis_client = self.redis
+        self.reporter._make_api_request_with_backoff = MagicMock(return_value={
+            "code": 0,
+            "data": {"list": [{"bc_info": {"bc_id": bc}} for bc in ("bc1", "bc2", "bc3")]}
+        })
+        self.fetched = []
+        self.catalog = {"bc2": [{"item_group_id": "p1"}]}
+        self.failing = set()
+
+        def fetch_products(bc_id):
+            self.fetched.append(bc_id)
+            return None if bc_id in self.failing else self.catalog.get(bc_id, [])
+        self.reporter._fetch_all_tiktok_products = fetch_products
+
+    def test_bc_ids_and_owner_cached_per_token(self):
+        first, complete = self.reporter._get_product_catalog()
+        self.assertTrue(complete)
+        self.assertEqual(first, [{"item_group_id": "p1"}])
+        self.assertEqual(sorted(self.fetched), ["bc1", "bc2", "bc3"])
+        self.assertTrue(all("secret-token" not in key for key in self.store))
+
+        # Lần sau: không gọi BC API, chỉ lấy sản phẩm từ BC sở hữu store
+        self.fetched.clear()
+        second, _ = self.reporter._get_product_catalog()
+        self.assertEqual(second, first)
+        self.assertEqual(self.fetched, ["bc2"])
+        self.assertEqual(self.reporter._get_bc_ids(), ["bc1", "bc2", "bc3"])
+        self.reporter._make_api_request_with_backoff.assert_called_once()
+
+    def test_failed_bc_not_treated_as_empty(self):
+        # bc3 lỗi tạm thời: không ghi nhớ BC sở hữu, catalog không đầy đủ
+        self.failing = {"bc3"}
+        products, complete = self.reporter._get_product_catalog()
+        self.assertEqual(products, [{"item_group_id": "p1"}])
+        self.assertFalse(complete)
+        self.assertNotIn(self.reporter._store_bc_cache_key(), self.store)
+
+        # Lần sau bc3 ổn và sở hữu p2: quét lại tất cả BC, ghi nhớ cả bc2 và bc3
+        self.failing = set()
+        self.catalog["bc3"] = [{"item_group_id": "p2"}]
+        products, complete = self.reporter._get_product_catalog()
+        self.assertTrue(complete)
+        self.assertEqual(len(products), 2)
+        self.assertEqual(json.loads(self.store[self.reporter._store_bc_cache_key()]), ["bc2", "bc3"])
+
+    def test_missing_required_id_falls_back_to_all_bcs(self):
+        self.reporter._get_product_catalog()
+        # Sản phẩm mới p2 nằm ở BC khác BC đã ghi nhớ
+        self.catalog["bc1"] = [{"item_group_id": "p2"}]
+        self.fetched.clear()
+
+        products, complete = self.reporter._get_product_catalog({"p2"})
+        self.assertTrue(complete)
+        self.assertEqual(self.fetched[0], "bc2")
+        self.assertEqual(sorted(self.fetched[1:]), ["bc1", "bc2", "bc3"])
+        self.assertIn({"item_group_id": "p2"}, products)
+
+    def test_missing_page_marks_bc_failed(self):
+        reporter = GMVReporter("secret-token", "adv", "store")
+
+        def request(url, params):
+            if params["page"] == 2:
+                return None
+            return {"code": 0, "data": {"list": [{"item_group_id": f"p{params['page']}"}], "page_info": {"total_page": 3}}}
+        reporter._make_api_request_with_backoff = request
+
+        self.assertIsNone(reporter._fetch_all_tiktok_products("bc1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
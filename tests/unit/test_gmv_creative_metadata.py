@@ -0,0 +1,72 @@
+import unittest
+import json
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.campaign_creative_detail import GMVCampaignCreativeDetailReporter
+
+
+class TestGroupedCreativeMetadata(unittest.TestCase):
+    def setUp(self):
+        self.reporter = GMVCampaignCreativeDetailReporter("token", "adv", "store")
+        self.calls = []
+
+    def fake_fetch_all_pages(self, url, params):
+        """API trả về tích chéo campaign × item_group, mỗi cặp có 1 video"""
+        self.calls.append(params)
+        filtering = json.loads(params["filtering"])
+        return [
+            {
+                "dimensions": {"campaign_id": cid, "item_group_id": igid, "item_id": f"v-{cid}-{igid}"},
+                "metrics": {"title": f"{cid}/{igid}"}
+            }
+            for cid in filtering["campaign_ids"] for igid in filtering["item_group_ids"]
+        ]
+
+    def test_metadata_grouped_and_routed_back(self):
+        self.reporter._fetch_all_pages = self.fake_fetch_all_pages
+        performance_results = [
+            {
+                "campaign_id": f"c{c}", "start_date": "2025-01-01", "end_date": "2025-01-31",
+                "performance_data": [
+                    {
+                        "dimensions": {"campaign_id": f"c{c}", "item_group_id": f"p{p}"},
+                        "creative_details": [{"item_id": f"v-c{c}-p{p}"}, {"item_id": "unknown"}]
+                    }
+                    for p in range(10)
+                ]
+            }
+            for c in range(5)
+        ]
+
+        self.reporter._enrich_with_creative_metadata(performance_results)
+
+        # 50 cặp -> 3 request thay vì 50
+        self.assertEqual(len(self.calls), 3)
+        for campaign in performance_results:
+            for product in campaign["performance_data"]:
+                dims = product["dimensions"]
+                creative, unknown = product["creative_details"]
+                self.assertEqual(creative["metadata"]["title"], f"{dims['campaign_id']}/{dims['item_group_id']}")
+                self.assertNotIn("metadata", unknown)
+
+    def test_creative_chunk_width_follows_observed_rows(self):
+        self.assertEqual(self.reporter._creative_chunk_width(), self.reporter.CREATIVE_CHUNK_DEFAULT)
+
+        # Sản phẩm ít creative -> gộp nhiều item_group_id hơn mỗi request (tối đa CREATIVE_CHUNK_MAX)
+        self.reporter._observe_creative_rows(product_count=20, row_count=20)
+        self.assertEqual(self.reporter._creative_chunk_width(), self.reporter.CREATIVE_CHUNK_MAX)
+
+        # Sản phẩm nhiều creative -> lô nhỏ lại để vẫn vừa 1 trang 1000 dòng
+        for _ in range(20):
+            self.reporter._observe_creative_rows(product_count=10, row_count=1000)
+        width = self.reporter._creative_chunk_width()
+        self.assertLessEqual(width * 100, self.reporter.CREATIVE_PAGE_SIZE)
+        self.assertGreaterEqual(width, self.reporter.CREATIVE_CHUNK_MIN)
+
+
+if __name__ == '__main__':
+    unittest.main()
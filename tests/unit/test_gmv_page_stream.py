@@ -0,0 +1,50 @@
+import unittest
+import time
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.gmv_reporter import GMVReporter
+
+TOTAL_PAGES = 6
+
+
+def fake_request(url, params):
+    """Trang sau về trước trang trước"""
+    page = params["page"]
+    time.sleep(0.01 * (TOTAL_PAGES - page))
+    return {"code": 0, "data": {"list": [f"row-{page}"], "page_info": {"total_page": TOTAL_PAGES}}}
+
+
+class TestPageStream(unittest.TestCase):
+    def setUp(self):
+        self.reporter = GMVReporter("token", "adv", "store")
+        self.reporter._make_api_request_with_backoff = fake_request
+
+    def test_pages_yielded_as_they_complete(self):
+        pages = list(self.reporter._iter_pages("url", {}))
+
+        self.assertEqual(pages[0], (1, ["row-1"]))
+        self.assertEqual(sorted(p for p, _ in pages), list(range(1, TOTAL_PAGES + 1)))
+        self.assertNotEqual([p for p, _ in pages], sorted(p for p, _ in pages))
+
+    def test_fetch_all_pages_keeps_page_order(self):
+        rows = self.reporter._fetch_all_pages("url", {})
+        self.assertEqual(rows, [f"row-{p}" for p in range(1, TOTAL_PAGES + 1)])
+
+    def test_failed_page_recorded_per_chunk(self):
+        def request(url, params):
+            if params["page"] == 3:
+                return None  # Lỗi quyền truy cập giữa chừng
+            return fake_request(url, params)
+        self.reporter._make_api_request_with_backoff = request
+
+        rows = self.reporter._fetch_all_pages("url", {"start_date": "2025-09-01", "end_date": "2025-09-07"})
+        self.assertNotIn("row-3", rows)
+        self.assertEqual(self.reporter.failed_chunks, {("2025-09-01", "2025-09-07")})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import threading
+import time
+import json
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.campaign_product_detail import GMVCampaignProductDetailReporter
+
+
+class TestParallelCampaignBatches(unittest.TestCase):
+    def setUp(self):
+        self.reporter = GMVCampaignProductDetailReporter("token", "adv", "store")
+        self.reporter.CAMPAIGN_BATCH_WORKERS = 4
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def fake_fetch_all_pages(self, url, params):
+        """Lô campaign đến sau trả về trước, để kiểm tra thứ tự kết quả"""
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        filtering = json.loads(params["filtering"])
+        try:
+            if "campaign_ids" not in filtering:
+                return [{"dimensions": {"campaign_id": f"c{i}"}, "metrics": {"campaign_name": f"C{i}"}} for i in range(100)]
+            first = int(filtering["campaign_ids"][0][1:])
+            time.sleep(0.05 * (1 - first / 100))
+            return [
+                {"dimensions": {"campaign_id": cid, "item_group_id": "p1"}, "metrics": {"cost": "1"}}
+                for cid in filtering["campaign_ids"]
+            ]
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def test_batches_run_concurrently_in_order(self):
+        self.reporter._fetch_all_pages = self.fake_fetch_all_pages
+        self.reporter._get_product_map = lambda required_ids=(): {"p1": {"product_name": "P1"}}
+
+        rows = self.reporter.get_data([{"start": "2025-01-01", "end": "2025-01-31"}])
+
+        self.assertGreater(self.max_active, 1)
+        self.assertEqual([row["campaign_id"] for row in rows], [f"c{i}" for i in range(100)])
+
+    def test_single_worker_runs_serially(self):
+        self.reporter.CAMPAIGN_BATCH_WORKERS = 1
+        self.reporter._fetch_all_pages = self.fake_fetch_all_pages
+        self.reporter._get_product_map = lambda required_ids=(): {"p1": {"product_name": "P1"}}
+
+        self.reporter.get_data([{"start": "2025-01-01", "end": "2025-01-31"}])
+
+        self.assertEqual(self.max_active, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
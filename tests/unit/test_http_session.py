@@ -0,0 +1,32 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.gmv_reporter import GMVReporter
+from services.gmv.http_session import get_shared_session
+
+
+class TestSharedHttpSession(unittest.TestCase):
+    def test_reporters_share_pooled_session_without_token(self):
+        first = GMVReporter("token-a", "adv", "store")
+        second = GMVReporter("token-b", "adv", "store")
+
+        self.assertIs(first.session, second.session)
+        self.assertNotIn("Access-Token", first.session.headers)
+        self.assertEqual(first.request_headers["Access-Token"], "token-a")
+        self.assertEqual(second.request_headers["Access-Token"], "token-b")
+
+        adapter = first.session.get_adapter(GMVReporter.PERFORMANCE_API_URL)
+        self.assertGreaterEqual(adapter._pool_maxsize, GMVReporter.PAGE_CONCURRENCY_MAX)
+
+    def test_pool_grows_on_demand(self):
+        session = get_shared_session("test_pool", 4)
+        self.assertIs(get_shared_session("test_pool", 64), session)
+        self.assertEqual(session.get_adapter("https://example.com")._pool_maxsize, 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.planner.job_planner import JobPlanner
+from services.gmv.gmv_reporter import GMVReporter
+
+
+def make_db(history):
+    """Mock db_client trả về `history` cho mọi truy vấn task_logs"""
+    db_client = MagicMock()
+    cursor = MagicMock()
+    cursor.sort.return_value.limit.return_value = history
+    db_client.db.task_logs.find.return_value = cursor
+    return db_client
+
+
+class TestJobPlanner(unittest.TestCase):
+    def setUp(self):
+        self.context = {
+            "job_id": "job_1",
+            "task_type": "product",
+            "advertiser_id": "adv_1",
+            "start_date": "2025-01-01",
+            "end_date": "2025-03-31",
+        }
+
+    def test_defaults_without_history(self):
+        """Không có lịch sử -> dùng giá trị mặc định, không chia job"""
+        plan = JobPlanner(make_db([])).estimate(self.context)
+
+        self.assertEqual(plan["history_jobs"], 0)
+        self.assertEqual(plan["initial_requests"], 3)  # 1 advertiser x 3 tháng
+        self.assertEqual(plan["chunk_factor"], 1)
+        self.assertFalse(plan["should_split"])
+        # TikTok: số lô chạy đồng thời, không có batch size Facebook
+        self.assertIsNone(plan["batch_size"])
+        self.assertEqual(plan["concurrency"], GMVReporter.CAMPAIGN_BATCH_WORKERS)
+
+        facebook_plan = JobPlanner(make_db([])).estimate({**self.context, "task_type": "facebook_performance"})
+        self.assertEqual(facebook_plan["batch_size"], JobPlanner.DEFAULT_BATCH_SIZE)
+        self.assertIsNone(facebook_plan["concurrency"])
+
+    def test_slow_history_triggers_split(self):
+        """Lịch sử chậm -> ước lượng vượt soft_time_limit và đề xuất chia job"""
+        history = [{
+            "date_start": "2024-12-01",
+            "date_stop": "2024-12-31",
+            "stats": {"total_rows": 3100},
+            "api_total_counts": {"https://example.com/report": 300},
+            "duration_seconds": 1200,
+            "plan": {"initial_requests": 1},
+        }]
+        plan = JobPlanner(make_db(history)).estimate(self.context)
+
+        self.assertEqual(plan["history_jobs"], 1)
+        self.assertEqual(plan["metrics"]["pages_per_request"], 300)
+        self.assertTrue(plan["should_split"])
+        self.assertGreater(len(plan["split_ranges"]), 1)
+        self.assertEqual(plan["split_ranges"][0]["start"], "2025-01-01")
+        self.assertEqual(plan["split_ranges"][-1]["end"], "2025-03-31")
+
+    def test_plan_and_record_saves_plan(self):
+        """Plan được lưu vào task_logs của job"""
+        db_client = make_db([])
+        plan = JobPlanner(db_client).plan_and_record(self.context)
+
+        db_client.db.task_logs.update_one.assert_called_with(
+            {"job_id": "job_1"}, {"$set": {"plan": plan}}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
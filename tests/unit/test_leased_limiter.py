@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.rate_limiter.leased_limiter import LeasedRateLimiter
+from services.rate_limiter.rate_limiter import RedisRateLimiter
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis cần lupa để chạy script Lua)
+except ImportError:
+    fakeredis = None
+
+
+def make_limiter(lease_results, lease_size=3):
+    """LeasedRateLimiter với lease script trả về lần lượt `lease_results` ({granted, wait_ms, now_ms})"""
+    redis_client = MagicMock()
+    sliding_script, lease_script = MagicMock(), MagicMock(side_effect=lease_results)
+    redis_client.register_script.side_effect = [sliding_script, lease_script]
+    limiter = LeasedRateLimiter(redis_client, rules=[(45, 60), (2, 1)], name="gmv", lease_size=lease_size)
+    return limiter, lease_script
+
+
+class TestLeasedRateLimiter(unittest.TestCase):
+    def test_spends_leased_tokens_locally(self):
+        """1 lần thuê phục vụ nhiều request, lần thuê kế tiếp trả lại thời điểm đã dùng"""
+        limiter, lease_script = make_limiter([[2, 0, 1000], [0, 400, 1500]])
+
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+        self.assertEqual(lease_script.call_count, 1)
+
+        # Hết token -> thuê lại, bị từ chối và nhận thời gian chờ
+        self.assertAlmostEqual(limiter.acquire("ratelimit:adv:url"), 0.4)
+        args = lease_script.call_args.kwargs["args"]
+        prev_id = lease_script.call_args_list[0].kwargs["args"][0]
+        self.assertEqual(args[3:7], [prev_id, 2, 1000, 2])  # prev lease, count, start, số token đã dùng
+        self.assertEqual(args[-4:], [2, 1000, 45, 60000])
+
+    def test_release_returns_unused_tokens(self):
+        """release() trả lease với block = 0 (chỉ hoàn token, không thuê mới)"""
+        limiter, lease_script = make_limiter([[3, 0, 1000], [0, 0, 1200]])
+
+        limiter.acquire("ratelimit:adv:url")
+        limiter.release()
+
+        args = lease_script.call_args.kwargs["args"]
+        self.assertEqual(args[1], 0)
+        self.assertEqual(args[4:7], [3, 1000, 1])
+        self.assertFalse(limiter.acquire_local("ratelimit:adv:url"))
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis[lua] chưa được cài")
+class TestLeaseScript(unittest.TestCase):
+    """Chạy LEASE_SCRIPT thật trên fakeredis, 2 worker dùng chung quota"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.worker_a = LeasedRateLimiter(self.redis, rules=[(4, 5)], name="gmv", lease_size=3)
+        self.worker_b = LeasedRateLimiter(self.redis, rules=[(4, 5)], name="gmv", lease_size=3)
+        self.key = self.worker_a._rule_keys("k")[0]
+
+    def test_leased_tokens_count_against_global_quota(self):
+        self.assertEqual(self.worker_a.acquire("k"), 0.0)  # Thuê 3, dùng 1
+        self.assertEqual(self.redis.zcard(self.key), 3)
+        self.assertEqual(self.worker_b.acquire("k"), 0.0)  # Chỉ còn 1 token
+        self.assertGreater(self.worker_b.acquire("k"), 0)
+        # Worker không gọi Redis mà vẫn dùng token đã thuê
+        self.assertEqual(self.worker_a.acquire("k"), 0.0)
+
+        # Request thường (không thuê) cũng thấy quota đã bị giữ chỗ
+        plain = RedisRateLimiter(self.redis, rules=[(4, 5)], name="gmv")
+        self.assertGreater(plain.acquire("k"), 0)
+
+    def test_release_refills_unused_tokens(self):
+        self.worker_a.acquire("k")
+        self.worker_b.acquire("k")
+        self.assertGreater(self.worker_b.acquire("k"), 0)
+
+        # A trả 2 token chưa dùng, token đã dùng được ghi lại theo thời điểm thực tế
+        self.worker_a.release()
+        self.assertEqual(self.redis.zcard(self.key), 2)
+        self.assertEqual(self.worker_b.acquire("k"), 0.0)
+        self.assertEqual(self.worker_b.acquire("k"), 0.0)
+        self.assertGreater(self.worker_b.acquire("k"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.rate_limiter.metrics import LimiterMetrics, ApiCallCounter, wait_bucket_field
+from services.rate_limiter.rate_limiter import RedisRateLimiter
+
+
+class TestLimiterMetrics(unittest.TestCase):
+    def test_counters_buffered_then_flushed_in_one_pipeline(self):
+        """Số liệu cộng dồn trong bộ nhớ, flush ghi bằng 1 pipeline HINCRBY"""
+        redis_client = MagicMock()
+        metrics = LimiterMetrics(redis_client, flush_interval=3600)
+
+        metrics.record_acquire("gmv", True)
+        metrics.record_acquire("gmv", False)
+        metrics.record_acquire("gmv", True)
+        metrics.record_wait("gmv", 0.3)
+        metrics.record_backoff("tiktok_api", "rate_limit", 9.5)
+        redis_client.pipeline.assert_not_called()
+
+        metrics.flush()
+
+        pipe = redis_client.pipeline.return_value
+        fields = {(c.args[0].split(":")[1], c.args[1]): c.args[2] for c in pipe.hincrby.call_args_list}
+        self.assertEqual(fields[("gmv", "granted")], 2)
+        self.assertEqual(fields[("gmv", "denied")], 1)
+        self.assertEqual(fields[("gmv", "wait_ms")], 300)
+        self.assertEqual(fields[("gmv", "wait_le_500")], 1)
+        self.assertEqual(fields[("tiktok_api", "backoff_ms:rate_limit")], 9500)
+        pipe.execute.assert_called_once()
+
+        # Không còn gì để flush
+        metrics.flush()
+        pipe.execute.assert_called_once()
+
+    def test_wait_buckets(self):
+        self.assertEqual(wait_bucket_field(0), "wait_le_0")
+        self.assertEqual(wait_bucket_field(11), "wait_le_50")
+        self.assertEqual(wait_bucket_field(10 ** 6), "wait_le_inf")
+
+    def test_limiter_records_acquire_decisions(self):
+        redis_client = MagicMock()
+        redis_client.register_script.return_value = MagicMock(side_effect=[0, 250])
+        metrics = MagicMock()
+        limiter = RedisRateLimiter(redis_client, rules=[(2, 1)], name="gmv", metrics=metrics)
+
+        limiter.acquire("ratelimit:adv:url")
+        limiter.acquire("ratelimit:adv:url")
+
+        self.assertEqual(
+            [c.args for c in metrics.record_acquire.call_args_list],
+            [("gmv", True), ("gmv", False)]
+        )
+        self.assertEqual(metrics.record_acquire.call_args.kwargs, {"key": "ratelimit:adv:url"})
+
+    def test_keyed_scopes_split_per_advertiser(self):
+        """Key của limiter (advertiser/url) tách thành scope riêng để tinh chỉnh limit theo từng key"""
+        redis_client = MagicMock()
+        metrics = LimiterMetrics(redis_client, flush_interval=3600)
+
+        metrics.record_acquire("gmv", True, key="ratelimit:adv1:url")
+        metrics.record_acquire("gmv", False, key="ratelimit:adv2:url")
+        metrics.record_acquire("gmv", True)
+        metrics.flush()
+
+        pipe = redis_client.pipeline.return_value
+        self.assertEqual(
+            set(pipe.sadd.call_args.args[1:]),
+            {"gmv|ratelimit:adv1:url", "gmv|ratelimit:adv2:url", "gmv"}
+        )
+        keys = {c.args[0] for c in pipe.hincrby.call_args_list}
+        self.assertTrue(any(k.startswith("limiter_stats:gmv|ratelimit:adv2:url:") for k in keys))
+
+
+class TestApiCallCounter(unittest.TestCase):
+    def test_calls_buffered_into_dashboard_keys(self):
+        """Nhiều lần gọi -> 1 pipeline INCRBY vào đúng key tổng và key theo giờ của dashboard"""
+        redis_client = MagicMock()
+        counter = ApiCallCounter(redis_client, flush_interval=3600)
+
+        for _ in range(3):
+            counter.record_call("gmv_url")
+        counter.record_call("bc_url")
+        redis_client.pipeline.assert_not_called()
+
+        counter.flush()
+
+        pipe = redis_client.pipeline.return_value
+        increments = {c.args[0]: c.args[1] for c in pipe.incrby.call_args_list}
+        self.assertEqual(increments["api_calls_total:gmv_url"], 3)
+        self.assertEqual(increments["api_calls_total:bc_url"], 1)
+        hourly = [key for key in increments if key.startswith("api_calls:gmv_url:")]
+        self.assertEqual(len(hourly), 1)
+        self.assertEqual(increments[hourly[0]], 3)
+        pipe.expire.assert_any_call(hourly[0], 3600 * 24)
+        pipe.execute.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
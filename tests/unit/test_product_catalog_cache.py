@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.gmv.product_catalog_cache import ProductCatalogCache
+
+
+class TestProductCatalogCache(unittest.TestCase):
+    def setUp(self):
+        self.products = MagicMock()
+        self.meta = MagicMock()
+        db_client = MagicMock()
+        db_client.db = {"product_catalog": self.products, "product_catalog_meta": self.meta}
+        self.cache = ProductCatalogCache(db_client, ttl_hours=24)
+
+        self.products.find.return_value = [
+            {"product": {"item_group_id": "p1", "title": "P1"}},
+            {"product": {"item_group_id": "p2", "title": "P2"}},
+        ]
+
+    def set_meta(self, age_hours, missing=()):
+        self.meta.find_one.return_value = {
+            "_id": "store",
+            "refreshed_at": datetime.now(timezone.utc) - timedelta(hours=age_hours),
+            "missing_item_group_ids": list(missing),
+        }
+
+    def test_fresh_cache_hit(self):
+        self.set_meta(age_hours=1)
+        products = self.cache.get("store", {"p1", "p2"})
+        self.assertEqual([p["item_group_id"] for p in products], ["p1", "p2"])
+
+    def test_refresh_on_expired_or_unknown_product(self):
+        self.set_meta(age_hours=30)
+        self.assertIsNone(self.cache.get("store", {"p1"}))
+
+        self.set_meta(age_hours=1)
+        self.assertIsNone(self.cache.get("store", {"p1", "p3"}))
+
+        # p3 đã được xác nhận không có trong catalog ở lần làm mới trước -> không làm mới lại
+        self.set_meta(age_hours=1, missing=["p3"])
+        self.assertIsNotNone(self.cache.get("store", {"p1", "p3"}))
+
+    def test_save_records_products_and_missing_ids(self):
+        self.cache.save("store", [{"item_group_id": "p1"}, {"item_group_id": "p2"}], {"p1", "p3"})
+
+        operations = self.products.bulk_write.call_args[0][0]
+        self.assertEqual(len(operations), 2)
+        meta_update = self.meta.update_one.call_args[0][1]["$set"]
+        self.assertEqual(meta_update["product_count"], 2)
+        self.assertEqual(meta_update["missing_item_group_ids"], ["p3"])
+        # Sản phẩm không còn trong catalog bị xóa khỏi cache
+        self.products.delete_many.assert_called_once_with(
+            {"store_id": "store", "item_group_id": {"$nin": ["p1", "p2"]}}
+        )
+
+    def test_incomplete_refresh_only_upserts(self):
+        self.cache.save("store", [{"item_group_id": "p1"}], {"p1", "p3"}, complete=False)
+
+        self.products.bulk_write.assert_called_once()
+        self.products.delete_many.assert_not_called()
+        self.meta.update_one.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -112,5 +112,43 @@ class TestEnhancedBackoffHandler(unittest.TestCase):
         # Expected: 150 + 5 = 155
         mock_sleep.assert_called_with(155)
 
+    @patch('time.sleep')
+    def test_usage_trend_pacing(self, mock_sleep):
+        """Usage tăng ~1%/batch (mỗi batch 10s): delay nhỏ tăng dần thay vì ngủ 60s ở mốc 75%"""
+        responses = [{'status_code': 200}]
+        delays = []
+        for i, usage in enumerate([72, 73, 74, 75, 76]):
+            summary = {
+                'timestamp': f'2025-01-01T00:00:{i * 10:02d}',
+                'rate_limits': {'app_usage_pct': usage}
+            }
+            delays.append(self.handler.analyze_and_backoff(responses, summary))
+
+        self.assertEqual(delays[0], 0)  # Chưa có summary trước đó để ước lượng xu hướng
+        self.assertTrue(all(a < b for a, b in zip(delays[1:], delays[2:])))
+        self.assertLess(delays[-1], self.handler.USAGE_WARNING_BACKOFF_SEC)
+        self.mock_reporter._report_progress.assert_not_called()
+
+    @patch('time.sleep')
+    def test_response_rate_limit_blocks_governor(self, mock_sleep):
+        """Lỗi rate limit trong response được chia sẻ qua usage governor: code 4 chặn app, 80004 chặn account"""
+        responses = [
+            {'status_code': 400, 'error': {'code': 4, 'message': 'App Rate limit'}},
+            {'status_code': 400, 'error': {'code': 80004, 'message': 'Ads Management limit'},
+             'metadata': {'account': {'id': 'act_1'}}},
+        ]
+        with patch.object(self.handler, 'MAX_BACKOFF_SECONDS', 900):
+            self.handler.analyze_and_backoff(responses, summary=None)
+
+        governor = self.mock_reporter.usage_governor
+        governor.block.assert_any_call(605)
+        governor.block.assert_any_call(605, account_ids={'act_1'})
+
+        # Summary đã có ETA -> governor.update đã ghi blocked_until, không chặn cả app
+        governor.reset_mock()
+        summary = {'rate_limits': {'account_details': [{'account_id': '1', 'eta_seconds': 60}]}}
+        self.handler.analyze_and_backoff(responses[:1], summary)
+        governor.block.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import time
+import sys
+import os
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis cần lupa để chạy script Lua)
+except ImportError:
+    fakeredis = None
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.rate_limiter.rate_limiter import RedisRateLimiter
+from services.rate_limiter.composite_limiter import CompositeRateLimiter, LeasedCompositeRateLimiter
+
+
+def make_redis(script_result=0):
+    """Mock redis với script Lua trả về `script_result` (số ms cần chờ)"""
+    redis_client = MagicMock()
+    script = MagicMock(return_value=script_result)
+    redis_client.register_script.return_value = script
+    return redis_client, script
+
+
+class TestRedisRateLimiter(unittest.TestCase):
+    def test_all_rules_checked_in_one_script_call(self):
+        """Tất cả rule được kiểm tra trong 1 lần gọi script, key tách theo tên limiter"""
+        redis_client, script = make_redis(0)
+        limiter = RedisRateLimiter(redis_client, rules=[(45, 60), (2, 1)], name="gmv")
+
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+        script.assert_called_once()
+        kwargs = script.call_args.kwargs
+        self.assertEqual(kwargs["keys"], ["ratelimit:adv:url:gmv:1s:sw", "ratelimit:adv:url:gmv:60s:sw"])
+        self.assertEqual(kwargs["args"][1:], [2, 1000, 45, 60000])
+
+    def test_denied_returns_wait_seconds(self):
+        """Bị từ chối -> trả về số giây cần chờ đến slot kế tiếp"""
+        redis_client, _ = make_redis(350)
+        limiter = RedisRateLimiter(redis_client, rules=[(2, 1)])
+
+        self.assertAlmostEqual(limiter.acquire("ratelimit:adv:url"), 0.35)
+
+    @patch("services.rate_limiter.rate_limiter.time.sleep")
+    def test_wait_for_slot_sleeps_exact_wait(self, mock_sleep):
+        """wait_for_slot ngủ đúng thời gian limiter trả về rồi thử lại"""
+        redis_client, script = make_redis()
+        script.side_effect = [50, 0]
+        limiter = RedisRateLimiter(redis_client, rules=[(2, 1)])
+        limiter.WAIT_JITTER_SEC = 0
+
+        self.assertTrue(limiter.wait_for_slot("ratelimit:adv:url"))
+        mock_sleep.assert_called_once_with(0.05)
+
+    @patch("services.rate_limiter.rate_limiter.time.sleep")
+    def test_wait_for_slot_timeout(self, mock_sleep):
+        """Thời gian chờ vượt timeout -> trả về False, không ngủ"""
+        redis_client, _ = make_redis(5000)
+        limiter = RedisRateLimiter(redis_client, rules=[(45, 60)])
+
+        self.assertFalse(limiter.wait_for_slot("ratelimit:adv:url", timeout=1))
+        mock_sleep.assert_not_called()
+
+    def test_composite_checks_all_limiters_in_one_call(self):
+        """Composite gộp rule + key của các limiter con vào 1 lần gọi script"""
+        redis_client, script = make_redis(0)
+        gmv = RedisRateLimiter(redis_client, rules=[(45, 60), (2, 1)], name="gmv")
+        basic = RedisRateLimiter(redis_client, rules=[(8, 1)], name="basic")
+        composite = CompositeRateLimiter(redis_client, [gmv, basic])
+
+        self.assertEqual(composite.acquire("ratelimit:adv:url"), 0.0)
+        script.assert_called_once()
+        kwargs = script.call_args.kwargs
+        self.assertEqual(kwargs["keys"], [
+            "ratelimit:adv:url:gmv:1s:sw", "ratelimit:adv:url:gmv:60s:sw", "ratelimit:adv:url:basic:1s:sw"
+        ])
+        self.assertEqual(kwargs["args"][1:], [2, 1000, 45, 60000, 8, 1000])
+        self.assertEqual(composite.name, "gmv+basic")
+
+    def test_requires_rules(self):
+        with self.assertRaises(ValueError):
+            RedisRateLimiter(MagicMock(), rules=[])
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis[lua] chưa được cài")
+class TestSlidingWindowScript(unittest.TestCase):
+    """Chạy SLIDING_WINDOW_SCRIPT thật trên fakeredis"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def test_window_expiry_and_returned_wait(self):
+        limiter = RedisRateLimiter(self.redis, rules=[(2, 0.2)], name="gmv")
+
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+        wait = limiter.acquire("ratelimit:adv:url")
+        self.assertTrue(0 < wait <= 0.2)
+
+        # Chờ đúng thời gian trả về -> request cũ nhất ra khỏi cửa sổ, có slot lại
+        time.sleep(wait + 0.01)
+        self.assertEqual(limiter.acquire("ratelimit:adv:url"), 0.0)
+
+    def test_denied_request_consumes_no_rule(self):
+        limiter = RedisRateLimiter(self.redis, rules=[(2, 0.2), (3, 5)], name="gmv")
+        short_key, long_key = limiter._rule_keys("k")
+
+        self.assertEqual([limiter.acquire("k") for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(limiter.acquire("k"), 0)  # Rule 2/0.2s từ chối
+        self.assertEqual(self.redis.zcard(long_key), 2)  # Rule 3/5s không bị tính request bị từ chối
+
+        time.sleep(0.21)
+        self.assertEqual(limiter.acquire("k"), 0.0)
+        # Rule 3/5s đã đầy: thời gian chờ theo request cũ nhất của rule dài
+        self.assertGreater(limiter.acquire("k"), 4)
+        self.assertEqual(self.redis.zcard(short_key), 1)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis[lua] chưa được cài")
+class TestCompositeScript(unittest.TestCase):
+    """Composite chạy script thật: mọi rule của các limiter con được kiểm tra và ghi nguyên tử"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.gmv = RedisRateLimiter(self.redis, rules=[(2, 5)], name="gmv")
+        self.basic = RedisRateLimiter(self.redis, rules=[(3, 5)], name="basic")
+        self.gmv_key = self.gmv._rule_keys("k")[0]
+        self.basic_key = self.basic._rule_keys("k")[0]
+
+    def test_slot_consumed_on_all_rules_or_none(self):
+        composite = CompositeRateLimiter(self.redis, [self.gmv, self.basic])
+
+        # Request qua limiter basic riêng lẻ tính chung quota với composite
+        self.assertEqual(self.basic.acquire("k"), 0.0)
+        self.assertEqual(self.basic.acquire("k"), 0.0)
+        self.assertEqual(composite.acquire("k"), 0.0)
+        self.assertEqual((self.redis.zcard(self.gmv_key), self.redis.zcard(self.basic_key)), (1, 3))
+
+        # basic đã đầy -> composite bị từ chối và không tiêu slot của gmv
+        self.assertGreater(composite.acquire("k"), 0)
+        self.assertEqual(self.redis.zcard(self.gmv_key), 1)
+        self.assertEqual(self.gmv.acquire("k"), 0.0)
+
+    def test_leased_composite_reserves_on_every_limiter(self):
+        composite = LeasedCompositeRateLimiter(self.redis, [self.gmv, self.basic], lease_size=5)
+
+        self.assertEqual(composite.acquire("k"), 0.0)
+        # Block bị giới hạn bởi rule chặt nhất (gmv 2) và giữ chỗ trên cả 2 limiter
+        self.assertEqual((self.redis.zcard(self.gmv_key), self.redis.zcard(self.basic_key)), (2, 2))
+        self.assertGreater(self.gmv.acquire("k"), 0)
+        self.assertEqual(self.basic.acquire("k"), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import logging
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.simulator.facebook_replay import FacebookReplaySimulator, make_backoff_policy
+from services.simulator.tiktok_replay import TikTokReplaySimulator
+
+PERFORMANCE_URL = "https://business-api.tiktok.com/open_api/v1.3/gmv_max/report/get/"
+
+
+def recorded_summaries(batches=30, step_pct=8, batch_sec=5):
+    """Summaries giống job thật: usage tăng mỗi batch, handler gốc ngủ 65s/305s ở 75%/95%"""
+    ts, usage, summaries = datetime(2025, 1, 1), 20.0, []
+    for _ in range(batches):
+        summaries.append({
+            "timestamp": ts.isoformat(),
+            "rate_limits": {"app_usage_pct": 10, "account_details": [
+                {"account_id": "1", "insights_usage_pct": round(usage, 2), "business_use_cases": []}
+            ]}
+        })
+        backoff = 305 if usage >= 95 else 65 if usage >= 75 else 0
+        ts += timedelta(seconds=batch_sec + backoff)
+        usage = min(99.0, max(0.0, usage + step_pct - (batch_sec + backoff) * 100 / 3600))
+    return summaries, (ts - datetime(2025, 1, 1)).total_seconds()
+
+
+class TestReplaySimulator(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_facebook_baseline_reproduces_recorded_job(self):
+        summaries, recorded_duration = recorded_summaries()
+        legacy = make_backoff_policy(PACING_ENABLED=False)
+        result = FacebookReplaySimulator(summaries, baseline_policy=legacy).run()
+
+        self.assertEqual(result["rate_limit_hits"], 0)
+        self.assertAlmostEqual(result["duration_sec"], recorded_duration, delta=1)
+
+    def test_facebook_policy_without_backoff_hits_rate_limit(self):
+        summaries, _ = recorded_summaries()
+        legacy = make_backoff_policy(PACING_ENABLED=False)
+        policy = make_backoff_policy(PACING_ENABLED=False, USAGE_WARNING_PCT=101, USAGE_CRITICAL_PCT=101)
+
+        result = FacebookReplaySimulator(summaries, baseline_policy=legacy).run(policy)
+
+        self.assertGreater(result["rate_limit_hits"], 0)
+        with self.assertRaises(ValueError):
+            make_backoff_policy(NOT_A_THRESHOLD=1)
+
+    def test_facebook_pacing_keeps_usage_under_critical(self):
+        summaries, _ = recorded_summaries(batches=60)
+        simulator = FacebookReplaySimulator(summaries, baseline_policy=make_backoff_policy(PACING_ENABLED=False))
+
+        step = simulator.run()
+        paced = simulator.run(make_backoff_policy())
+
+        self.assertEqual(paced["rate_limit_hits"], 0)
+        self.assertGreaterEqual(step["max_usage_pct"], 95)
+        self.assertLess(paced["max_usage_pct"], 95)
+
+    def test_tiktok_looser_rules_trade_limiter_wait_for_rejections(self):
+        timeline = [{"t": i, "url": PERFORMANCE_URL, "outcome": "ok", "latency": 0.3} for i in range(120)]
+        simulator = TikTokReplaySimulator(timeline)
+
+        baseline = simulator.run()
+        looser = simulator.run({"gmv": [(3, 1), (60, 60)], "basic": [(8, 1), (550, 60)]})
+
+        self.assertEqual(baseline["rate_limit_hits"], 0)
+        self.assertGreater(baseline["limiter_wait_sec"], 0)
+        self.assertGreater(looser["rate_limit_hits"], 0)
+        self.assertGreater(looser["total_backoff_sec"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
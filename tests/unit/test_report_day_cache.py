@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from datetime import date
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.database.report_day_cache import ReportDayCache
+from workers.tiktok_gmv_worker import TikTokGMVProductWorker
+
+SCOPE = {"advertiser_id": "adv", "store_id": "store"}
+
+
+def make_worker(day_cache):
+    context = {
+        "job_id": "job_1", "task_id": "task_1", "task_type": "product",
+        "spreadsheet_id": "sheet", "advertiser_id": "adv", "store_id": "store",
+    }
+    with patch("workers.base_report_worker.GoogleSheetWriter"), \
+         patch("workers.base_report_worker.CurrencyExchangeService"):
+        worker = TikTokGMVProductWorker(context, MagicMock(), None, MagicMock())
+    worker._day_cache = day_cache
+    return worker
+
+
+class TestDayCache(unittest.TestCase):
+    def test_partial_month_served_from_cache_and_missing_days_fetched(self):
+        day_cache = MagicMock()
+        # Ngày 1-10 đã cache, báo cáo ngày 1-20 của tháng trước
+        day_cache.covered_days.return_value = {date(2025, 9, d) for d in range(1, 11)}
+        day_cache.load.side_effect = lambda scope, days: [
+            {"stat_time_day": f"{day.isoformat()} 00:00:00", "start_date": "x", "end_date": "x"} for day in days
+        ]
+        worker = make_worker(day_cache)
+
+        cached, to_fetch = worker._load_cached_data([{"start": "2025-09-01", "end": "2025-09-20"}], date(2025, 10, 17))
+
+        self.assertEqual(len(cached), 10)
+        self.assertTrue(all(row["start_date"] == "2025-09-01" and row["end_date"] == "2025-09-20" for row in cached))
+        self.assertEqual([(c["start"], c["end"]) for c in to_fetch], [("2025-09-11", "2025-09-20")])
+
+        # Row API của chunk con mang lại khoảng báo cáo gốc, chỉ ngày ổn định được ghi vào cache
+        rows = [{"stat_time_day": "2025-09-11 00:00:00", "start_date": "2025-09-11", "end_date": "2025-09-20"}]
+        worker._restore_report_bounds(rows, to_fetch)
+        self.assertEqual((rows[0]["start_date"], rows[0]["end_date"]), ("2025-09-01", "2025-09-20"))
+
+        worker._save_to_cache(rows, to_fetch, date(2025, 9, 16))
+        scope, saved_rows, days = day_cache.save.call_args[0]
+        self.assertEqual(scope, SCOPE)
+        self.assertEqual(sorted(days), [date(2025, 9, d) for d in range(11, 16)])
+
+    def test_failed_chunk_not_marked_covered(self):
+        """Chunk có trang lỗi không được ghi coverage, để lần sau lấy lại thay vì coi là không có dữ liệu"""
+        day_cache = MagicMock()
+        worker = make_worker(day_cache)
+        chunks = [
+            {"start": "2025-09-01", "end": "2025-09-07"},
+            {"start": "2025-09-08", "end": "2025-09-14"},
+        ]
+        rows = [{"stat_time_day": "2025-09-02 00:00:00", "start_date": "2025-09-01", "end_date": "2025-09-07"}]
+
+        worker._save_to_cache(rows, chunks, date(2025, 10, 17), {("2025-09-08", "2025-09-14")})
+
+        _, _, days = day_cache.save.call_args[0]
+        self.assertEqual(sorted(days), [date(2025, 9, d) for d in range(1, 8)])
+
+    def test_save_marks_coverage_after_rows(self):
+        rows_collection, coverage = MagicMock(), MagicMock()
+        db_client = MagicMock()
+        db_client.db = {"product_reports_daily": rows_collection, "report_day_coverage": coverage}
+        cache = ReportDayCache(db_client, "product_reports")
+
+        cache.save(SCOPE, [
+            {"campaign_id": "c1", "item_group_id": "p1", "stat_time_day": "2025-09-01 00:00:00"},
+            {"campaign_id": "c1", "item_group_id": "p1", "stat_time_day": "2025-09-05 00:00:00"},
+        ], {date(2025, 9, 1), date(2025, 9, 2)})
+
+        operations = rows_collection.bulk_write.call_args[0][0]
+        self.assertEqual(len(operations), 1)  # Ngày 5 không thuộc khoảng đã lấy
+        update = coverage.update_one.call_args[0][1]
+        self.assertEqual(update["$addToSet"]["days"]["$each"], ["2025-09-01", "2025-09-02"])
+
+        coverage.find_one.return_value = {"days": ["2025-09-01", "2025-09-02"]}
+        self.assertEqual(cache.covered_days(SCOPE, date(2025, 9, 2), date(2025, 9, 30)), {date(2025, 9, 2)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.facebook.usage_governor import FacebookUsageGovernor
+from services.facebook.err_handler.rate_limit import EnhancedBackoffHandler
+
+
+def make_governor(states=None):
+    """Governor với pipeline mock, hgetall trả về `states` theo thứ tự key"""
+    redis_client = MagicMock()
+    pipe = redis_client.pipeline.return_value
+    pipe.execute.return_value = states or []
+    return FacebookUsageGovernor(redis_client), pipe
+
+
+def make_shared_governor():
+    """Governor với pipeline mock ghi/đọc hash trong dict, như Redis dùng chung giữa các job"""
+    hashes, queued = {}, []
+    redis_client = MagicMock()
+    pipe = redis_client.pipeline.return_value
+    pipe.hset.side_effect = lambda key, field=None, value=None, mapping=None: hashes.setdefault(key, {}).update(
+        {k: str(v) for k, v in (mapping or {field: value}).items()}
+    )
+    pipe.hgetall.side_effect = lambda key: queued.append(dict(hashes.get(key, {})))
+
+    def execute():
+        result = list(queued)
+        queued.clear()
+        return result
+    pipe.execute.side_effect = execute
+    return FacebookUsageGovernor(redis_client)
+
+
+class TestFacebookUsageGovernor(unittest.TestCase):
+    @patch("services.facebook.usage_governor.time.time", return_value=1000.0)
+    def test_update_records_app_and_account_usage(self, _):
+        """Summary của batch được ghi vào hash dùng chung, eta > 0 -> chặn account"""
+        governor, pipe = make_governor()
+
+        governor.update({"rate_limits": {
+            "app_usage_pct": 40,
+            "account_details": [{"account_id": "act_123", "insights_usage_pct": 80, "eta_seconds": 120}]
+        }})
+
+        pipe.hset.assert_any_call("fb_usage:app", mapping={"usage_pct": 40.0, "updated_at": 1000.0, "source": ""})
+        pipe.hset.assert_any_call("fb_usage:account:123", mapping={
+            "usage_pct": 80.0, "eta_seconds": 120.0, "updated_at": 1000.0, "source": "",
+            "blocked_until": 1120.0
+        })
+        pipe.execute.assert_called_once()
+
+    @patch("services.facebook.usage_governor.time.time", return_value=1000.0)
+    def test_delay_scales_with_fresh_usage(self, _):
+        """Usage do job khác đẩy lên cũng làm job này chậm lại"""
+        governor, _ = make_governor([
+            {"usage_pct": "30", "updated_at": "1000"},
+            {"usage_pct": "85", "updated_at": "995"},  # 17.5s pacing, đã trôi qua 5s
+        ])
+
+        pacing = governor.get_delay(["act_123"])
+
+        self.assertEqual(pacing["delay_seconds"], 12.5)
+        self.assertEqual(pacing["usage_pct"], 85.0)
+
+    @patch("services.facebook.usage_governor.time.time", return_value=1000.0)
+    def test_blocked_account_and_stale_usage(self, _):
+        """Account đang bị chặn -> chờ hết eta; usage quá cũ bị bỏ qua"""
+        governor, _ = make_governor([
+            {"usage_pct": "99", "updated_at": "100"},
+            {"usage_pct": "10", "updated_at": "990", "blocked_until": "1045"},
+        ])
+
+        self.assertEqual(governor.get_delay(["123"])["delay_seconds"], 45.0)
+
+    def test_redis_error_does_not_block(self):
+        governor, pipe = make_governor()
+        pipe.execute.side_effect = ConnectionError("down")
+
+        self.assertEqual(governor.get_delay(["123"])["delay_seconds"], 0.0)
+
+    @patch("time.sleep")
+    def test_trend_pacing_not_doubled_by_governor(self, _):
+        """Usage tăng ~1%/batch: mỗi batch chỉ chờ delay pacing, governor không ngủ thêm theo cùng summary"""
+        governor = make_shared_governor()
+        handler = EnhancedBackoffHandler(reporter=MagicMock())
+        clock = 1000.0
+        delays = []
+        for i, usage in enumerate([72, 73, 74, 75, 76]):
+            summary = {
+                "timestamp": f"2025-01-01T00:00:{i * 10:02d}",
+                "rate_limits": {"app_usage_pct": usage}
+            }
+            with patch("services.facebook.usage_governor.time.time", return_value=clock):
+                governor.update(summary, source="job_a")
+                pacing = handler.analyze_and_backoff([{"status_code": 200}], summary)
+                own_wait = governor.get_delay(skip_source="job_a")["delay_seconds"]
+                other_wait = governor.get_delay(skip_source="job_b")["delay_seconds"]
+            delays.append(pacing + own_wait)
+            self.assertEqual(own_wait, 0.0)
+            self.assertGreater(other_wait, 0.0)  # Job khác vẫn giãn nhịp theo usage của job này
+            clock += 10
+
+        self.assertTrue(all(a < b for a, b in zip(delays[1:], delays[2:])))
+        self.assertLess(max(delays), handler.USAGE_WARNING_BACKOFF_SEC)
+
+        # Block dùng chung vẫn áp dụng cho chính job đã ghi
+        with patch("services.facebook.usage_governor.time.time", return_value=clock):
+            governor.block(30)
+            self.assertEqual(governor.get_delay(skip_source="job_a")["delay_seconds"], 30.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
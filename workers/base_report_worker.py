@@ -10,6 +10,7 @@ from abc import ABC, abstractmethod
 from services.sheet_writer.gg_sheet_writer import GoogleSheetWriter
 import os
 from services.currency.exchange_rate_service import CurrencyExchangeService
+from services.database.report_day_cache import ReportDayCache, row_day
 
 CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json')
 
@@ -51,6 +52,7 @@ class BaseReportWorker(ABC):
         self.api_usage = {}
         self.cached_rows = 0
         self.api_rows = 0
+        self._day_cache = None
     
     def _send_progress(self, status: str, message: str, progress: int = 0, api_usage: Dict = None):
         """Send progress update"""
@@ -122,6 +124,26 @@ class BaseReportWorker(ABC):
         
         return chunks
     
+    def _apply_plan(self, reporter):
+        """
+        Apply concurrency chosen by JobPlanner (TikTok GMV: CAMPAIGN_BATCH_WORKERS).
+        should_split is advisory only: the user is warned but the whole date range still runs.
+        """
+        plan = self.context.get("plan")
+        if not plan:
+            return
+        
+        if plan.get("concurrency") and hasattr(reporter, "CAMPAIGN_BATCH_WORKERS"):
+            reporter.CAMPAIGN_BATCH_WORKERS = plan["concurrency"]
+        
+        if plan.get("should_split"):
+            self._send_progress(
+                "RUNNING",
+                f"⚠ Job ước tính cần ~{plan.get('estimated_seconds')}s, nên chia thành {len(plan.get('split_ranges', []))} job nhỏ hơn "
+                f"(job vẫn chạy toàn bộ khoảng ngày).",
+                0
+            )
+    
     @abstractmethod
     def _create_reporter(self) -> Any:
         """
@@ -173,6 +195,76 @@ class BaseReportWorker(ABC):
         """
         pass
     
+    def _get_day_cache_scope(self) -> Optional[Dict]:
+        """
+        Scope cho cache theo ngày (vd. advertiser_id, store_id).
+        Worker có row theo stat_time_day override để bật; None = chỉ cache theo tháng trọn vẹn.
+        """
+        return None
+
+    def _get_day_cache(self) -> ReportDayCache:
+        if self._day_cache is None:
+            self._day_cache = ReportDayCache(self.db_client, self._get_collection_name())
+        return self._day_cache
+
+    def _load_cached_days(
+        self,
+        chunk: Dict[str, str],
+        accurate_data_date: date,
+        scope: Dict
+    ) -> tuple[List[Dict], Optional[Dict]]:
+        """
+        Cache theo ngày cho một chunk: trả về (rows đọc từ cache, chunk con cần gọi API hoặc None).
+
+        Ngày từ accurate_data_date trở đi luôn lấy từ API. Các ngày còn thiếu được gộp thành
+        một khoảng liên tục (ngày thiếu đầu tiên -> cuối cùng), vì chia nhỏ quanh các ngày
+        đã cache sẽ nhân số request campaign list / batch; ngày đã cache nằm trong khoảng
+        đó được lấy lại từ API.
+        """
+        chunk_start = datetime.strptime(chunk['start'], '%Y-%m-%d').date()
+        chunk_end = datetime.strptime(chunk['end'], '%Y-%m-%d').date()
+        days = [chunk_start + timedelta(days=i) for i in range((chunk_end - chunk_start).days + 1)]
+
+        covered = self._get_day_cache().covered_days(
+            scope, chunk_start, min(chunk_end, accurate_data_date - timedelta(days=1))
+        )
+        missing = [day for day in days if day not in covered]
+
+        fetch_chunk = None
+        if missing:
+            fetch_chunk = {
+                "start": missing[0].isoformat(),
+                "end": missing[-1].isoformat(),
+                # Khoảng báo cáo gốc, gán lại cho row API sau khi làm phẳng
+                "report_start": chunk['start'],
+                "report_end": chunk['end'],
+            }
+        cached_days = [day for day in days if day in covered and not (missing and missing[0] <= day <= missing[-1])]
+
+        rows = self._get_day_cache().load(scope, cached_days)
+        for row in rows:
+            row["start_date"], row["end_date"] = chunk['start'], chunk['end']
+
+        if cached_days:
+            logger.info(f"CACHE HIT: {len(rows)} records for {len(cached_days)} days of [{chunk['start']} - {chunk['end']}]")
+        if fetch_chunk:
+            logger.info(f"CACHE MISS: Will fetch [{fetch_chunk['start']} - {fetch_chunk['end']}] from API")
+        return rows, fetch_chunk
+
+    @staticmethod
+    def _restore_report_bounds(flattened_data: List[Dict], fetched_chunks: List[Dict[str, str]]):
+        """Row của chunk con (cache theo ngày) mang start_date/end_date của khoảng báo cáo gốc."""
+        bounds = {
+            (chunk['start'], chunk['end']): (chunk['report_start'], chunk['report_end'])
+            for chunk in fetched_chunks if "report_start" in chunk
+        }
+        if not bounds:
+            return
+        for row in flattened_data:
+            report_bounds = bounds.get((row.get("start_date"), row.get("end_date")))
+            if report_bounds:
+                row["start_date"], row["end_date"] = report_bounds
+
     def _load_cached_data(
         self,
         date_chunks: List[Dict[str, str]],
@@ -192,8 +284,17 @@ class BaseReportWorker(ABC):
         chunks_to_fetch = []
         
         collection_name = self._get_collection_name()
+        day_scope = self._get_day_cache_scope() if self.db_client else None
         
         for chunk in date_chunks:
+            if day_scope is not None:
+                rows, fetch_chunk = self._load_cached_days(chunk, accurate_data_date, day_scope)
+                cached_data.extend(rows)
+                self.cached_rows += len(rows)
+                if fetch_chunk:
+                    chunks_to_fetch.append(fetch_chunk)
+                continue
+
             chunk_start = datetime.strptime(chunk['start'], '%Y-%m-%d').date()
             chunk_end = datetime.strptime(chunk['end'], '%Y-%m-%d').date()
             
@@ -220,11 +321,40 @@ class BaseReportWorker(ABC):
         
         return cached_data, chunks_to_fetch
     
-    def _save_to_cache(self, flattened_data: List[Dict]):
-        """Save full-month data to cache"""
+    def _save_to_cache(
+        self,
+        flattened_data: List[Dict],
+        fetched_chunks: Optional[List[Dict[str, str]]] = None,
+        accurate_data_date: Optional[date] = None,
+        failed_chunks: Optional[set] = None
+    ):
+        """
+        Save full-month data to cache, or stable days of the fetched chunks when
+        the worker uses the day cache. Chunks in failed_chunks ((start, end) with a
+        failed page) are not marked as covered, so they are fetched again next run.
+        """
+        # Kết quả rỗng không đánh dấu coverage: có thể là lỗi (vd. không lấy được catalog) chứ không phải không có dữ liệu
         if not flattened_data or not self.db_client:
             return
         
+        day_scope = self._get_day_cache_scope()
+        if day_scope is not None and fetched_chunks and accurate_data_date:
+            stable_days = set()
+            for chunk in fetched_chunks:
+                if (chunk['start'], chunk['end']) in (failed_chunks or ()):
+                    logger.warning(f"Chunk [{chunk['start']} - {chunk['end']}] fetched incompletely, skip day cache")
+                    continue
+                day = datetime.strptime(chunk['start'], '%Y-%m-%d').date()
+                chunk_end = min(datetime.strptime(chunk['end'], '%Y-%m-%d').date(), accurate_data_date - timedelta(days=1))
+                while day <= chunk_end:
+                    stable_days.add(day)
+                    day += timedelta(days=1)
+            if any(row_day(row) is None for row in flattened_data):
+                logger.warning("Rows without stat_time_day, skip day cache")
+                return
+            self._get_day_cache().save(day_scope, flattened_data, stable_days)
+            return
+        
         # Filter full-month records
         data_to_save = [
             row for row in flattened_data
@@ -282,6 +412,9 @@ class BaseReportWorker(ABC):
             
             
             reporter = self._create_reporter()
+            if hasattr(reporter, "limiter_weight"):
+                reporter.limiter_weight = float(self.context.get("priority_weight") or 1.0)
+            self._apply_plan(reporter)
             
             # Step 2: Determine data freshness boundary
             accurate_data_date = date.today() - timedelta(days=2)
@@ -307,7 +440,11 @@ class BaseReportWorker(ABC):
                     f"Fetching {len(chunks_to_fetch)} chunks from API...",
                     20
                 )
-                api_raw_data = reporter.get_data(chunks_to_fetch)
+                try:
+                    api_raw_data = reporter.get_data(chunks_to_fetch)
+                finally:
+                    if hasattr(reporter, "release_limiters"):
+                        reporter.release_limiters()
             else:
                 logger.info("All data available in cache")
             
@@ -319,12 +456,18 @@ class BaseReportWorker(ABC):
             if api_raw_data:
                 self._send_progress("RUNNING", "Processing API data...", 70)
                 flattened_api_data = self._flatten_data(api_raw_data, self.context)
+                self._restore_report_bounds(flattened_api_data, chunks_to_fetch)
                 self.api_rows = len(flattened_api_data)
             
             # Step 7: Save to cache
             if flattened_api_data:
                 self._send_progress("RUNNING", "Saving to cache...", 85)
-                self._save_to_cache(flattened_api_data)
+                self._save_to_cache(
+                    flattened_api_data,
+                    chunks_to_fetch,
+                    accurate_data_date,
+                    getattr(reporter, "failed_chunks", None)
+                )
             
             # Step 8: Combine data and write to sheet
             final_data = cached_data + flattened_api_data
@@ -340,6 +483,9 @@ class BaseReportWorker(ABC):
             # Step 9: Get API usage
             if hasattr(reporter, 'api_usage'):
                 self.api_usage = reporter.api_usage
+            if getattr(reporter, 'response_timeline', None):
+                # Dùng cho replay simulator (services/simulator)
+                self.api_usage = {**self.api_usage, "response_timeline": reporter.response_timeline}
             
             logger.info(
                 f"[Job {self.job_id}] Completed: "
@@ -49,6 +49,19 @@ class FacebookAdsWorker(BaseReportWorker):
         safe_name = template_name.lower().replace(" ", "_").replace("-", "_")
         return f"facebook_{safe_name}_reports"
     
+    def _apply_plan(self, reporter):
+        """Apply chunk factor and batch size chosen by JobPlanner (if any)"""
+        plan = self.context.get("plan")
+        if not plan:
+            return
+        
+        if hasattr(reporter, "chunk_factor"):
+            reporter.chunk_factor = plan.get("chunk_factor", 1)
+        if plan.get("batch_size"):
+            reporter.DEFAULT_BATCH_SIZE = plan["batch_size"]
+        
+        super()._apply_plan(reporter)
+    
     def run(self) -> Dict[str, Any]:
         """
         Override run to handle Facebook-specific flow.
@@ -65,6 +78,7 @@ class FacebookAdsWorker(BaseReportWorker):
             # Initialize
             self._send_progress("RUNNING", "Initializing Facebook reporter...", 0)
             reporter = self._create_reporter()
+            self._apply_plan(reporter)
             
             # Get accounts to process
             accounts = self.context.get("accounts", [])
@@ -115,6 +129,7 @@ class FacebookAdsWorker(BaseReportWorker):
                 "api_usage": {
                     "summaries" : reporter.summaries,
                     "batch_count": reporter.batch_count,
+                    "request_count": reporter.request_count,
                     "total_backoff_sec": reporter.total_backoff_sec,
                 },  
                 "stats": {
@@ -138,6 +153,7 @@ class FacebookAdsWorker(BaseReportWorker):
                 api_usage = {
                     "summaries": reporter.summaries,
                     "batch_count": reporter.batch_count,
+                    "request_count": reporter.request_count,
                     "total_backoff_sec": reporter.total_backoff_sec,
                 }
 
@@ -151,6 +167,9 @@ class FacebookAdsWorker(BaseReportWorker):
                     "total_rows": len(data)
                 }
             }
+        finally:
+            if reporter and reporter.limiter_metrics:
+                reporter.limiter_metrics.flush()
         
     
 class FacebookDailyWorker(FacebookAdsWorker):
@@ -162,7 +181,8 @@ class FacebookDailyWorker(FacebookAdsWorker):
             access_token=self.context["access_token"],
             email=self.context.get("user_email", "unknown@example.com"),
             progress_callback=self._send_progress,
-            job_id=self.job_id
+            job_id=self.job_id,
+            redis_client=self.redis_client
         )
 
 class FacebookPerformanceWorker(FacebookAdsWorker):
@@ -174,7 +194,8 @@ class FacebookPerformanceWorker(FacebookAdsWorker):
             access_token=self.context["access_token"],
             email=self.context.get("user_email", "unknown@example.com"),
             progress_callback=self._send_progress,
-            job_id=self.job_id
+            job_id=self.job_id,
+            redis_client=self.redis_client
         )
         
 class FacebookBreakdownWorker(FacebookAdsWorker):
@@ -186,7 +207,8 @@ class FacebookBreakdownWorker(FacebookAdsWorker):
             access_token=self.context["access_token"],
             email=self.context.get("user_email", "unknown@example.com"),
             progress_callback=self._send_progress,
-            job_id=self.job_id
+            job_id=self.job_id,
+            redis_client=self.redis_client
         )
         
     
\ No newline at end of file
@@ -16,6 +16,7 @@ from .worker_factory import WorkerFactory
 from services.exceptions import TaskCancelledException 
 from services.sheet_writer.gg_sheet_writer import GoogleSheetWriter
 from services.database.mongo_client import MongoDbClient
+from services.planner.job_planner import JobPlanner
 from utils.utils import write_data_to_sheet
 
 # ==================== CONFIG ====================
@@ -109,12 +110,14 @@ def on_task_postrun(sender=None, task_id=None, state=None, retval=None, args=Non
         final_status = state
         message = None
         api_total_counts = {}
+        stats = {}
 
         if isinstance(retval, dict):
             # Worker returned a dict (likely SUCCESS or handled FAILED)
             final_status = retval.get("status", state)
             message = retval.get("message")
             api_total_counts = retval.get("api_usage", {})
+            stats = retval.get("stats", {})
         elif isinstance(retval, Exception):
             # Celery exception (TaskCancelled or other crash)
             message = str(retval)
@@ -145,7 +148,8 @@ def on_task_postrun(sender=None, task_id=None, state=None, retval=None, args=Non
                         "end_time": end_time,
                         "duration_seconds": round(duration, 2),
                         "message": message,
-                        "api_total_counts": api_total_counts
+                        "api_total_counts": api_total_counts,
+                        "stats": stats
                     }}
                 )
         except Exception as e:
@@ -235,6 +239,9 @@ def run_report_job(context: Dict[str, Any]):
         # ========== BƯỚC 1: Tạo worker từ factory ==========
         send_progress_update("RUNNING", "Khởi tạo worker...", 0)
         
+        # Ước lượng chi phí job từ lịch sử và lưu cạnh số liệu thực tế
+        context["plan"] = JobPlanner(db_client).plan_and_record(context)
+        
         worker = WorkerFactory.create_worker(
             task_type=task_type,
             context=context,
@@ -267,7 +274,8 @@ def run_report_job(context: Dict[str, Any]):
             return {
                 "status": "FAILED",
                 "message": final_message,
-                "api_usage": api_usage
+                "api_usage": api_usage,
+                "stats": result.get("stats", {})
             }
 
         # ========== BƯỚC 4: Gửi final callback SUCCESS ==========
@@ -278,7 +286,8 @@ def run_report_job(context: Dict[str, Any]):
         return {
             "status": "SUCCESS",
             "message": final_message,
-            "api_usage": api_usage
+            "api_usage": api_usage,
+            "stats": result.get("stats", {})
         }
         
     except TaskCancelledException:
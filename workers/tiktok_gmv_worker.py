@@ -10,8 +10,11 @@ from services.gmv.campaign_creative_detail import (
 )
 from services.gmv.campaign_product_detail import (
     GMVCampaignProductDetailReporter,
+    AsyncGMVCampaignProductDetailReporter,
     _flatten_product_report
 )
+from services.gmv.async_gmv_reporter import httpx
+import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,7 +31,8 @@ class TikTokGMVCreativeWorker(BaseReportWorker):
             store_id=self.context["store_id"],
             progress_callback=self._send_progress,
             job_id=self.job_id,
-            redis_client=self.redis_client
+            redis_client=self.redis_client,
+            db_client=self.db_client
         )
     
     def _flatten_data(self, raw_data: List[Dict], context: Dict) -> List[Dict]:
@@ -52,15 +56,25 @@ class TikTokGMVCreativeWorker(BaseReportWorker):
 class TikTokGMVProductWorker(BaseReportWorker):
     """Worker for TikTok GMV Product reports"""
     
+    # Chạy campaign list / product performance trên asyncio (cần httpx)
+    USE_ASYNC_REPORTER = os.getenv("TIKTOK_ASYNC_PRODUCT_REPORT", "false").lower() == "true"
+    
     def _create_reporter(self):
         """Create GMV Product reporter"""
-        return GMVCampaignProductDetailReporter(
+        reporter_cls = GMVCampaignProductDetailReporter
+        if self.USE_ASYNC_REPORTER:
+            if httpx is not None:
+                reporter_cls = AsyncGMVCampaignProductDetailReporter
+            else:
+                logger.warning("httpx chưa được cài, dùng GMVCampaignProductDetailReporter đồng bộ.")
+        return reporter_cls(
             access_token=self.context["access_token"],
             advertiser_id=self.context["advertiser_id"],
             store_id=self.context["store_id"],
             progress_callback=self._send_progress,
             job_id=self.job_id,
-            redis_client=self.redis_client
+            redis_client=self.redis_client,
+            db_client=self.db_client
         )
     
     def _flatten_data(self, raw_data: List[Dict], context: Dict) -> List[Dict]:
@@ -76,6 +90,13 @@ class TikTokGMVProductWorker(BaseReportWorker):
             "end_date": chunk['end']
         }
     
+    def _get_day_cache_scope(self) -> Dict:
+        """Product report có row theo stat_time_day -> cache theo ngày"""
+        return {
+            "advertiser_id": self.context.get("advertiser_id"),
+            "store_id": self.context.get("store_id"),
+        }
+    
     def _get_collection_name(self) -> str:
         """Get collection name"""
         return "product_reports"
\ No newline at end of file